@@ -1,9 +1,8 @@
-
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, g, Response
 from flask_cors import CORS
-import pickle
-import pandas as pd
 import logging
+import json
+import time
 import os
 import sys
 
@@ -16,7 +15,15 @@ sys.path.append(parent_dir)
 sys.path.append(current_dir)
 
 try:
-    from models.predict import predict_risk_direct, load_models, FEATURES
+    from models.predict import (predict_risk_direct, predict_risk_batch, score_batch, load_models,
+                                prediction_cache, FEATURES)
+    from models.registry import start_watcher
+    from models.delta import ScoreState, InvalidStateToken, initial_state, apply_changes, state_results
+    from models.coalescer import RequestCoalescer
+    from ml.config import (MAX_BATCH_SIZE, COALESCE_ENABLED, COALESCE_MAX_WAIT,
+                           COALESCE_MAX_BATCH, COALESCE_TIMEOUT)
+    from ml.recommendations.engine import results_json
+    from ml.utils.metrics import metrics, STAGE_SECONDS, REQUEST_SECONDS, REQUESTS, ERRORS, sample_payload
     logger.info("Successfully imported prediction modules")
 except ImportError as e:
     logger.error(f"Failed to import prediction modules: {e}")
@@ -25,31 +32,185 @@ except ImportError as e:
 app = Flask(__name__)
 CORS(app)
 
+coalescer = RequestCoalescer(predict_risk_batch, predict_risk_direct, max_wait=COALESCE_MAX_WAIT,
+                             max_batch=COALESCE_MAX_BATCH, timeout=COALESCE_TIMEOUT)
+
+def collect_service_stats():
+    """Prediction cache and coalescer counters, read at scrape time"""
+    cache = prediction_cache.stats()
+    batching = coalescer.stats()
+    return [
+        ("ml_prediction_cache_events_total", "counter", "Prediction cache lookups and removals by outcome",
+         {(("event", event),): cache[event] for event in ("hits", "misses", "evictions", "expirations")}),
+        ("ml_prediction_cache_entries", "gauge", "Entries currently in the prediction cache",
+         {(): cache["size"]}),
+        ("ml_coalescer_batches_total", "counter", "Micro-batches scored by the request coalescer",
+         {(): batching["batches"]}),
+        ("ml_coalescer_records_total", "counter", "Records scored through coalesced batches",
+         {(): batching["records"]}),
+        ("ml_coalescer_timeouts_total", "counter", "Coalesced requests that fell back to direct scoring",
+         {(): batching["timeouts"]}),
+    ]
+
+metrics.add_collector(collect_service_stats)
+
+def parse_json():
+    with STAGE_SECONDS.time(stage="json_parse", disease=""):
+        return request.get_json()
+
+def respond(payload, status=200):
+    with STAGE_SECONDS.time(stage="serialize", disease=""):
+        response = jsonify(payload)
+    return response, status
+
+def respond_results(results, errors=None, state=None):
+    """Successful prediction response, assembled from pre-serialized result fragments"""
+    with STAGE_SECONDS.time(stage="serialize", disease=""):
+        # Keys in sorted order, like jsonify
+        parts = []
+        if errors is not None:
+            parts.append(b'"errors":' + json.dumps(errors, sort_keys=True, separators=(",", ":")).encode())
+        if isinstance(results, list):
+            parts.append(b'"results":[' + b",".join(map(results_json, results)) + b']')
+        else:
+            parts.append(b'"results":' + results_json(results))
+        if state is not None:
+            parts.append(b'"state":' + json.dumps(state).encode())
+        parts.append(b'"success":true')
+    return Response(b"{" + b",".join(parts) + b"}", mimetype='application/json')
+
+def issue_state(user_data):
+    """State token for later /assess_risk_delta calls, or None if it can't be built"""
+    try:
+        with STAGE_SECONDS.time(stage="delta_state", disease=""):
+            return initial_state(user_data).to_token()
+    except Exception as e:
+        logger.error(f"Could not build state token: {str(e)}")
+        return None
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or "unknown"
+    REQUESTS.inc(endpoint=endpoint)
+    if response.status_code >= 400:
+        ERRORS.inc(endpoint=endpoint)
+    if 'request_start' in g:
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    return response
+
 @app.route('/')
 def home():
-    return "Welcome to the Health Risk Prediction API! Use POST /assess_risk or GET /get_required_fields."
+    return "Welcome to the Health Risk Prediction API! Use POST /assess_risk (add ?state=1 for a token for POST /assess_risk_delta), POST /assess_risk_batch, GET /get_required_fields or GET /metrics."
 
 @app.route('/assess_risk', methods=['POST'])
 def assess_risk():
-    user_data = request.json
+    user_data = parse_json()
+    log_payload = sample_payload()
     logger.info(f"Received request at /assess_risk")
-    logger.info(f"Request data: {user_data}")
+    if log_payload:
+        logger.info(f"Request data: {user_data}")
+
+    if not isinstance(user_data, dict):
+        return respond({
+            'success': False,
+            'error': "Expected a JSON object of survey answers"
+        }, 400)
 
     try:
-        load_models()
-        results = predict_risk_direct(user_data)
-        logger.info(f"Prediction results: {results}")
+        if COALESCE_ENABLED:
+            results = coalescer.predict(user_data)
+        else:
+            results = predict_risk_direct(user_data)
+        if log_payload:
+            logger.info(f"Prediction results: {results}")
         
-        return jsonify({
-            'success': True,
-            'results': results
-        })
+        # The state token costs a second encoding, so only clients that ask for it pay for it
+        state = issue_state(user_data) if request.args.get('state') in ('1', 'true') else None
+        return respond_results(results, state=state)
     except Exception as e:
         logger.error(f"Error in risk assessment: {str(e)}", exc_info=True)
+        return respond({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@app.route('/assess_risk_batch', methods=['POST'])
+def assess_risk_batch():
+    payload = parse_json()
+    records = payload.get('records') if isinstance(payload, dict) else payload
+    logger.info(f"Received request at /assess_risk_batch")
+
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
         return jsonify({
+            'success': False,
+            'error': "Expected a list of records or an object with a 'records' list"
+        }), 400
+    if len(records) > MAX_BATCH_SIZE:
+        return jsonify({
+            'success': False,
+            'error': f"Batch too large: {len(records)} records (max {MAX_BATCH_SIZE})"
+        }), 413
+
+    try:
+        results, errors = score_batch(records)
+        logger.info(f"Scored batch of {len(records)} records ({len(errors)} invalid fields)")
+
+        return respond_results(results, errors)
+    except Exception as e:
+        logger.error(f"Error in batch risk assessment: {str(e)}", exc_info=True)
+        return respond({
             'success': False,
             'error': str(e)
-        }), 500
+        }, 500)
+
+@app.route('/assess_risk_delta', methods=['POST'])
+def assess_risk_delta():
+    payload = parse_json()
+    logger.info(f"Received request at /assess_risk_delta")
+
+    token = payload.get('state') if isinstance(payload, dict) else None
+    changes = payload.get('changes', {}) if isinstance(payload, dict) else None
+    if not isinstance(token, str) or not isinstance(changes, dict):
+        return respond({
+            'success': False,
+            'error': "Expected an object with a 'state' token and a 'changes' object"
+        }, 400)
+
+    try:
+        state = ScoreState.from_token(token)
+    except InvalidStateToken as e:
+        return respond({
+            'success': False,
+            'error': f"{str(e)}; resubmit the full record to /assess_risk"
+        }, 400)
+
+    try:
+        with STAGE_SECONDS.time(stage="delta_update", disease=""):
+            state, errors = apply_changes(state, changes)
+            results = state_results(state)
+        return respond_results(results, errors, state.to_token())
+    except Exception as e:
+        logger.error(f"Error in delta risk assessment: {str(e)}", exc_info=True)
+        return respond({
+            'success': False,
+            'error': str(e)
+        }, 500)
+
+@app.route('/cache_stats', methods=['GET'])
+def cache_stats():
+    return jsonify({
+        'success': True,
+        'prediction_cache': prediction_cache.stats(),
+        'coalescer': coalescer.stats()
+    })
+
+@app.route('/metrics', methods=['GET'])
+def prometheus_metrics():
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
 
 @app.route('/get_required_fields', methods=['GET'])
 def get_required_fields():
@@ -76,4 +237,5 @@ if __name__ == '__main__':
     except Exception as e:
         logger.warning(f"Error loading models: {str(e)}")
         logger.info("Will attempt to load models when needed")
+    start_watcher()
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,64 @@
+"""Compare two benchmark result files written by benchmarks.run.
+
+    python -m benchmarks.compare old.json new.json --threshold 0.2
+
+Cases are matched by name and size and compared on their best time per call.
+Exits non-zero if any case got slower by more than the threshold.
+"""
+import sys
+import json
+import argparse
+
+def compare_results(baseline, current, threshold=0.2):
+    """One row per case in either run, with the time ratio and a status"""
+    old = baseline["results"]
+    new = current["results"]
+    rows = []
+    for key in sorted(set(old) | set(new)):
+        if key not in old or key not in new:
+            rows.append({"case": key, "ratio": None, "status": "added" if key in new else "missing"})
+            continue
+        ratio = new[key]["min_seconds"] / old[key]["min_seconds"]
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "improvement"
+        else:
+            status = "unchanged"
+        rows.append({
+            "case": key,
+            "old_seconds": old[key]["min_seconds"],
+            "new_seconds": new[key]["min_seconds"],
+            "ratio": ratio,
+            "status": status,
+        })
+    return rows
+
+def print_comparison(rows):
+    for row in rows:
+        if row["ratio"] is None:
+            print(f"{row['case']:40s} {row['status']}")
+        else:
+            print(f"{row['case']:40s} {row['old_seconds'] * 1e3:11.3f} ms -> {row['new_seconds'] * 1e3:11.3f} ms"
+                  f"  x{row['ratio']:6.2f}  {row['status']}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+
+    rows = compare_results(baseline, current, args.threshold)
+    print_comparison(rows)
+    if any(row["status"] == "regression" for row in rows):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
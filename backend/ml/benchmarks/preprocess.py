@@ -0,0 +1,111 @@
+"""Benchmark preprocess_dataset against the original row-by-row implementation.
+
+Run from backend/ml:
+
+    python -m benchmarks.preprocess --rows 1000000
+
+The row-wise reference is far too slow to run at 1M rows, so it is timed on
+`--reference-rows` rows and its per-row cost is extrapolated. Both
+implementations are checked for identical output on that subset.
+"""
+import os
+import sys
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+
+from ml.config import FEATURE_MAPPINGS
+from ml.models.train import preprocess_dataset, calculate_bmi
+
+def make_raw_frame(rows, seed=42):
+    """Raw survey-style frame: labels, stray numeric codes, junk and missing answers"""
+    rng = np.random.default_rng(seed)
+    data = {
+        "Age": rng.integers(18, 90, rows).astype(float),
+        "Height": rng.normal(170, 10, rows).round(1),
+        "Weight": rng.normal(75, 15, rows).round(1),
+    }
+    for column in ("Age", "Height", "Weight"):
+        data[column][rng.random(rows) < 0.02] = np.nan
+
+    for feature, mapping in FEATURE_MAPPINGS.items():
+        labels = [label for label in mapping if label != "default"]
+        choices = np.array(labels + [str(mapping[labels[0]]), "unknown", None], dtype=object)
+        weights = np.array([0.95 / len(labels)] * len(labels) + [0.02, 0.01, 0.02])
+        data[feature] = rng.choice(choices, size=rows, p=weights / weights.sum())
+    return pd.DataFrame(data)
+
+def preprocess_dataset_rowwise(df):
+    """The original per-row implementation, kept as the reference for output and speed"""
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+
+    for feature, mapping in FEATURE_MAPPINGS.items():
+        if feature in df.columns:
+            mapped_series = pd.Series(index=df.index, dtype=float)
+            for i, value in enumerate(df[feature]):
+                if isinstance(value, str) and value in mapping:
+                    mapped_series.iloc[i] = mapping[value]
+                elif pd.notna(value):
+                    try:
+                        numeric_val = float(value)
+                        if numeric_val in mapping.values():
+                            mapped_series.iloc[i] = numeric_val
+                        else:
+                            mapped_series.iloc[i] = 0
+                    except (ValueError, TypeError):
+                        mapped_series.iloc[i] = 0
+                else:
+                    mapped_series.iloc[i] = np.nan
+            df[feature] = mapped_series
+
+    if 'BMI' not in df.columns and 'Height' in df.columns and 'Weight' in df.columns:
+        df['BMI'] = df.apply(lambda row: calculate_bmi(row['Height'], row['Weight']), axis=1)
+
+    for col in df.columns:
+        if col not in df.select_dtypes(include=['number']).columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+
+    for col in df.select_dtypes(include=['number']).columns:
+        median_val = df[col].median()
+        if pd.isna(median_val):
+            median_val = 0
+        df[col] = df[col].fillna(median_val)
+
+    return df.fillna(0)
+
+def time_call(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--reference-rows", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    small = make_raw_frame(args.reference_rows, args.seed)
+    expected, reference_seconds = time_call(preprocess_dataset_rowwise, small)
+    actual, _ = time_call(preprocess_dataset, small)
+    pd.testing.assert_frame_equal(actual, expected)
+    print(f"Output identical to the row-wise reference on {len(small):,} rows")
+
+    large = make_raw_frame(args.rows, args.seed)
+    _, vectorized_seconds = time_call(preprocess_dataset, large)
+
+    reference_per_row = reference_seconds / len(small)
+    extrapolated = reference_per_row * len(large)
+    print(f"Row-wise:   {reference_per_row * 1e6:8.2f} us/row "
+          f"({reference_seconds:.2f}s for {len(small):,} rows, ~{extrapolated:,.0f}s for {len(large):,})")
+    print(f"Vectorized: {vectorized_seconds / len(large) * 1e6:8.2f} us/row "
+          f"({vectorized_seconds:.2f}s for {len(large):,} rows)")
+    print(f"Speedup:    ~{extrapolated / vectorized_seconds:,.0f}x")
+
+if __name__ == "__main__":
+    main()
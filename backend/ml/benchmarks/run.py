@@ -0,0 +1,211 @@
+"""Microbenchmarks for the inference and training hot paths.
+
+Run from backend/ml:
+
+    python -m benchmarks.run --output results.json
+    python -m benchmarks.run --cases preprocess_dataset --sizes 1000 100000
+    python -m benchmarks.run --output new.json --baseline results.json
+
+Every case builds seeded synthetic inputs at each requested size (rows, or
+records for the request-path cases), then reports the time per call, the
+throughput in rows per second and the peak Python heap allocation (measured
+with tracemalloc in a separate call). Results are written as JSON; with
+`--baseline` they are compared against an earlier run and the process exits
+non-zero if any case got slower by more than `--threshold`.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import logging
+import platform
+import argparse
+import tempfile
+import warnings
+import tracemalloc
+from contextlib import contextmanager
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+
+import numpy as np
+import pandas as pd
+
+from ml.config import USE_COMPILED_MODELS
+from ml.models import train
+from ml.models.predict import (prepare_input_data, predict_risk_direct, predict_risk_batch,
+                               load_models, prediction_cache, FEATURES)
+from benchmarks.preprocess import make_raw_frame
+from benchmarks.compare import compare_results, print_comparison
+
+DEFAULT_SIZES = [1, 1_000, 100_000, 1_000_000]
+
+def make_records(rows, seed=42):
+    """Request payloads: the raw frame as dicts, with missing answers as None"""
+    df = make_raw_frame(rows, seed).astype(object)
+    return df.where(df.notna(), None).to_dict("records")
+
+@contextmanager
+def training_sandbox(df):
+    """Point train.py at a temporary CSV and models directory for the duration"""
+    directory = tempfile.mkdtemp(prefix="ml-bench-")
+    saved = train.DATASET_PATH, train.MODELS_DIR
+    try:
+        train.DATASET_PATH = os.path.join(directory, "dataset.csv")
+        train.MODELS_DIR = os.path.join(directory, "models")
+        df.to_csv(train.DATASET_PATH, index=False)
+        yield
+    finally:
+        train.DATASET_PATH, train.MODELS_DIR = saved
+        shutil.rmtree(directory, ignore_errors=True)
+
+def setup_prepare_input_data(rows, seed):
+    records = make_records(rows, seed)
+
+    def run():
+        for record in records:
+            for disease in FEATURES:
+                prepare_input_data(record, disease)
+    return run
+
+def setup_predict_risk_direct(rows, seed):
+    records = make_records(rows, seed)
+
+    def run():
+        # Every call scores from scratch rather than out of the prediction cache
+        prediction_cache.clear()
+        for record in records:
+            predict_risk_direct(record)
+    return run
+
+def setup_predict_risk_batch(rows, seed):
+    records = make_records(rows, seed)
+    return lambda: predict_risk_batch(records)
+
+def setup_preprocess_dataset(rows, seed):
+    df = make_raw_frame(rows, seed)
+    return lambda: train.preprocess_dataset(df)
+
+def setup_create_target_variable(rows, seed):
+    df = train.preprocess_dataset(make_raw_frame(rows, seed))
+    return lambda: train.create_target_variable(df)
+
+def setup_train_models(rows, seed):
+    df = make_raw_frame(rows, seed)
+
+    def run():
+        with training_sandbox(df):
+            train.train_models(use_cache=False)
+    return run
+
+# name -> (setup, sizes it runs at by default, smallest size it can run at)
+CASES = {
+    "prepare_input_data": (setup_prepare_input_data, [1, 1_000], 1),
+    "predict_risk_direct": (setup_predict_risk_direct, [1, 1_000], 1),
+    "predict_risk_batch": (setup_predict_risk_batch, [1, 1_000, 100_000], 1),
+    "preprocess_dataset": (setup_preprocess_dataset, DEFAULT_SIZES, 1),
+    "create_target_variable": (setup_create_target_variable, DEFAULT_SIZES, 1),
+    # The train/test split and class balance checks need a real sample
+    "train_models": (setup_train_models, [1_000, 100_000], 100),
+}
+
+def measure(run, rows, min_time=1.0, max_repeat=50, memory=True):
+    """Time `run` until `min_time` has elapsed (at least twice), then take one traced call"""
+    times = []
+    total = 0.0
+    while len(times) < 2 or (total < min_time and len(times) < max_repeat):
+        start = time.perf_counter()
+        run()
+        elapsed = time.perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+    best = min(times)
+    return {
+        "rows": rows,
+        "repeat": len(times),
+        "min_seconds": best,
+        "median_seconds": float(np.median(times)),
+        "rows_per_second": rows / best if best > 0 else None,
+        "peak_memory_bytes": peak,
+    }
+
+def environment():
+    import sklearn
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "sklearn": sklearn.__version__,
+        "use_compiled_models": USE_COMPILED_MODELS,
+    }
+
+def run_benchmarks(cases, sizes=None, seed=42, min_time=1.0, memory=True):
+    """Run the named cases; `sizes` overrides each case's default sizes"""
+    results = {}
+    for name in cases:
+        setup, default_sizes, min_rows = CASES[name]
+        for rows in sizes or default_sizes:
+            if rows < min_rows:
+                print(f"{name:24s} {rows:>9,} rows  skipped (needs at least {min_rows:,})")
+                continue
+            run = setup(rows, seed)
+            result = measure(run, rows, min_time=min_time, memory=memory)
+            results[f"{name}[{rows}]"] = dict(result, case=name)
+            peak = result["peak_memory_bytes"]
+            print(f"{name:24s} {rows:>9,} rows  {result['min_seconds'] * 1e3:11.3f} ms/call  "
+                  f"{result['rows_per_second'] or 0:14,.0f} rows/s  "
+                  f"{'-' if peak is None else f'{peak / 2**20:9.1f} MiB'}", flush=True)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--sizes", nargs="+", type=int, default=None,
+                        help="row counts to run every case at (default: per-case sizes)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--min-time", type=float, default=1.0, help="seconds to keep repeating each case")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory pass")
+    parser.add_argument("--output", help="write results to this JSON file")
+    parser.add_argument("--baseline", help="compare against the results in this JSON file")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="relative slowdown reported as a regression")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    warnings.filterwarnings("ignore")
+    load_models()
+
+    results = {
+        "seed": args.seed,
+        "environment": environment(),
+        "results": run_benchmarks(args.cases, args.sizes, args.seed, args.min_time, not args.no_memory),
+    }
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        rows = compare_results(baseline, results, args.threshold)
+        print_comparison(rows)
+        if any(row["status"] == "regression" for row in rows):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
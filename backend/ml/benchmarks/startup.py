@@ -0,0 +1,91 @@
+"""Cold-start timing of the ML service.
+
+Run from backend/ml:
+
+    python -m benchmarks.startup --runs 5
+
+Each run is a fresh interpreter that imports the service and loads the
+models, once with the exported .bin artifacts in place and once with only
+the pickles (the sklearn fallback). The report shows the median import and
+model-load times and which heavy libraries ended up in sys.modules.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+import statistics
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+ml_dir = os.path.dirname(current_dir)
+
+HEAVY_MODULES = ["pandas", "sklearn", "scipy"]
+
+PROBE = """
+import sys, time, json, logging
+logging.disable(logging.CRITICAL)
+sys.path[:0] = [{ml_dir!r}, {backend_dir!r}]
+start = time.perf_counter()
+import {module}
+imported = time.perf_counter()
+from models.registry import load_models
+load_models()
+loaded = time.perf_counter()
+print(json.dumps({{
+    "import_seconds": imported - start,
+    "load_seconds": loaded - imported,
+    "modules": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+def probe(module, cwd):
+    """Import `module` and load the models in a fresh interpreter, from `cwd`"""
+    code = PROBE.format(ml_dir=ml_dir, backend_dir=os.path.dirname(ml_dir), module=module, heavy=HEAVY_MODULES)
+    start = time.perf_counter()
+    output = subprocess.run([sys.executable, "-c", code], cwd=cwd, capture_output=True, text=True, check=True)
+    result = json.loads(output.stdout.strip().splitlines()[-1])
+    result["process_seconds"] = time.perf_counter() - start
+    return result
+
+def pickle_only_copy(models_dir, directory):
+    """A working directory whose MODELS_DIR holds the pickles but no artifacts"""
+    from ml.config import MODELS_DIR
+    target = os.path.join(directory, MODELS_DIR)
+    os.makedirs(target)
+    for name in os.listdir(models_dir):
+        if name.endswith(".pkl"):
+            shutil.copy(os.path.join(models_dir, name), target)
+    return directory
+
+def summarize(label, results):
+    median = lambda key: statistics.median(r[key] for r in results)
+    modules = sorted(set(m for r in results for m in r["modules"]))
+    print(f"{label:32s} import {median('import_seconds') * 1e3:8.1f} ms  "
+          f"load_models {median('load_seconds') * 1e3:8.1f} ms  "
+          f"process {median('process_seconds') * 1e3:8.1f} ms  "
+          f"heavy imports: {', '.join(modules) or 'none'}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--module", default="app", help="module to import (e.g. app or models.predict)")
+    args = parser.parse_args()
+
+    sys.path.append(os.path.dirname(ml_dir))
+    from ml.config import MODELS_DIR
+    models_dir = os.path.join(os.getcwd(), MODELS_DIR)
+
+    summarize(f"{args.module} with artifacts", [probe(args.module, os.getcwd()) for _ in range(args.runs)])
+
+    directory = tempfile.mkdtemp(prefix="ml-startup-")
+    try:
+        cwd = pickle_only_copy(models_dir, directory)
+        summarize(f"{args.module} pickles only", [probe(args.module, cwd) for _ in range(args.runs)])
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+if __name__ == "__main__":
+    main()
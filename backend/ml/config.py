@@ -1,3 +1,6 @@
+import os
+import secrets
+
 DIABETES_FEATURES = [
     "Age", "Sex", "Height", "Weight", "BMI", "Physical activity level", 
     "Smoking status", "Alcohol consumption", "Sleep duration", 
@@ -217,8 +220,106 @@ BOOLEAN_FEATURES = [
     "Blood in urine"
 ]
 
+# Labelling rules behind create_target_variable, on encoded values. A disease is
+# positive when any of its clauses holds, and a clause holds when all of its
+# (feature, operator, value) conditions do. Compiled by models/rules.py
+TARGET_RULES = {
+    "diabetes": [
+        [("BMI", ">", 28), ("Age", ">", 40)],
+        [("Family history of diabetes", ">", 0), ("Age", ">", 35)],
+        [("Frequent urination", ">=", 2)],
+        [("Unexplained thirst", ">=", 1)],
+        [("Unexplained weight loss", ">=", 2)],
+    ],
+    "cardiovascular": [
+        [("Age", ">", 50), ("Smoking status", ">=", 3)],
+        [("Family history of cardiovascular disease", ">", 0), ("Age", ">", 45)],
+        [("Physical activity level", "<=", 1), ("Age", ">", 50), ("BMI", ">", 28)],
+        [("Chest pain or discomfort", ">", 0), ("Shortness of breath during normal activities", ">", 0)],
+    ],
+    "kidney_stone": [
+        [("Daily water intake", "<=", 1)],
+        [("Previous kidney stones", ">", 0)],
+        [("Family history of kidney stones", ">", 0), ("Age", ">", 40)],
+        [("Back or flank pain", ">", 0), ("Painful urination", ">", 0)],
+    ],
+}
+
 DATASET_PATH = 'data/risk_assessment_sample_dataset.csv'
 MODELS_DIR = 'models/saved/'
+DATASET_CACHE_DIR = 'data/cache/'
+
+MAX_BATCH_SIZE = 10000
+
+# Out-of-core training: rows per CSV chunk, passes over the data, held-out share
+STREAM_CHUNK_SIZE = 100000
+STREAM_EPOCHS = 5
+STREAM_TEST_SIZE = 0.2
+
+# Model selection (train.py --select): CV folds and the LogisticRegression grid searched
+SELECTION_FOLDS = 5
+SELECTION_C_GRID = [0.01, 0.03, 0.1, 0.3, 1.0, 3.0, 10.0]
+SELECTION_CLASS_WEIGHTS = ["balanced", None]
+
+# Held-out evaluation (models/evaluation.py): bootstrap resamples, interval
+# coverage, decision threshold for precision/recall and calibration bins
+EVALUATION_RESAMPLES = 1000
+EVALUATION_CONFIDENCE = 0.95
+EVALUATION_THRESHOLD = 0.5
+EVALUATION_BINS = 10
+
+# Online updates from newly labelled records (models/online.py): passes over each
+# new batch, SGD step size, mini-batch rows, pull towards the current weights,
+# and how many numbered artifact versions are kept for rollback
+ONLINE_EPOCHS = 5
+ONLINE_LEARNING_RATE = 0.05
+ONLINE_BATCH_SIZE = 256
+ONLINE_L2 = 0.001
+ONLINE_KEEP_VERSIONS = 10
+
+# Seconds between checks of MODELS_DIR for retrained models
+MODEL_WATCH_INTERVAL = 5.0
+
+# Score with the folded NumPy form of the logistic regression pipelines instead of sklearn
+USE_COMPILED_MODELS = os.environ.get("ML_USE_COMPILED_MODELS", "0") == "1"
+
+# Entries in the prediction cache (0 disables it) and their lifetime in seconds
+PREDICTION_CACHE_SIZE = int(os.environ.get("ML_PREDICTION_CACHE_SIZE", "10000"))
+PREDICTION_CACHE_TTL = 3600
+
+# Opt-in micro-batching of concurrent /assess_risk calls: window in seconds,
+# records per batch, and how long a caller waits before scoring on its own
+COALESCE_ENABLED = os.environ.get("ML_COALESCE", "0") == "1"
+COALESCE_MAX_WAIT = float(os.environ.get("ML_COALESCE_MAX_WAIT", "0.002"))
+COALESCE_MAX_BATCH = int(os.environ.get("ML_COALESCE_MAX_BATCH", "64"))
+COALESCE_TIMEOUT = float(os.environ.get("ML_COALESCE_TIMEOUT", "0.5"))
+
+# Production server (serve.py)
+SERVE_BIND = os.environ.get("ML_BIND", "0.0.0.0:5000")
+SERVE_WORKERS = int(os.environ.get("ML_WORKERS", os.cpu_count() or 1))
+SERVE_THREADS = int(os.environ.get("ML_THREADS", "4"))
+SERVE_BLAS_THREADS = int(os.environ.get("ML_BLAS_THREADS", "1"))
+
+# Opt-in pre-screen: when a disease's labelling rule already fires for a record,
+# skip its model and report RULE_PRESCREEN_SCORE (high risk) instead
+RULE_PRESCREEN = os.environ.get("ML_RULE_PRESCREEN", "0") == "1"
+RULE_PRESCREEN_SCORE = 90.0
+
+# Share of requests (0-1) whose payloads, model inputs and results get logged; 0 turns it off
+LOG_PAYLOAD_SAMPLE_RATE = float(os.environ.get("ML_LOG_PAYLOAD_SAMPLE_RATE", "0"))
+
+# Directory where the serve.py workers publish their metrics so /metrics reports the
+# sum over all of them (serve.py makes a temporary one when unset), and how often
+# in seconds each worker republishes
+METRICS_DIR = os.environ.get("ML_METRICS_DIR", "")
+METRICS_FLUSH_INTERVAL = float(os.environ.get("ML_METRICS_FLUSH_INTERVAL", "1.0"))
+
+# Key that signs /assess_risk state tokens. When it isn't set, a random key is drawn
+# per process; the serve.py workers still share it, because gunicorn preloads the
+# app (and this module) before forking them. Set it when several servers, restarts
+# or workers started by other means must accept each other's tokens
+_delta_token_secret = os.environ.get("ML_DELTA_TOKEN_SECRET")
+DELTA_TOKEN_SECRET = _delta_token_secret.encode() if _delta_token_secret else secrets.token_bytes(32)
 
 def get_default_mapping(feature):
     """Get default numeric value for a categorical feature"""
@@ -0,0 +1,150 @@
+import os
+import json
+import shutil
+import inspect
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+
+from ml.config import DATASET_CACHE_DIR, FEATURE_MAPPINGS, TARGET_RULES
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout of a cache directory changes; the preprocessing code and
+# config are part of the key already
+CACHE_VERSION = 1
+
+def file_hash(path, block_size=1 << 20):
+    """SHA-256 of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def config_hash():
+    """SHA-256 of FEATURE_MAPPINGS and TARGET_RULES, so edits to config.py invalidate the cache"""
+    return hashlib.sha256(json.dumps([FEATURE_MAPPINGS, TARGET_RULES], sort_keys=True).encode()).hexdigest()
+
+def code_hash(preprocess):
+    """SHA-256 of the module defining `preprocess`, so edits to the preprocessing code invalidate the cache"""
+    try:
+        source = inspect.getsource(inspect.getmodule(preprocess))
+    except (TypeError, OSError):
+        # No source file (e.g. defined interactively); only the name is left to go by
+        source = getattr(preprocess, "__qualname__", type(preprocess).__qualname__)
+    return hashlib.sha256(source.encode()).hexdigest()
+
+def _source_hash(path, cache_dir):
+    """Content hash of the CSV, reusing the last one while its size and mtime are unchanged"""
+    stat = os.stat(path)
+    index_path = os.path.join(cache_dir, "sources.json")
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        index = {}
+
+    key = os.path.abspath(path)
+    entry = index.get(key)
+    if entry and entry["size"] == stat.st_size and entry["mtime_ns"] == stat.st_mtime_ns:
+        return entry["sha256"]
+
+    sha256 = file_hash(path)
+    index[key] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256}
+    with open(index_path + ".tmp", "w") as f:
+        json.dump(index, f)
+    os.replace(index_path + ".tmp", index_path)
+    return sha256
+
+def cache_key(path, preprocess, cache_dir=DATASET_CACHE_DIR):
+    """Cache key combining the CSV contents, the preprocessing code, the config and CACHE_VERSION"""
+    os.makedirs(cache_dir, exist_ok=True)
+    parts = f"{CACHE_VERSION}:{_source_hash(path, cache_dir)}:{code_hash(preprocess)}:{config_hash()}"
+    return hashlib.sha256(parts.encode()).hexdigest()[:32]
+
+def write_columns(df, directory, source=None):
+    """Store a numeric DataFrame as one .npy file per column plus a manifest naming its source"""
+    tmp = directory + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    columns = []
+    for i, (name, series) in enumerate(df.items()):
+        filename = f"{i:04d}.npy"
+        np.save(os.path.join(tmp, filename), series.to_numpy())
+        columns.append({"name": name, "file": filename, "dtype": str(series.dtype)})
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump({"rows": len(df), "columns": columns, "source": source}, f)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(tmp, directory)
+
+def read_columns(directory):
+    """Load a cached DataFrame with every column memory-mapped
+
+    Each column is its own block over its .npy mapping, so nothing is read
+    until it's used. pandas copies the columns into memory once an operation
+    consolidates the frame (e.g. taking rows of the whole frame, as
+    train_test_split does); until then, reading a column at a time only pages
+    in that column.
+    """
+    with open(os.path.join(directory, "manifest.json")) as f:
+        manifest = json.load(f)
+    # asarray drops the memmap subclass but keeps the mapping underneath
+    data = {c["name"]: np.asarray(np.load(os.path.join(directory, c["file"]), mmap_mode="r"))
+            for c in manifest["columns"]}
+    # With copy=False a dict isn't consolidated, so every column keeps its own mapping
+    return pd.DataFrame(data, copy=False)
+
+def prune_cache(cache_dir, keep, source):
+    """Remove the cached versions of `source` other than `keep`
+
+    Caches written before manifests named their source are removed too;
+    caches of other CSVs are left alone.
+    """
+    for name in os.listdir(cache_dir):
+        directory = os.path.join(cache_dir, name)
+        # .tmp directories may be another process's write in progress
+        if name == keep or name.endswith(".tmp") or not os.path.isdir(directory):
+            continue
+        try:
+            with open(os.path.join(directory, "manifest.json")) as f:
+                owner = json.load(f).get("source")
+        except (OSError, ValueError):
+            owner = None
+        if owner is None or owner == source:
+            shutil.rmtree(directory, ignore_errors=True)
+            logger.info(f"Removed stale dataset cache {directory}")
+
+def load_preprocessed_dataset(path, preprocess, cache_dir=DATASET_CACHE_DIR, use_cache=True):
+    """Return preprocess(read_csv(path)), served from the columnar cache when possible"""
+    if not use_cache:
+        df = pd.read_csv(path)
+        logger.info(f"Successfully loaded dataset with {len(df)} records and {len(df.columns)} columns")
+        return preprocess(df)
+
+    key = cache_key(path, preprocess, cache_dir)
+    directory = os.path.join(cache_dir, key)
+    if os.path.exists(os.path.join(directory, "manifest.json")):
+        try:
+            df = read_columns(directory)
+            logger.info(f"Loaded preprocessed dataset from cache {directory} "
+                        f"({len(df)} records, {len(df.columns)} columns)")
+            return df
+        except Exception as e:
+            logger.warning(f"Ignoring unreadable dataset cache {directory}: {str(e)}")
+
+    df = pd.read_csv(path)
+    logger.info(f"Successfully loaded dataset with {len(df)} records and {len(df.columns)} columns")
+    df = preprocess(df)
+
+    if any(dtype == object for dtype in df.dtypes):
+        logger.warning("Preprocessed dataset has non-numeric columns, not caching it")
+        return df
+    try:
+        write_columns(df, directory, os.path.abspath(path))
+        logger.info(f"Cached preprocessed dataset in {directory}")
+        prune_cache(cache_dir, key, os.path.abspath(path))
+    except OSError as e:
+        logger.warning(f"Could not write dataset cache {directory}: {str(e)}")
+    return df
@@ -0,0 +1,225 @@
+"""Validation and coercion of request records against the schema in config.py.
+
+Each feature gets a FieldRule compiled from FEATURE_MAPPINGS, VALUE_RANGES,
+NUMERIC_DEFAULTS and BOOLEAN_FEATURES:
+
+- mapped features accept their labels or their numeric codes
+- numeric features accept numbers (or numeric strings) inside VALUE_RANGES
+- boolean features additionally accept true/false and yes/no
+
+Missing answers are filled with the feature's documented default, and so are
+invalid ones, which are also reported as errors. `validate_records` does a
+whole batch column by column: the distinct values of a column are coerced
+once and the results are spread over the rows with array indexing.
+"""
+import math
+import numpy as np
+
+from ml.config import (FEATURE_MAPPINGS, BOOLEAN_FEATURES, get_default_mapping,
+                       get_numeric_default, get_value_range)
+
+MISSING = "missing"
+INVALID_TYPE = "invalid_type"
+UNKNOWN_VALUE = "unknown_value"
+OUT_OF_RANGE = "out_of_range"
+
+# Status codes used in the per-value arrays; 0 is a valid value
+_STATUSES = [None, MISSING, INVALID_TYPE, UNKNOWN_VALUE, OUT_OF_RANGE]
+_STATUS_CODE = {status: i for i, status in enumerate(_STATUSES)}
+
+_BOOLEAN_WORDS = {"true": 1.0, "yes": 1.0, "false": 0.0, "no": 0.0}
+
+class FieldRule:
+    """How one feature's raw answers are checked and turned into a number"""
+
+    def __init__(self, feature):
+        self.feature = feature
+        self.boolean = feature in BOOLEAN_FEATURES
+        if feature in FEATURE_MAPPINGS:
+            self.labels = {label: float(code) for label, code in FEATURE_MAPPINGS[feature].items()
+                           if label != "default"}
+            self.codes = frozenset(self.labels.values())
+            self.default = float(get_default_mapping(feature))
+            self.low, self.high = min(self.codes), max(self.codes)
+        else:
+            self.labels = None
+            self.codes = None
+            self.default = float(get_numeric_default(feature))
+            self.low, self.high = get_value_range(feature)
+
+    def coerce(self, value):
+        """(encoded value, error status or None); invalid and missing answers get the default"""
+        if value is None or (isinstance(value, float) and math.isnan(value)):
+            return self.default, MISSING
+        if isinstance(value, str):
+            text = value.strip()
+            if not text:
+                return self.default, MISSING
+            if self.labels is not None and value in self.labels:
+                return self.labels[value], None
+            if self.boolean and text.lower() in _BOOLEAN_WORDS:
+                return _BOOLEAN_WORDS[text.lower()], None
+            try:
+                number = float(text)
+            except (ValueError, OverflowError):
+                return self.default, UNKNOWN_VALUE if self.labels is not None else INVALID_TYPE
+        elif isinstance(value, bool):
+            if self.boolean:
+                return float(value), None
+            return self.default, INVALID_TYPE
+        elif isinstance(value, (int, float)):
+            try:
+                number = float(value)
+            except OverflowError:
+                return self.default, OUT_OF_RANGE
+        else:
+            return self.default, INVALID_TYPE
+
+        if math.isnan(number):
+            return self.default, MISSING
+        if self.codes is not None:
+            return (number, None) if number in self.codes else (self.default, UNKNOWN_VALUE)
+        if not self.low <= number <= self.high:
+            return self.default, OUT_OF_RANGE
+        return number, None
+
+    def describe(self, status):
+        """Human-readable explanation of an error status for this feature"""
+        if status == MISSING:
+            return f"No value given, using the default {self.default:g}"
+        if status == INVALID_TYPE and self.labels is None:
+            return f"Expected a number, using the default {self.default:g}"
+        if status in (INVALID_TYPE, UNKNOWN_VALUE):
+            return f"Not one of the allowed answers, using the default {self.default:g}"
+        return f"Outside the valid range {self.low:g}-{self.high:g}, using the default {self.default:g}"
+
+_rules = {}
+
+def get_rule(feature):
+    """The compiled FieldRule for a feature (built once, then reused)"""
+    rule = _rules.get(feature)
+    if rule is None:
+        rule = _rules[feature] = FieldRule(feature)
+    return rule
+
+def bmi_from(height, weight):
+    """BMI from height (cm) and weight (kg); works on scalars and arrays"""
+    height_m = height / 100
+    return weight / (height_m * height_m)
+
+_HASHABLE_TYPES = {str, int, float, bool, type(None)}
+
+def _hashable(value):
+    # Keeps 1, 1.0 and True apart and lets unhashable junk through as one invalid bucket
+    if isinstance(value, (str, int, float, bool)) or value is None:
+        return (type(value), value)
+    return (object, None)
+
+def _factorize(column, types):
+    """Distinct values of a column and each row's position among them"""
+    if types <= _HASHABLE_TYPES and not (bool in types and types & {int, float}):
+        # Plain dict keys are safe here: no True/1 collisions and nothing unhashable
+        table = dict.fromkeys(column)
+        uniques = list(table)
+        for i, value in enumerate(uniques):
+            table[value] = i
+        return uniques, np.fromiter(map(table.__getitem__, column), dtype=np.intp, count=len(column))
+
+    index = {}
+    uniques = []
+    positions = np.empty(len(column), dtype=np.intp)
+    for row, value in enumerate(column):
+        key = _hashable(value)
+        position = index.get(key)
+        if position is None:
+            position = index[key] = len(uniques)
+            uniques.append(value if key[0] is not object else object())
+        positions[row] = position
+    return uniques, positions
+
+def _coerce_column(rule, column):
+    """Encoded values and status codes of one column"""
+    types = set(map(type, column))
+    values = None
+    if rule.codes is None and types <= {int, float}:
+        try:
+            values = np.array(column, dtype=float)
+        except OverflowError:
+            pass
+    if values is not None:
+        # All plain numbers: check the range on the whole array at once
+        statuses = np.zeros(len(column), dtype=np.int8)
+        missing = np.isnan(values)
+        outside = ~missing & ((values < rule.low) | (values > rule.high))
+        statuses[missing] = _STATUS_CODE[MISSING]
+        statuses[outside] = _STATUS_CODE[OUT_OF_RANGE]
+        values[missing | outside] = rule.default
+        return values, statuses
+
+    # Otherwise coerce each distinct value once and spread the results over the rows
+    uniques, positions = _factorize(column, types)
+    values = np.empty(len(uniques))
+    statuses = np.empty(len(uniques), dtype=np.int8)
+    for i, value in enumerate(uniques):
+        values[i], status = rule.coerce(value)
+        statuses[i] = _STATUS_CODE[status]
+    return values[positions], statuses[positions]
+
+def validate_records(records, features, errors=True):
+    """Coerce a batch of records into an (n_records, n_features) matrix
+
+    Returns (X, errors), where errors is a list of
+    {"record", "field", "error", "message", "value"} dicts ordered by record
+    and field. Missing answers are filled with defaults but not reported.
+    When BMI is missing it's derived from Height and Weight if both are valid.
+    """
+    n = len(records)
+    X = np.empty((n, len(features)))
+    statuses = np.zeros((n, len(features)), dtype=np.int8)
+    columns = {}
+
+    for j, feature in enumerate(features):
+        rule = get_rule(feature)
+        column = [record.get(feature) for record in records]
+        X[:, j], statuses[:, j] = _coerce_column(rule, column)
+        columns[feature] = column
+
+    if "BMI" in features:
+        j = features.index("BMI")
+        derive = statuses[:, j] == _STATUS_CODE[MISSING]
+        height, height_ok = _valid_column(records, "Height", features, X, statuses)
+        weight, weight_ok = _valid_column(records, "Weight", features, X, statuses)
+        derive &= height_ok & weight_ok
+        if derive.any():
+            rule = get_rule("BMI")
+            bmi = bmi_from(height[derive], weight[derive])
+            in_range = (bmi >= rule.low) & (bmi <= rule.high)
+            X[derive, j] = np.where(in_range, bmi, rule.default)
+            statuses[derive, j] = np.where(in_range, 0, _STATUS_CODE[OUT_OF_RANGE])
+
+    if not errors:
+        return X, None
+    return X, _collect_errors(records, features, statuses, columns)
+
+def _valid_column(records, feature, features, X, statuses):
+    """Coerced values of a feature and a mask of the rows where it was valid"""
+    if feature in features:
+        j = features.index(feature)
+        return X[:, j], statuses[:, j] == 0
+    values, codes = _coerce_column(get_rule(feature), [record.get(feature) for record in records])
+    return values, codes == 0
+
+def _collect_errors(records, features, statuses, columns):
+    reported = statuses > _STATUS_CODE[MISSING]
+    found = []
+    for row, j in zip(*np.nonzero(reported)):
+        feature = features[j]
+        status = _STATUSES[statuses[row, j]]
+        value = columns[feature][row]
+        if feature == "BMI" and value is None:
+            message = "BMI derived from Height and Weight is outside the valid range, using the default"
+        else:
+            message = get_rule(feature).describe(status)
+        found.append({"record": int(row), "field": feature, "error": status,
+                      "message": message, "value": value if _hashable(value)[0] is not object else str(value)})
+    return found
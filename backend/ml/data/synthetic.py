@@ -0,0 +1,260 @@
+"""Synthetic survey populations built from the feature schema in config.py.
+
+Every categorical column comes from FEATURE_MAPPINGS and every numeric column
+is centred on NUMERIC_DEFAULTS with an adult spread from NUMERIC_SPREADS,
+clipped to VALUE_RANGES. Weight also follows Height, so the derived BMIs are
+plausible. The columns are correlated through one shared latent risk factor,
+whose strength is set by `correlation` (0 gives independent columns). Rows
+are generated in fixed-size blocks, each seeded from (seed, block index), so
+the output is reproducible, doesn't depend on how it's chunked, and any
+number of rows streams out in constant memory.
+
+Run from backend/ml:
+
+    python data/synthetic.py --rows 10000000 --format csv --output data/synthetic.csv
+    python data/synthetic.py --rows 10000000 --format npy --output data/synthetic_columns
+    python data/synthetic.py --rows 1000 --format jsonl --output data/payloads.jsonl
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+
+from ml.config import FEATURE_MAPPINGS, NUMERIC_DEFAULTS, VALUE_RANGES
+
+logger = logging.getLogger(__name__)
+
+# Rows per generated block; the unit of seeding, so changing it changes the output
+BLOCK_SIZE = 65536
+
+# Raw numeric answers in the survey; BMI is derived from Height and Weight
+NUMERIC_COLUMNS = ["Age", "Height", "Weight"]
+
+# How strongly each numeric column follows the shared risk factor (the rest is noise)
+NUMERIC_LOADINGS = {"Age": 0.6, "Height": 0.0, "Weight": 0.8}
+
+# Standard deviation and plausible adult range of each numeric column; the
+# range is further clipped to VALUE_RANGES
+NUMERIC_SPREADS = {
+    "Age": (14.0, (18, 90)),
+    "Height": (9.5, (140, 210)),
+    "Weight": (14.0, (35, 200)),
+}
+
+# Correlation of Weight with Height, on top of Weight's own risk loading
+HEIGHT_WEIGHT_CORRELATION = 0.5
+
+# Mapped features where a higher code means a healthier answer
+PROTECTIVE_FEATURES = {
+    "Physical activity level",
+    "Fruit and vegetable consumption",
+    "Daily water intake",
+    "Activity intensity",
+}
+
+def numeric_spec(feature):
+    """Mean, standard deviation and clip range of a numeric column"""
+    low, high = VALUE_RANGES[feature]
+    mean = NUMERIC_DEFAULTS[feature]
+    if feature in NUMERIC_SPREADS:
+        std, (plausible_low, plausible_high) = NUMERIC_SPREADS[feature]
+        return mean, std, (max(low, plausible_low), min(high, plausible_high))
+    # Three standard deviations reach the nearer end of the valid range
+    return mean, min(mean - low, high - mean) / 3, (low, high)
+
+def categorical_spec(feature, skew=0.35):
+    """Ordered codes of a mapped feature, their probabilities and the labels behind each code
+
+    The default answer is the most common one and each step away from it is
+    `skew` times as likely as the previous one.
+    """
+    mapping = FEATURE_MAPPINGS[feature]
+    default = mapping.get("default", 0)
+    labels = [label for label in mapping if label != "default"]
+    codes = sorted(set(mapping[label] for label in labels))
+    probabilities = np.array([skew ** abs(code - default) for code in codes])
+    labels_by_code = [[label for label in labels if mapping[label] == code] for code in codes]
+    return np.array(codes, dtype=float), probabilities / probabilities.sum(), labels_by_code
+
+def build_schema(skew=0.35):
+    """Per-column generation spec derived from FEATURE_MAPPINGS, NUMERIC_DEFAULTS and VALUE_RANGES"""
+    schema = {}
+    for feature in NUMERIC_COLUMNS:
+        mean, std, (low, high) = numeric_spec(feature)
+        schema[feature] = {"kind": "numeric", "mean": mean, "std": std, "low": low, "high": high,
+                           "loading": NUMERIC_LOADINGS.get(feature, 0.0)}
+    for feature in FEATURE_MAPPINGS:
+        codes, probabilities, labels_by_code = categorical_spec(feature, skew)
+        schema[feature] = {"kind": "categorical", "codes": codes, "probabilities": probabilities,
+                           "thresholds": np.cumsum(probabilities)[:-1], "labels": labels_by_code,
+                           "sign": -1.0 if feature in PROTECTIVE_FEATURES else 1.0}
+    return schema
+
+def normal_cdf(z):
+    # Abramowitz-Stegun 7.1.26 erf approximation (|error| < 1.5e-7), vectorized and scipy-free
+    x = np.abs(z) / np.sqrt(2)
+    t = 1 / (1 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    erf = 1 - poly * np.exp(-x * x)
+    return 0.5 * (1 + np.sign(z) * erf)
+
+def generate_block(index, rows, schema, seed=42, correlation=0.3, missing_rate=0.0):
+    """Encoded columns (codes and numbers, NaN for missing) plus label picks for one block"""
+    rng = np.random.default_rng([seed, index])
+    risk = rng.standard_normal(rows)
+    shared = np.sqrt(correlation)
+    own = np.sqrt(1 - correlation)
+
+    columns = {}
+    label_picks = {}
+    latent = {}
+    for feature, spec in schema.items():
+        noise = rng.standard_normal(rows)
+        if spec["kind"] == "numeric":
+            loading = shared * spec["loading"]
+            z = loading * risk + np.sqrt(1 - loading ** 2) * noise
+            if feature == "Weight" and "Height" in latent:
+                # Still unit variance, with corr(Weight, Height) = HEIGHT_WEIGHT_CORRELATION before clipping
+                c = HEIGHT_WEIGHT_CORRELATION
+                z = c * latent["Height"] + np.sqrt(1 - c ** 2) * z
+            latent[feature] = z
+            values = np.clip(spec["mean"] + spec["std"] * z, spec["low"], spec["high"])
+            columns[feature] = values.round(0 if feature == "Age" else 1)
+        else:
+            z = spec["sign"] * shared * risk + own * noise
+            level = np.searchsorted(spec["thresholds"], normal_cdf(z), side="right")
+            columns[feature] = spec["codes"][level]
+            # Which label to write where several labels share a code
+            label_picks[feature] = (level, rng.random(rows))
+        if missing_rate:
+            columns[feature][rng.random(rows) < missing_rate] = np.nan
+    return columns, label_picks
+
+def iter_blocks(rows, seed=42, correlation=0.3, missing_rate=0.0, skew=0.35):
+    """Yield (encoded columns, label picks, schema) for successive blocks covering `rows` rows"""
+    schema = build_schema(skew)
+    for index, start in enumerate(range(0, rows, BLOCK_SIZE)):
+        columns, picks = generate_block(index, min(BLOCK_SIZE, rows - start), schema,
+                                        seed, correlation, missing_rate)
+        yield columns, picks, schema
+
+def label_column(values, picks, spec):
+    """Turn generated codes back into survey labels, None where the answer is missing"""
+    level, draw = picks
+    out = np.empty(len(values), dtype=object)
+    for i, labels in enumerate(spec["labels"]):
+        rows = np.flatnonzero(level == i)
+        choice = np.minimum((draw[rows] * len(labels)).astype(int), len(labels) - 1)
+        out[rows] = np.array(labels, dtype=object)[choice]
+    out[np.isnan(values)] = None
+    return out
+
+def raw_frame(columns, picks, schema):
+    """One block as the raw survey frame: labels for mapped features, numbers otherwise"""
+    data = {}
+    for feature, spec in schema.items():
+        if spec["kind"] == "categorical":
+            data[feature] = label_column(columns[feature], picks[feature], spec)
+        else:
+            data[feature] = columns[feature]
+    return pd.DataFrame(data)
+
+def encoded_frame(columns):
+    """One block as encoded numbers, with BMI computed like preprocess_dataset does"""
+    df = pd.DataFrame(columns)
+    height_m = df["Height"] / 100
+    df["BMI"] = (df["Weight"] / height_m ** 2).where(~(height_m <= 0), np.nan)
+    return df
+
+def iter_frames(rows, seed=42, correlation=0.3, missing_rate=0.0, skew=0.35, encoded=False):
+    """Yield the population block by block as raw survey frames, or encoded ones"""
+    for columns, picks, schema in iter_blocks(rows, seed, correlation, missing_rate, skew):
+        yield encoded_frame(columns) if encoded else raw_frame(columns, picks, schema)
+
+def make_population(rows, seed=42, correlation=0.3, missing_rate=0.0, skew=0.35, encoded=False):
+    """The whole population as one DataFrame (for sizes that fit in memory)"""
+    frames = list(iter_frames(rows, seed, correlation, missing_rate, skew, encoded))
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+def iter_payloads(rows, seed=42, correlation=0.3, missing_rate=0.0, skew=0.35):
+    """Yield /assess_risk request bodies; missing answers are left out of the payload"""
+    for df in iter_frames(rows, seed, correlation, missing_rate, skew):
+        for record in df.to_dict("records"):
+            payload = {}
+            for feature, value in record.items():
+                if value is None or value != value:
+                    continue
+                payload[feature] = int(value) if feature == "Age" else value
+            yield payload
+
+def write_csv(path, rows, **options):
+    """Stream the raw population to a CSV file"""
+    with open(path, "w", newline="") as f:
+        for i, df in enumerate(iter_frames(rows, **options)):
+            df.to_csv(f, header=i == 0, index=False)
+
+def write_columns(directory, rows, **options):
+    """Stream the encoded population to one .npy file per column, readable with ml.data.cache.read_columns"""
+    tmp = directory + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    arrays = None
+    start = 0
+    for df in iter_frames(rows, encoded=True, **options):
+        if arrays is None:
+            arrays = {name: np.lib.format.open_memmap(os.path.join(tmp, f"{i:04d}.npy"), mode="w+",
+                                                      dtype=np.float64, shape=(rows,))
+                      for i, name in enumerate(df.columns)}
+        for name, array in arrays.items():
+            array[start:start + len(df)] = df[name].to_numpy()
+        start += len(df)
+    arrays = arrays or {}
+    for array in arrays.values():
+        array.flush()
+    manifest = {"rows": rows, "columns": [{"name": name, "file": f"{i:04d}.npy", "dtype": "float64"}
+                                          for i, name in enumerate(arrays)]}
+    with open(os.path.join(tmp, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    del arrays
+    shutil.rmtree(directory, ignore_errors=True)
+    os.rename(tmp, directory)
+
+def write_payloads(path, rows, **options):
+    """Stream /assess_risk request bodies as JSON lines"""
+    with open(path, "w") as f:
+        for payload in iter_payloads(rows, **options):
+            f.write(json.dumps(payload))
+            f.write("\n")
+
+WRITERS = {"csv": write_csv, "npy": write_columns, "jsonl": write_payloads}
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic population from config.py")
+    parser.add_argument("--rows", type=int, required=True)
+    parser.add_argument("--output", required=True, help="CSV/JSONL file, or a directory for --format npy")
+    parser.add_argument("--format", choices=sorted(WRITERS), default="csv")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--correlation", type=float, default=0.3,
+                        help="share of each column's variance explained by the shared risk factor (0-1)")
+    parser.add_argument("--missing-rate", type=float, default=0.0, help="share of answers left blank")
+    parser.add_argument("--skew", type=float, default=0.35,
+                        help="relative likelihood of each step away from a feature's default answer")
+    args = parser.parse_args()
+
+    if not 0 <= args.correlation < 1:
+        parser.error("--correlation must be in [0, 1)")
+
+    logging.basicConfig(level=logging.INFO)
+    WRITERS[args.format](args.output, args.rows, seed=args.seed, correlation=args.correlation,
+                         missing_rate=args.missing_rate, skew=args.skew)
+    logger.info(f"Wrote {args.rows:,} synthetic rows to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""Compact on-disk format for compiled models.
+
+A `{disease}_model.bin` file holds one CompiledModel as plain arrays, so the
+service can load it with NumPy alone instead of importing sklearn and
+unpickling a whole pipeline:
+
+    8 bytes   magic b"RISKMDL\\0"
+    4 bytes   format version (uint32, little-endian)
+    4 bytes   header length in bytes (uint32, little-endian)
+    header    UTF-8 JSON: disease, feature order, category layout, array
+              table and the SHA-256 of the pickle it was exported from
+    padding   zeros up to an 8-byte boundary
+    arrays    little-endian float64 data, in the order of the array table
+
+Export the pickles already in MODELS_DIR from backend/ml with:
+
+    python -m models.artifact
+"""
+import os
+import sys
+import json
+import struct
+import hashlib
+import logging
+import numpy as np
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+
+from ml.config import FEATURE_MAPPINGS
+from .compiled import CompiledModel
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"RISKMDL\0"
+FORMAT_VERSION = 1
+_PREAMBLE = struct.Struct("<8sII")
+_ARRAYS = ["weights", "intercept", "fill", "mean", "scale"]
+
+def file_sha256(path):
+    """SHA-256 of a (small) file's contents"""
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def category_layout(features):
+    """Label -> code table of every mapped feature among `features`"""
+    return {feature: {label: code for label, code in FEATURE_MAPPINGS[feature].items() if label != "default"}
+            for feature in features if feature in FEATURE_MAPPINGS}
+
+def encode_artifact(model, disease, source_sha256=None, metadata=None):
+    """Serialize a CompiledModel to the artifact byte layout; `metadata` adds header keys"""
+    arrays = {
+        "weights": model.weights,
+        "intercept": np.array([model.intercept]),
+        "fill": model.fill,
+        "mean": model.mean,
+        "scale": model.scale,
+    }
+    table = []
+    offset = 0
+    for name in _ARRAYS:
+        table.append({"name": name, "offset": offset, "length": len(arrays[name])})
+        offset += len(arrays[name])
+    header = json.dumps({
+        **(metadata or {}),
+        "disease": disease,
+        "features": model.features,
+        "categories": category_layout(model.features),
+        "arrays": table,
+        "source_sha256": source_sha256,
+    }).encode("utf-8")
+
+    start = _PREAMBLE.size + len(header)
+    padding = b"\0" * (-start % 8)
+    body = np.concatenate([np.asarray(arrays[name], dtype="<f8") for name in _ARRAYS])
+    return _PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)) + header + padding + body.tobytes()
+
+def decode_artifact(data):
+    """Parse artifact bytes into (CompiledModel, header); raises ValueError on a bad file"""
+    if len(data) < _PREAMBLE.size:
+        raise ValueError("Truncated model artifact")
+    magic, version, header_length = _PREAMBLE.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a model artifact")
+    if version != FORMAT_VERSION:
+        raise ValueError(f"Unsupported model artifact version {version}")
+
+    header_end = _PREAMBLE.size + header_length
+    header = json.loads(data[_PREAMBLE.size:header_end].decode("utf-8"))
+    start = header_end + (-header_end % 8)
+    body = np.frombuffer(data, dtype="<f8", offset=start)
+
+    arrays = {}
+    for entry in header["arrays"]:
+        end = entry["offset"] + entry["length"]
+        if end > len(body):
+            raise ValueError("Truncated model artifact")
+        arrays[entry["name"]] = body[entry["offset"]:end]
+    n = len(header["features"])
+    if any(len(arrays[name]) != n for name in ("weights", "fill", "mean", "scale")):
+        raise ValueError("Model artifact arrays don't match its feature list")
+
+    model = CompiledModel(header["features"], arrays["weights"], arrays["intercept"][0],
+                          arrays["fill"], arrays["mean"], arrays["scale"])
+    return model, header
+
+def save_artifact(model, path, disease, source_path=None, metadata=None):
+    """Write a CompiledModel atomically, recording the hash of the pickle it came from"""
+    source_sha256 = file_sha256(source_path) if source_path and os.path.exists(source_path) else None
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(encode_artifact(model, disease, source_sha256, metadata))
+    os.replace(tmp_path, path)
+
+def load_artifact(path):
+    """Read an artifact file into (CompiledModel, header)"""
+    with open(path, "rb") as f:
+        return decode_artifact(f.read())
+
+def export_artifacts(models_dir, features_by_disease):
+    """Compile each pickled pipeline in models_dir and write its .bin next to it"""
+    import pickle
+    from .compiled import compile_pipeline
+
+    exported = []
+    for disease, features in features_by_disease.items():
+        source = os.path.join(models_dir, f"{disease}_model.pkl")
+        if not os.path.exists(source):
+            logger.warning(f"No pickled model for {disease} in {models_dir}")
+            continue
+        with open(source, "rb") as f:
+            pipeline = pickle.load(f)
+        try:
+            model = compile_pipeline(pipeline, features)
+        except ValueError as e:
+            logger.warning(f"Model {disease} can't be exported: {str(e)}")
+            continue
+        save_artifact(model, os.path.join(models_dir, f"{disease}_model.bin"), disease, source)
+        logger.info(f"Exported {disease} model artifact")
+        exported.append(disease)
+    return exported
+
+if __name__ == "__main__":
+    from ml.config import MODELS_DIR
+    from .encoding import FEATURES
+
+    logging.basicConfig(level=logging.INFO)
+    exported = export_artifacts(sys.argv[1] if len(sys.argv) > 1 else MODELS_DIR, FEATURES)
+    sys.exit(0 if exported else 1)
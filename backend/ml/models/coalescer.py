@@ -0,0 +1,110 @@
+import os
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future, TimeoutError
+
+logger = logging.getLogger(__name__)
+
+class RequestCoalescer:
+    """Groups concurrent single-record requests into one batch call
+
+    The first waiting request opens a window of `max_wait` seconds (or until
+    `max_batch` records have arrived); everything collected in that window is
+    scored with one `score_batch(records)` call and each caller gets its own
+    result. A caller that waits longer than `timeout` scores its record
+    directly with `score_one` instead, which bounds the added latency. If
+    the batch call fails, its records are scored one by one with
+    `score_one`, so one bad record doesn't fail the others.
+    """
+
+    def __init__(self, score_batch, score_one, max_wait=0.002, max_batch=64, timeout=0.5):
+        self.score_batch = score_batch
+        self.score_one = score_one
+        self.max_wait = max_wait
+        self.max_batch = max_batch
+        self.timeout = timeout
+        self.batches = 0
+        self.records = 0
+        self.timeouts = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._queue = None
+
+    def _ensure_started(self):
+        # Threads don't survive fork, so a forked worker starts its own
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                threading.Thread(target=self._run, args=(self._queue,),
+                                 name="request-coalescer", daemon=True).start()
+                self._pid = os.getpid()
+
+    def submit(self, record):
+        """Queue a record for the next batch and return a Future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((record, future))
+        return future
+
+    def predict(self, record):
+        """Score one record through the next batch, falling back to direct scoring on timeout"""
+        future = self.submit(record)
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            if not future.cancel():
+                # Already being scored, so the result is about to arrive
+                return future.result()
+            with self._lock:
+                self.timeouts += 1
+            logger.warning("Coalesced request timed out, scoring it directly")
+            return self.score_one(record)
+
+    def _collect(self, pending):
+        first = pending.get()
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self, pending):
+        while True:
+            batch = [(record, future) for record, future in self._collect(pending)
+                     if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                results = self.score_batch([record for record, _ in batch])
+            except Exception as e:
+                # Score the records one by one so a bad record only fails its own request
+                logger.error(f"Coalesced batch failed, scoring its {len(batch)} records directly: {str(e)}")
+                for record, future in batch:
+                    try:
+                        future.set_result(self.score_one(record))
+                    except Exception as record_error:
+                        future.set_exception(record_error)
+                continue
+            self.batches += 1
+            self.records += len(batch)
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def stats(self):
+        """Batches scored, records scored through them, and direct-scoring fallbacks"""
+        return {
+            "batches": self.batches,
+            "records": self.records,
+            "timeouts": self.timeouts,
+            "mean_batch_size": self.records / self.batches if self.batches else 0.0,
+        }
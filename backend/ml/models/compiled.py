@@ -0,0 +1,207 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class CompiledModel:
+    """A fitted scaler + logistic regression pipeline folded into one weight vector
+
+    Scoring a row is `sigmoid(x @ weights + intercept)` on the raw encoded
+    features, with NaNs replaced by the training medians first.
+    """
+
+    def __init__(self, features, weights, intercept, fill, mean=None, scale=None):
+        self.features = list(features)
+        self.weights = np.ascontiguousarray(weights, dtype=float)
+        self.intercept = float(intercept)
+        self.fill = np.ascontiguousarray(fill, dtype=float)
+        # Kept so the folded weights can be mapped back to the standardized space
+        self.mean = np.zeros(len(self.features)) if mean is None else np.asarray(mean, dtype=float)
+        self.scale = np.ones(len(self.features)) if scale is None else np.asarray(scale, dtype=float)
+        self._has_fill = bool(np.any(~np.isnan(self.fill)))
+
+    def _as_matrix(self, X):
+        if hasattr(X, "columns"):
+            X = X[self.features].to_numpy(dtype=float)
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[None, :]
+        if self._has_fill:
+            missing = np.isnan(X)
+            if missing.any():
+                X = np.where(missing, self.fill, X)
+        return X
+
+    def decision_function(self, X):
+        """Linear score for each row of X"""
+        return self._as_matrix(X) @ self.weights + self.intercept
+
+    def predict_proba(self, X):
+        """Same output layout as sklearn's predict_proba: [[p(0), p(1)], ...]"""
+        p = sigmoid(self.decision_function(X))
+        return np.column_stack([1 - p, p])
+
+    def score_vector(self, x):
+        """Probability of the positive class for one encoded feature vector"""
+        if self._has_fill and np.isnan(x).any():
+            x = np.where(np.isnan(x), self.fill, x)
+        return float(sigmoid(np.dot(x, self.weights) + self.intercept))
+
+class FusedScorer:
+    """Several CompiledModels stacked into one weight matrix over the shared feature union
+
+    A record is encoded once over `features` and every disease's linear score
+    comes out of a single matrix multiply.
+    """
+
+    def __init__(self, compiled, features):
+        self.diseases = list(compiled)
+        self.features = list(features)
+        position = {feature: i for i, feature in enumerate(self.features)}
+
+        n, k = len(self.features), len(self.diseases)
+        self.weights = np.zeros((n, k))
+        self.intercepts = np.zeros(k)
+        fill_weights = np.zeros((n, k))
+        for j, disease in enumerate(self.diseases):
+            model = compiled[disease]
+            rows = [position[feature] for feature in model.features]
+            self.weights[rows, j] = model.weights
+            self.intercepts[j] = model.intercept
+            # Contribution of a missing value is weight * median, per disease
+            fill_weights[rows, j] = np.where(np.isnan(model.fill), 0.0, model.weights * model.fill)
+        self.fill_weights = fill_weights
+
+    def decision_function(self, X):
+        """Linear scores, one column per disease"""
+        X = np.asarray(X, dtype=float)
+        if X.ndim == 1:
+            X = X[None, :]
+        missing = np.isnan(X)
+        if missing.any():
+            return np.where(missing, 0.0, X) @ self.weights + missing @ self.fill_weights + self.intercepts
+        return X @ self.weights + self.intercepts
+
+    def predict_proba(self, X):
+        """Positive-class probability, one column per disease"""
+        return sigmoid(self.decision_function(X))
+
+    def score_vector(self, x):
+        """Positive-class probability per disease for one encoded union vector"""
+        return self.predict_proba(x)[0]
+
+def sigmoid(z):
+    """Numerically stable logistic function"""
+    return np.exp(-np.logaddexp(0, -z))
+
+def _branch_stats(transformer, n_columns):
+    """Fill values, means and scales of a numeric ColumnTransformer branch"""
+    fill = np.full(n_columns, np.nan)
+    mean = np.zeros(n_columns)
+    scale = np.ones(n_columns)
+
+    if transformer == 'passthrough':
+        return fill, mean, scale
+    steps = transformer.steps if hasattr(transformer, 'steps') else [(None, transformer)]
+
+    scaled = False
+    for _, step in steps:
+        name = type(step).__name__
+        if step == 'passthrough' or step is None:
+            continue
+        if name == 'SimpleImputer':
+            # The fill must be in raw units, i.e. the imputer has to run before the scaler
+            if scaled or getattr(step, 'add_indicator', False):
+                raise ValueError("Unsupported imputer placement or missing-value indicator")
+            fill = np.asarray(step.statistics_, dtype=float)
+        elif name == 'StandardScaler':
+            if scaled:
+                raise ValueError("Chained scalers are not supported")
+            scaled = True
+            if step.mean_ is not None:
+                mean = np.asarray(step.mean_, dtype=float)
+            if step.scale_ is not None:
+                scale = np.asarray(step.scale_, dtype=float)
+        elif name == 'FeatureStandardizer':
+            # Median fill then standardization, as above in a single step
+            if scaled:
+                raise ValueError("Chained scalers are not supported")
+            scaled = True
+            fill = np.asarray(step.statistics_, dtype=float)
+            mean = np.asarray(step.mean_, dtype=float)
+            scale = np.asarray(step.scale_, dtype=float)
+        else:
+            raise ValueError(f"Unsupported preprocessing step: {name}")
+    return fill, mean, scale
+
+def compile_pipeline(pipeline, features):
+    """Fold a fitted preprocessor + logistic regression pipeline into a CompiledModel
+
+    Raises ValueError for layouts that can't be expressed as one linear score
+    on the raw features (e.g. one-hot encoded columns).
+    """
+    if not hasattr(pipeline, 'named_steps'):
+        raise ValueError(f"Not a pipeline: {type(pipeline).__name__}")
+    preprocessor = pipeline.named_steps.get('preprocessor')
+    classifier = pipeline.steps[-1][1]
+    if preprocessor is None:
+        raise ValueError("Pipeline has no 'preprocessor' step")
+
+    coef = np.asarray(getattr(classifier, 'coef_', None), dtype=float)
+    if coef.ndim != 2 or coef.shape[0] != 1:
+        raise ValueError("Only binary linear classifiers can be compiled")
+    if list(getattr(classifier, 'classes_', [0, 1])) != [0, 1]:
+        raise ValueError("Classifier classes must be [0, 1]")
+    coef = coef[0]
+
+    names_in = list(getattr(preprocessor, 'feature_names_in_', features))
+    position = {feature: i for i, feature in enumerate(features)}
+    n = len(features)
+    fill, mean, scale, weight = np.full(n, np.nan), np.zeros(n), np.ones(n), np.zeros(n)
+
+    if hasattr(preprocessor, 'transformers_'):
+        branches = preprocessor.transformers_
+    else:
+        # A plain imputer/scaler (or Pipeline of them) applied to every column
+        branches = [('num', preprocessor, names_in)]
+
+    offset = 0
+    for name, transformer, columns in branches:
+        columns = [names_in[c] if isinstance(c, (int, np.integer)) else c for c in columns]
+        if not columns or transformer == 'drop':
+            continue
+        if name != 'num' and transformer != 'passthrough':
+            raise ValueError(f"Unsupported '{name}' branch with columns {columns}")
+
+        branch_fill, branch_mean, branch_scale = _branch_stats(transformer, len(columns))
+        for j, column in enumerate(columns):
+            i = position[column]
+            fill[i], mean[i], scale[i] = branch_fill[j], branch_mean[j], branch_scale[j]
+            weight[i] = coef[offset + j]
+        offset += len(columns)
+
+    if offset != len(coef):
+        raise ValueError("Preprocessor output does not line up with classifier coefficients")
+
+    folded = weight / scale
+    intercept = float(classifier.intercept_[0]) - float(np.dot(folded, mean))
+    return CompiledModel(features, folded, intercept, fill, mean, scale)
+
+def compile_models(models, features_by_disease):
+    """Compile every model that supports it; the others are left to the pipeline path"""
+    compiled = {}
+    for disease, model in models.items():
+        if isinstance(model, CompiledModel):
+            compiled[disease] = model
+            continue
+        try:
+            compiled[disease] = compile_pipeline(model, features_by_disease[disease])
+        except Exception as e:
+            logger.info(f"Model {disease} not compiled, using pipeline: {str(e)}")
+    return compiled
+
+def fuse_models(compiled, diseases, features):
+    """Build a FusedScorer if every disease compiled, otherwise None"""
+    if any(disease not in compiled for disease in diseases):
+        return None
+    return FusedScorer({disease: compiled[disease] for disease in diseases}, features)
@@ -0,0 +1,117 @@
+"""Training data shared by the training, selection, streaming and online update code.
+
+Holds which features and labelling rules belong to each disease model, and
+turns raw survey answers into the numeric frame every trainer starts from.
+Kept apart from train.py so the modules train.py runs (model selection, the
+streaming trainer) can import it without importing train.py a second time.
+"""
+import logging
+import numpy as np
+import pandas as pd
+
+from ml.config import DIABETES_FEATURES, CARDIOVASCULAR_FEATURES, KIDNEY_STONE_FEATURES, FEATURE_MAPPINGS
+from ml.models.rules import compile_rules
+
+logger = logging.getLogger(__name__)
+
+DISEASE_FEATURES = {
+    'diabetes': DIABETES_FEATURES,
+    'cardiovascular': CARDIOVASCULAR_FEATURES,
+    'kidney_stone': KIDNEY_STONE_FEATURES
+}
+
+DISEASE_LABELS = {
+    'diabetes': "Diabetes",
+    'cardiovascular': "Cardiovascular",
+    'kidney_stone': "Kidney Stone"
+}
+
+TARGET_COLUMN = "__target_{}"
+
+def calculate_bmi(height, weight):
+    """Calculate BMI from height (cm) and weight (kg)"""
+    try:
+        height_m = float(height) / 100
+        weight_kg = float(weight)
+        if height_m <= 0:
+            return np.nan
+        return weight_kg / (height_m ** 2)
+    except (ZeroDivisionError, TypeError):
+        return np.nan
+
+def map_feature_value(value, mapping, mapped_values):
+    """Map one raw answer to its numeric code, 0 if it isn't a known label or code"""
+    if isinstance(value, str) and value in mapping:
+        return mapping[value]
+    try:
+        numeric_val = float(value)
+        return numeric_val if numeric_val in mapped_values else 0
+    except (ValueError, TypeError):
+        return 0
+
+def map_feature_column(series, mapping):
+    """Map a whole column through FEATURE_MAPPINGS, keeping missing values as NaN"""
+    # Only the distinct values go through Python; rows are mapped with one take
+    codes, uniques = pd.factorize(series)
+    mapped_values = set(mapping.values())
+    table = np.array([map_feature_value(value, mapping, mapped_values) for value in uniques] + [np.nan],
+                     dtype=float)
+    # factorize marks missing values with -1, which picks the trailing NaN
+    return pd.Series(table[codes], index=series.index, dtype=float)
+
+def calculate_bmi_column(height, weight):
+    """Vectorized calculate_bmi over height (cm) and weight (kg) columns"""
+    height_m = height.astype(float) / 100
+    bmi = weight.astype(float) / (height_m ** 2)
+    return bmi.where(~(height_m <= 0), np.nan)
+
+def preprocess_dataset(df):
+    """Preprocess the dataset with improved error handling and missing value treatment"""
+    df = df.copy()
+    
+    df.columns = df.columns.str.strip()
+    
+    for feature, mapping in FEATURE_MAPPINGS.items():
+        if feature in df.columns:
+            df[feature] = map_feature_column(df[feature], mapping)
+    
+    if 'BMI' not in df.columns and 'Height' in df.columns and 'Weight' in df.columns:
+        df['BMI'] = calculate_bmi_column(df['Height'], df['Weight'])
+    
+    numeric_columns = df.select_dtypes(include=['number']).columns
+    for col in df.columns:
+        if col not in numeric_columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    
+    numeric_columns = df.select_dtypes(include=['number']).columns
+    medians = df[numeric_columns].median().fillna(0)
+    df[numeric_columns] = df[numeric_columns].fillna(medians)
+
+    df = df.fillna(0)
+    
+    return df
+
+def create_target_variable(df):
+    """Create target variables from the TARGET_RULES labelling rules in config.py"""
+    labels = compile_rules().evaluate(df)
+    return tuple(pd.Series(labels[disease], index=df.index).astype(int) for disease in DISEASE_FEATURES)
+
+def check_class_balance(y, label):
+    """Check if target variable has both classes represented"""
+    return check_class_counts(np.bincount(y, minlength=2), label)
+
+def check_class_counts(class_count, label):
+    """Check class balance from per-class counts [n_class_0, n_class_1]"""
+    if min(class_count) == 0:
+        only_class = 0 if class_count[0] else 1
+        logger.warning(f"{label} target only has class {only_class}! Model training will fail.")
+        return False
+    
+    class_ratio = class_count[1] / sum(class_count)
+    logger.info(f"{label} class distribution - Class 0: {class_count[0]}, Class 1: {class_count[1]} (ratio: {class_ratio:.2f})")
+    
+    if class_ratio < 0.1 or class_ratio > 0.9:
+        logger.warning(f"{label} classes are highly imbalanced!")
+        return False
+        
+    return True
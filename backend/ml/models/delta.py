@@ -0,0 +1,177 @@
+"""Incremental re-scoring when a user changes a few answers.
+
+A ScoreState holds a record encoded over ALL_FEATURES together with each
+disease's linear score under the fused model. Changing some answers then
+only touches their terms: for every changed feature the score moves by
+(new value - old value) * weight. BMI is re-derived when Height or Weight
+change and the original record didn't give BMI itself.
+
+POST /assess_risk?state=1 returns the first state with its results. States
+travel to clients as opaque tokens signed with DELTA_TOKEN_SECRET. A
+token issued under different model weights is re-scored in full from its
+encoded vector, so a model reload never invalidates it.
+"""
+import hmac
+import base64
+import struct
+import hashlib
+import logging
+import numpy as np
+
+from ml.config import DELTA_TOKEN_SECRET
+from ml.data.schema import MISSING, get_rule, bmi_from
+from .compiled import sigmoid
+from .encoding import ALL_FEATURES, encode_record
+from .registry import get_model_state
+from .predict import build_result, predict_risk_direct, use_compiled_scoring, prescreen, ruled_result
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VERSION = 1
+_HEADER = struct.Struct("<BB8sH")
+_SIGNATURE_SIZE = 16
+
+# Flag bits: BMI is derived from Height/Weight, each of those was valid, scores are included
+BMI_DERIVED = 1
+HEIGHT_VALID = 2
+WEIGHT_VALID = 4
+HAS_SCORES = 8
+
+_POSITION = {feature: i for i, feature in enumerate(ALL_FEATURES)}
+_NO_MODEL = b"\0" * 8
+
+class InvalidStateToken(ValueError):
+    """Raised for tokens that are malformed, tampered with or from another schema"""
+
+class ScoreState:
+    """Encoded union vector, per-disease linear scores and the model they were computed with"""
+
+    def __init__(self, x, z, fingerprint, flags):
+        self.x = x
+        self.z = z
+        self.fingerprint = fingerprint
+        self.flags = flags
+
+    def to_token(self):
+        """Signed, URL-safe string form of the state"""
+        flags = self.flags | (HAS_SCORES if self.z is not None else 0)
+        body = _HEADER.pack(TOKEN_VERSION, flags, self.fingerprint, len(self.x)) + self.x.astype("<f8").tobytes()
+        if self.z is not None:
+            body += self.z.astype("<f8").tobytes()
+        signature = hmac.new(DELTA_TOKEN_SECRET, body, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+        return base64.urlsafe_b64encode(body + signature).rstrip(b"=").decode("ascii")
+
+    @classmethod
+    def from_token(cls, token):
+        """Parse and verify a token produced by to_token"""
+        try:
+            data = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        except (ValueError, TypeError):
+            raise InvalidStateToken("State token is not valid base64")
+        body, signature = data[:-_SIGNATURE_SIZE], data[-_SIGNATURE_SIZE:]
+        expected = hmac.new(DELTA_TOKEN_SECRET, body, hashlib.sha256).digest()[:_SIGNATURE_SIZE]
+        if len(body) < _HEADER.size or not hmac.compare_digest(signature, expected):
+            raise InvalidStateToken("State token signature doesn't match")
+
+        version, flags, fingerprint, n = _HEADER.unpack_from(body)
+        if version != TOKEN_VERSION or n != len(ALL_FEATURES):
+            raise InvalidStateToken("State token was issued for a different feature schema")
+        values = np.frombuffer(body, dtype="<f8", offset=_HEADER.size).astype(float)
+        k = len(values) - n
+        if k < 0 or (k == 0) == bool(flags & HAS_SCORES):
+            raise InvalidStateToken("State token has the wrong length")
+        return cls(values[:n].copy(), values[n:].copy() if k else None, fingerprint, flags & ~HAS_SCORES)
+
+_fingerprints = {}
+
+def model_fingerprint(fused):
+    """Short hash of a fused scorer's weights, or zeros when there is none"""
+    if fused is None:
+        return _NO_MODEL
+    fingerprint = _fingerprints.get(id(fused))
+    if fingerprint is None or fingerprint[0] is not fused:
+        digest = hashlib.blake2b(fused.weights.tobytes() + fused.intercepts.tobytes(), digest_size=8).digest()
+        fingerprint = _fingerprints[id(fused)] = (fused, digest)
+    return fingerprint[1]
+
+def _active_fused():
+    models, _, fused, _ = get_model_state()
+    return fused if fused is not None and use_compiled_scoring(models) else None
+
+def _derived_bmi(x, flags):
+    if not (flags & HEIGHT_VALID and flags & WEIGHT_VALID):
+        return get_rule("BMI").default
+    rule = get_rule("BMI")
+    bmi = bmi_from(x[_POSITION["Height"]], x[_POSITION["Weight"]])
+    return bmi if rule.low <= bmi <= rule.high else rule.default
+
+def initial_state(user_data):
+    """Encode a full record and compute its scores"""
+    x = encode_record(user_data, ALL_FEATURES)
+    flags = 0
+    if get_rule("BMI").coerce(user_data.get("BMI"))[1] == MISSING:
+        flags |= BMI_DERIVED
+    if get_rule("Height").coerce(user_data.get("Height"))[1] is None:
+        flags |= HEIGHT_VALID
+    if get_rule("Weight").coerce(user_data.get("Weight"))[1] is None:
+        flags |= WEIGHT_VALID
+
+    fused = _active_fused()
+    z = fused.decision_function(x)[0] if fused is not None else None
+    return ScoreState(x, z, model_fingerprint(fused), flags)
+
+def apply_changes(state, changes):
+    """New state with `changes` (raw answers by feature) applied, plus validation errors
+
+    Only the changed terms of each disease's score are updated; a state
+    scored with other weights (or without scores) is re-scored in full.
+    """
+    fused = _active_fused()
+    fingerprint = model_fingerprint(fused)
+    incremental = fused is not None and state.z is not None and state.fingerprint == fingerprint
+    x = state.x.copy()
+    z = state.z.copy() if incremental else None
+    flags = state.flags
+    errors = []
+
+    def set_value(i, value):
+        delta = value - x[i]
+        if delta:
+            x[i] = value
+            if incremental:
+                z[:] += delta * fused.weights[i]
+
+    for feature, raw in changes.items():
+        i = _POSITION.get(feature)
+        if i is None:
+            continue
+        rule = get_rule(feature)
+        value, status = rule.coerce(raw)
+        if status not in (None, MISSING):
+            errors.append({"record": 0, "field": feature, "error": status,
+                           "message": rule.describe(status), "value": raw})
+        if feature == "BMI":
+            flags = flags | BMI_DERIVED if status == MISSING else flags & ~BMI_DERIVED
+        elif feature == "Height":
+            flags = flags | HEIGHT_VALID if status is None else flags & ~HEIGHT_VALID
+        elif feature == "Weight":
+            flags = flags | WEIGHT_VALID if status is None else flags & ~WEIGHT_VALID
+        set_value(i, value)
+
+    if flags & BMI_DERIVED and changes.keys() & {"BMI", "Height", "Weight"}:
+        set_value(_POSITION["BMI"], _derived_bmi(x, flags))
+
+    if fused is not None and not incremental:
+        z = fused.decision_function(x)[0]
+    return ScoreState(x, z, fingerprint, flags), errors
+
+def state_results(state):
+    """Per-disease results for a state"""
+    fused = _active_fused()
+    if fused is not None and state.z is not None and state.fingerprint == model_fingerprint(fused):
+        probabilities = sigmoid(state.z) * 100
+        ruled = prescreen(state.x)
+        return {disease: ruled_result(disease) if disease in ruled else build_result(disease, float(p))
+                for disease, p in zip(fused.diseases, probabilities)}
+    # Encoded values are valid answers themselves, so the regular path reproduces the vector
+    return predict_risk_direct(dict(zip(ALL_FEATURES, state.x.tolist())))
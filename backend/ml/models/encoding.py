@@ -0,0 +1,34 @@
+import logging
+import numpy as np
+
+from ml.config import DIABETES_FEATURES, CARDIOVASCULAR_FEATURES, KIDNEY_STONE_FEATURES
+from ml.data.schema import MISSING, get_rule, bmi_from
+
+logger = logging.getLogger(__name__)
+
+# Map feature lists to model names
+FEATURES = {
+    "diabetes": DIABETES_FEATURES,
+    "cardiovascular": CARDIOVASCULAR_FEATURES,
+    "kidney_stone": KIDNEY_STONE_FEATURES
+}
+
+# Union of every disease's features, in first-seen order
+ALL_FEATURES = list(dict.fromkeys(DIABETES_FEATURES + CARDIOVASCULAR_FEATURES + KIDNEY_STONE_FEATURES))
+
+def encode_record(user_data, features, out=None):
+    """Encode one record into a numeric vector ordered like `features`"""
+    if out is None:
+        out = np.zeros(len(features), dtype=float)
+
+    for i, feature in enumerate(features):
+        out[i] = get_rule(feature).coerce(user_data.get(feature))[0]
+    if "BMI" in features and get_rule("BMI").coerce(user_data.get("BMI"))[1] == MISSING:
+        height, height_error = get_rule("Height").coerce(user_data.get("Height"))
+        weight, weight_error = get_rule("Weight").coerce(user_data.get("Weight"))
+        if height_error is None and weight_error is None:
+            bmi_rule = get_rule("BMI")
+            bmi = bmi_from(height, weight)
+            out[features.index("BMI")] = bmi if bmi_rule.low <= bmi <= bmi_rule.high else bmi_rule.default
+
+    return out
@@ -0,0 +1,209 @@
+"""Held-out evaluation of the disease models with bootstrap confidence intervals.
+
+Reports ROC AUC, expected calibration error (ECE), precision, recall and
+accuracy at EVALUATION_THRESHOLD, each with a percentile interval from
+EVALUATION_RESAMPLES bootstrap resamples of the test split.
+
+The rows are sorted by score once. A resample is just a vector of counts
+saying how often each row was drawn, so every metric of a whole block of
+resamples comes out of sums over that one ordering:
+
+- AUC from per-tie-group positive/negative weights and their running totals
+  (tied scores count one half, as in the Mann-Whitney statistic)
+- precision, recall and accuracy from the rows above the threshold, which
+  are a prefix of the ordering
+- ECE from the calibration bins, which are contiguous runs of the ordering
+
+Results are written next to the reports as {disease}_evaluation.json, and
+one copy per model version is kept in MODELS_DIR/evaluations/. Evaluate
+the saved models on the training run's held-out split from backend/ml with:
+
+    python -m models.evaluation
+"""
+import os
+import sys
+import json
+import logging
+import numpy as np
+from datetime import datetime, timezone
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+
+from ml.config import (MODELS_DIR, EVALUATION_RESAMPLES, EVALUATION_CONFIDENCE, EVALUATION_THRESHOLD,
+                       EVALUATION_BINS)
+
+logger = logging.getLogger(__name__)
+
+METRICS = ["auc", "ece", "precision", "recall", "accuracy"]
+
+# Cells of the (resamples, n) count matrix built at once; bounds the memory of a block
+# to tens of MB however large the test split is
+_BLOCK_ELEMENTS = 1 << 22
+
+class SortedScores:
+    """Labels and scores in descending score order, with the group boundaries the metrics need"""
+
+    def __init__(self, y_true, y_score, threshold=EVALUATION_THRESHOLD, bins=EVALUATION_BINS):
+        y_score = np.asarray(y_score, dtype=float)
+        self.order = np.argsort(-y_score, kind="stable")
+        self.score = y_score[self.order]
+        self.y = np.asarray(y_true, dtype=float)[self.order]
+        self.n = len(self.y)
+        change = np.r_[True, self.score[1:] != self.score[:-1]]
+        # First row of each run of tied scores
+        self.ties = np.flatnonzero(change)
+        # Rows predicted positive (score >= threshold) form a prefix
+        self.cut = int(np.searchsorted(-self.score, -threshold, side="right"))
+        bin_ids = np.minimum((self.score * bins).astype(int), bins - 1)
+        self.bins = np.flatnonzero(np.r_[True, bin_ids[1:] != bin_ids[:-1]])
+
+    def metrics(self, W):
+        """Each metric for every row of W, a (resamples, n) matrix of row weights in sorted order"""
+        pos = W * self.y
+        neg = W - pos
+        group_pos = np.add.reduceat(pos, self.ties, axis=1)
+        group_neg = np.add.reduceat(neg, self.ties, axis=1)
+        pos_above = np.cumsum(group_pos, axis=1) - group_pos
+        total_pos = group_pos.sum(axis=1)
+        total_neg = group_neg.sum(axis=1)
+        total = total_pos + total_neg
+
+        tp = pos[:, :self.cut].sum(axis=1)
+        fp = neg[:, :self.cut].sum(axis=1)
+        calibration_gap = np.abs(np.add.reduceat(pos, self.bins, axis=1)
+                                 - np.add.reduceat(W * self.score, self.bins, axis=1))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return {
+                "auc": (group_neg * (pos_above + 0.5 * group_pos)).sum(axis=1) / (total_pos * total_neg),
+                "ece": calibration_gap.sum(axis=1) / total,
+                "precision": tp / (tp + fp),
+                "recall": tp / total_pos,
+                "accuracy": (tp + total_neg - fp) / total,
+            }
+
+def bootstrap_counts(n, resamples, rng):
+    """(resamples, n) matrix of how often each row is drawn in each resample"""
+    draws = rng.integers(0, n, size=(resamples, n)) + (np.arange(resamples) * n)[:, None]
+    return np.bincount(draws.ravel(), minlength=resamples * n).reshape(resamples, n).astype(float)
+
+def evaluate_scores(y_true, y_score, resamples=EVALUATION_RESAMPLES, confidence=EVALUATION_CONFIDENCE,
+                    threshold=EVALUATION_THRESHOLD, bins=EVALUATION_BINS, seed=42):
+    """Point estimates and bootstrap intervals of every metric for positive-class probabilities"""
+    scores = SortedScores(y_true, y_score, threshold, bins)
+    if scores.n == 0:
+        raise ValueError("Nothing to evaluate")
+    point = scores.metrics(np.ones((1, scores.n)))
+
+    rng = np.random.default_rng(seed)
+    samples = {metric: [] for metric in METRICS}
+    block = max(1, _BLOCK_ELEMENTS // scores.n)
+    for start in range(0, resamples, block):
+        # Every row is equally likely to be drawn, so counts can be drawn straight in sorted order
+        counts = bootstrap_counts(scores.n, min(block, resamples - start), rng)
+        for metric, values in scores.metrics(counts).items():
+            samples[metric].append(values)
+
+    alpha = (1 - confidence) / 2
+    results = {}
+    for metric in METRICS:
+        values = np.concatenate(samples[metric]) if samples[metric] else np.empty(0)
+        valid = values[~np.isnan(values)]
+        entry = {"value": _number(point[metric][0])}
+        if len(valid):
+            lower, upper = np.quantile(valid, [alpha, 1 - alpha])
+            entry.update(lower=_number(lower), upper=_number(upper), std=_number(valid.std()))
+        results[metric] = entry
+
+    return {
+        "rows": scores.n,
+        "positives": int(scores.y.sum()),
+        "threshold": threshold,
+        "calibration_bins": bins,
+        "resamples": resamples,
+        "confidence": confidence,
+        "seed": seed,
+        "metrics": results,
+    }
+
+def _number(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+def evaluation_path(disease, models_dir=None):
+    return os.path.join(models_dir or MODELS_DIR, f"{disease}_evaluation.json")
+
+def save_evaluation(disease, evaluation, model_version, models_dir=None):
+    """Write an evaluation as the latest for `disease` and under its model version"""
+    models_dir = models_dir or MODELS_DIR
+    record = {
+        "disease": disease,
+        "model": model_version,
+        "evaluated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        **evaluation,
+    }
+    archive = os.path.join(models_dir, "evaluations")
+    os.makedirs(archive, exist_ok=True)
+    sha = (model_version.get("source_sha256") or "unknown")[:12]
+    versioned = os.path.join(archive, f"{disease}_{sha}_v{model_version.get('online_version', 0)}.json")
+    for path in (versioned, evaluation_path(disease, models_dir)):
+        with open(path + ".tmp", "w") as f:
+            json.dump(record, f, indent=2)
+        os.replace(path + ".tmp", path)
+    return record
+
+def format_summary(evaluation):
+    """One line per metric: value and interval"""
+    lines = []
+    for metric, entry in evaluation["metrics"].items():
+        if entry["value"] is None:
+            lines.append(f"{metric:>9}: n/a")
+        elif "lower" in entry:
+            lines.append(f"{metric:>9}: {entry['value']:.3f} "
+                         f"[{entry['lower']:.3f}, {entry['upper']:.3f}]")
+        else:
+            lines.append(f"{metric:>9}: {entry['value']:.3f}")
+    return "\n".join(lines)
+
+def evaluate_saved_models(models_dir=None, use_cache=True):
+    """Evaluate the models the service would load on the training run's held-out split"""
+    from sklearn.model_selection import train_test_split
+    from ml.config import DATASET_PATH
+    from ml.data.cache import load_preprocessed_dataset
+    from ml.models.dataset import DISEASE_FEATURES, DISEASE_LABELS, preprocess_dataset, create_target_variable
+    from ml.models.online import current_model
+
+    models_dir = models_dir or MODELS_DIR
+    df = load_preprocessed_dataset(DATASET_PATH, preprocess_dataset, use_cache=use_cache)
+    # Same split as train_models
+    _, test_df = train_test_split(df, test_size=0.2, random_state=42)
+    targets = dict(zip(DISEASE_FEATURES, create_target_variable(test_df)))
+
+    evaluations = {}
+    for disease, features in DISEASE_FEATURES.items():
+        model, header = current_model(disease, models_dir)
+        source = os.path.join(models_dir, f"{disease}_model.pkl")
+        if model is None and os.path.exists(source):
+            # A pipeline that can't be compiled is scored as is
+            import pickle
+            from ml.models.artifact import file_sha256
+            with open(source, "rb") as f:
+                model = pickle.load(f)
+            header = {"source_sha256": file_sha256(source)}
+        if model is None:
+            logger.warning(f"No {disease} model to evaluate")
+            continue
+        X = test_df.reindex(columns=features, fill_value=0)
+        evaluation = evaluate_scores(targets[disease], model.predict_proba(X)[:, 1])
+        version = {"source_sha256": header.get("source_sha256"), "online_version": int(header.get("version", 0))}
+        evaluations[disease] = save_evaluation(disease, evaluation, version, models_dir)
+        logger.info(f"{DISEASE_LABELS[disease]} evaluation:\n{format_summary(evaluation)}")
+    return evaluations
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="Bootstrap evaluation of the saved models")
+    parser.add_argument("--no-cache", action="store_true", help="re-preprocess the CSV instead of using the cache")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    evaluate_saved_models(use_cache=not args.no_cache)
@@ -0,0 +1,128 @@
+"""One feature matrix shared by the training of every disease model.
+
+The disease feature lists overlap (age, sex, height and weight are in all
+three, BMI and the lifestyle answers in two), so training encodes the union
+of them once into a single float matrix, fits one FeatureStandardizer on it
+and standardizes it in place. Every feature then has one set of statistics,
+and each disease model's preprocessor is a subset of the shared one rather
+than a refit on a copy of its own columns.
+
+LogisticRegression only fits on a C-contiguous matrix and copies anything
+else, so a disease's columns are taken out of the standardized matrix once,
+straight into the layout the solver uses, and nothing else is copied per
+disease.
+"""
+import numpy as np
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.utils.validation import check_is_fitted
+
+def union_features(feature_lists):
+    """Every feature of the lists, in order of first appearance"""
+    return list(dict.fromkeys(f for features in feature_lists for f in features))
+
+def feature_matrix(df, features):
+    """C-ordered float matrix of `features` in `df`, 0 for absent columns
+
+    Filled column by column, so the only full-size allocation is the result.
+    """
+    X = np.empty((len(df), len(features)))
+    for j, feature in enumerate(features):
+        X[:, j] = df[feature].to_numpy(dtype=float) if feature in df.columns else 0.0
+    return X
+
+def feature_statistics(X):
+    """Median fill values, then the means and scales of the filled columns"""
+    n_features = X.shape[1]
+    fill, mean, scale = np.zeros(n_features), np.zeros(n_features), np.ones(n_features)
+    for j in range(n_features):
+        # One column at a time, so no temporary is larger than a column
+        column = np.array(X[:, j], dtype=float)
+        missing = np.isnan(column)
+        if missing.all():
+            column[:] = 0.0
+        elif missing.any():
+            fill[j] = np.median(column[~missing])
+            column[missing] = fill[j]
+        else:
+            fill[j] = np.median(column)
+        mean[j] = column.mean()
+        scale[j] = column.std()
+    # Constant columns are left unscaled, as StandardScaler does
+    scale[scale < 10 * np.finfo(float).eps] = 1.0
+    return fill, mean, scale
+
+def columns_of(Z, features, subset):
+    """The `subset` columns of Z, as the C-ordered copy LogisticRegression fits on"""
+    position = {feature: j for j, feature in enumerate(features)}
+    return np.take(Z, [position[feature] for feature in subset], axis=1)
+
+class FeatureStandardizer(TransformerMixin, BaseEstimator):
+    """Median imputation followed by standardization, in one step
+
+    Equivalent to SimpleImputer(strategy='median') + StandardScaler, but the
+    fitted statistics can be shared: subset() gives the standardizer of some
+    of the columns without refitting.
+    """
+
+    def fit(self, X, y=None):
+        names = list(X.columns) if hasattr(X, 'columns') else None
+        X = np.asarray(X, dtype=float)
+        self._set_statistics(*feature_statistics(X), names, X.shape[1])
+        return self
+
+    def _set_statistics(self, fill, mean, scale, names, n_features):
+        self.statistics_ = fill
+        self.mean_ = mean
+        self.scale_ = scale
+        self.n_features_in_ = n_features
+        if names is not None:
+            self.feature_names_in_ = np.asarray(names, dtype=object)
+
+    def transform(self, X, copy=True):
+        check_is_fitted(self, 'mean_')
+        if hasattr(X, 'columns') and hasattr(self, 'feature_names_in_'):
+            X = X[list(self.feature_names_in_)]
+        X = np.array(X, dtype=float, copy=True) if copy else np.asarray(X, dtype=float)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in_:
+            raise ValueError(f"Expected {self.n_features_in_} features, got {X.shape[-1]}")
+        missing = np.isnan(X)
+        if missing.any():
+            X[missing] = self.statistics_[np.nonzero(missing)[1]]
+        X -= self.mean_
+        X /= self.scale_
+        return X
+
+    def subset(self, features):
+        """Fitted standardizer of `features`, a subset of the fitted columns"""
+        check_is_fitted(self, 'feature_names_in_')
+        position = {feature: i for i, feature in enumerate(self.feature_names_in_)}
+        columns = [position[feature] for feature in features]
+        standardizer = FeatureStandardizer()
+        standardizer._set_statistics(self.statistics_[columns], self.mean_[columns], self.scale_[columns],
+                                     list(features), len(columns))
+        return standardizer
+
+class SharedFeatures:
+    """Train and test matrices over the union of several feature lists, standardized once
+
+    The statistics come from the training rows only, as a pipeline fitted on
+    them would have.
+    """
+
+    def __init__(self, train_df, test_df, feature_lists):
+        self.features = union_features(feature_lists)
+        self.Z_train = feature_matrix(train_df, self.features)
+        self._standardizer = FeatureStandardizer()
+        self._standardizer._set_statistics(*feature_statistics(self.Z_train), self.features, len(self.features))
+        self._standardizer.transform(self.Z_train, copy=False)
+        self.Z_test = self._standardizer.transform(feature_matrix(test_df, self.features), copy=False)
+
+    def standardizer(self, features):
+        """Fitted FeatureStandardizer of `features`"""
+        return self._standardizer.subset(features)
+
+    def train_columns(self, features):
+        return columns_of(self.Z_train, self.features, features)
+
+    def test_columns(self, features):
+        return columns_of(self.Z_test, self.features, features)
@@ -0,0 +1,214 @@
+"""Online updates of the disease models from newly labelled records.
+
+Run from backend/ml with a CSV or NDJSON file of survey answers plus one
+0/1 label column per confirmed diagnosis, named after the disease
+(diabetes, cardiovascular, kidney_stone; blank where unknown):
+
+    python -m models.online confirmed.csv
+
+The answers are validated and encoded exactly as the service encodes a
+request (data/schema.py), so missing or invalid answers get the same
+defaults the model sees when serving. Each model's folded weights are
+unfolded back into the standardized space of its training scaler, and a few
+epochs of mini-batch SGD on the logistic loss run over the new records only,
+with an L2 pull towards the current weights so a small batch nudges the
+model rather than replacing it. The cost depends on the size of the batch,
+not of the training history.
+
+The result is written as the next version of {disease}_model.bin, which the
+running service picks up through its model watcher. The last few versions
+are also kept in MODELS_DIR/online/; copying one back over the live file
+rolls back to it. A full retrain replaces the pickle and its artifact, so
+online updates start again from the retrained model.
+"""
+import os
+import sys
+import glob
+import shutil
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from datetime import datetime, timezone
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(os.path.dirname(current_dir)))
+
+from ml.config import (MODELS_DIR, ONLINE_EPOCHS, ONLINE_LEARNING_RATE, ONLINE_BATCH_SIZE,
+                       ONLINE_L2, ONLINE_KEEP_VERSIONS)
+from ml.models.dataset import DISEASE_FEATURES, DISEASE_LABELS
+from ml.models.encoding import ALL_FEATURES
+from ml.data.schema import validate_records
+from ml.models.compiled import CompiledModel, compile_pipeline, sigmoid
+from ml.models.artifact import file_sha256, load_artifact, save_artifact
+
+logger = logging.getLogger(__name__)
+
+def read_labelled(path):
+    """Raw records from a CSV or NDJSON file"""
+    if path.endswith((".jsonl", ".ndjson", ".json")):
+        return pd.read_json(path, lines=True)
+    return pd.read_csv(path)
+
+def encode_labelled(df, diseases=DISEASE_FEATURES):
+    """Encoded features plus {disease: (row mask, labels)} for the diseases with labels
+
+    Rows without a 0/1 label for a disease are left out of that disease's
+    update.
+    """
+    labels = {}
+    for disease in diseases:
+        if disease in df.columns:
+            y = pd.to_numeric(df[disease], errors='coerce').to_numpy()
+            known = np.isin(y, (0, 1))
+            if known.any():
+                labels[disease] = (known, y[known].astype(int))
+    records = df.drop(columns=[d for d in diseases if d in df.columns]).to_dict("records")
+    X, errors = validate_records(records, ALL_FEATURES)
+    if errors:
+        logger.warning(f"{len(errors)} invalid answers in the update batch were replaced by defaults")
+    return pd.DataFrame(X, columns=ALL_FEATURES), labels
+
+def current_model(disease, models_dir=None):
+    """(CompiledModel, artifact header) the service would load for `disease`, or (None, None)"""
+    models_dir = models_dir or MODELS_DIR
+    source = os.path.join(models_dir, f"{disease}_model.pkl")
+    path = os.path.join(models_dir, f"{disease}_model.bin")
+    source_sha256 = file_sha256(source) if os.path.exists(source) else None
+
+    if os.path.exists(path):
+        try:
+            model, header = load_artifact(path)
+            if model.features == DISEASE_FEATURES[disease] and header.get("source_sha256") == source_sha256:
+                return model, header
+            logger.info(f"Artifact {path} is stale, starting from {source}")
+        except ValueError as e:
+            logger.warning(f"Ignoring unreadable artifact {path}: {str(e)}")
+
+    if source_sha256 is None:
+        return None, None
+    import pickle
+    with open(source, "rb") as f:
+        pipeline = pickle.load(f)
+    try:
+        model = compile_pipeline(pipeline, DISEASE_FEATURES[disease])
+    except ValueError as e:
+        logger.warning(f"Model {disease} can't be updated online: {str(e)}")
+        return None, None
+    return model, {"source_sha256": source_sha256}
+
+def log_loss(model, X, y):
+    """Mean logistic loss of a CompiledModel on encoded rows"""
+    p = np.clip(sigmoid(model.decision_function(X)), 1e-12, 1 - 1e-12)
+    return float(-np.mean(y * np.log(p) + (1 - y) * np.log(1 - p)))
+
+def sgd_update(model, X, y, epochs=ONLINE_EPOCHS, learning_rate=ONLINE_LEARNING_RATE,
+               batch_size=ONLINE_BATCH_SIZE, l2=ONLINE_L2, seed=42):
+    """A CompiledModel updated by mini-batch SGD on (X, y), starting from `model`
+
+    Works in the standardized space of the training scaler, where the
+    step size means the same thing for every feature, and folds the result
+    back into raw-feature weights at the end.
+    """
+    X = np.asarray(X, dtype=float)
+    if np.isnan(X).any():
+        X = np.where(np.isnan(X), np.nan_to_num(model.fill), X)
+    Z = (X - model.mean) / model.scale
+    y = np.asarray(y, dtype=float)
+
+    w_start = model.weights * model.scale
+    b = model.intercept + float(np.dot(model.weights, model.mean))
+    w = w_start.copy()
+    rng = np.random.default_rng(seed)
+    for _ in range(epochs):
+        order = rng.permutation(len(y))
+        for start in range(0, len(y), batch_size):
+            rows = order[start:start + batch_size]
+            error = sigmoid(Z[rows] @ w + b) - y[rows]
+            w -= learning_rate * (Z[rows].T @ error / len(rows) + l2 * (w - w_start))
+            b -= learning_rate * float(error.mean())
+
+    folded = w / model.scale
+    intercept = b - float(np.dot(folded, model.mean))
+    return CompiledModel(model.features, folded, intercept, model.fill, model.mean, model.scale)
+
+def archive_dir(models_dir=None):
+    return os.path.join(models_dir or MODELS_DIR, "online")
+
+def archived_versions(disease, models_dir=None):
+    """{version: path} of the numbered artifact copies kept for a disease"""
+    prefix = f"{disease}_model.v"
+    versions = {}
+    for path in glob.glob(os.path.join(archive_dir(models_dir), prefix + "*.bin")):
+        number = os.path.basename(path)[len(prefix):-len(".bin")]
+        if number.isdigit():
+            versions[int(number)] = path
+    return versions
+
+def prune_versions(disease, keep=ONLINE_KEEP_VERSIONS, models_dir=None):
+    archived = archived_versions(disease, models_dir)
+    for version in sorted(archived)[:max(len(archived) - keep, 0)]:
+        os.remove(archived[version])
+
+def update_disease(disease, X, y, models_dir=None, **options):
+    """Update one disease model from encoded rows and labels; returns the new version or None"""
+    models_dir = models_dir or MODELS_DIR
+    model, header = current_model(disease, models_dir)
+    if model is None:
+        logger.warning(f"No {DISEASE_LABELS[disease].lower()} model to update")
+        return None
+
+    X = X[DISEASE_FEATURES[disease]].to_numpy(dtype=float)
+    before = log_loss(model, X, y)
+    updated = sgd_update(model, X, y, **options)
+    after = log_loss(updated, X, y)
+
+    path = os.path.join(models_dir, f"{disease}_model.bin")
+    version = max([int(header.get("version", 0)), *archived_versions(disease, models_dir)]) + 1
+    metadata = {
+        "version": version,
+        "online_records": int(header.get("online_records", 0)) + len(y),
+        "updated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+    }
+    # Keep a numbered copy for rollback, then swap the live artifact atomically
+    save_artifact(updated, path, disease, os.path.join(models_dir, f"{disease}_model.pkl"), metadata)
+    os.makedirs(archive_dir(models_dir), exist_ok=True)
+    shutil.copyfile(path, os.path.join(archive_dir(models_dir), f"{disease}_model.v{version}.bin"))
+    prune_versions(disease, models_dir=models_dir)
+
+    logger.info(f"{DISEASE_LABELS[disease]} model updated to version {version} from {len(y)} records "
+                f"(log loss on the batch {before:.4f} -> {after:.4f})")
+    return version
+
+def update_models(df, diseases=None, models_dir=None, **options):
+    """Update every model that has labels in `df`; returns {disease: new version}"""
+    features, labels = encode_labelled(df, diseases or list(DISEASE_FEATURES))
+    versions = {}
+    for disease, (known, y) in labels.items():
+        try:
+            version = update_disease(disease, features[known], y, models_dir, **options)
+        except Exception as e:
+            logger.error(f"Error updating {disease} model: {str(e)}")
+            continue
+        if version is not None:
+            versions[disease] = version
+    if not labels:
+        logger.warning(f"No label columns found; expected some of {list(DISEASE_FEATURES)}")
+    return versions
+
+def main():
+    parser = argparse.ArgumentParser(description="Update the models from newly labelled records")
+    parser.add_argument("input", help="CSV or NDJSON of survey answers with per-disease 0/1 label columns")
+    parser.add_argument("--diseases", nargs="+", choices=list(DISEASE_FEATURES), default=None)
+    parser.add_argument("--epochs", type=int, default=ONLINE_EPOCHS)
+    parser.add_argument("--learning-rate", type=float, default=ONLINE_LEARNING_RATE)
+    parser.add_argument("--batch-size", type=int, default=ONLINE_BATCH_SIZE)
+    parser.add_argument("--l2", type=float, default=ONLINE_L2, help="pull towards the current weights")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    update_models(read_labelled(args.input), args.diseases, epochs=args.epochs,
+                  learning_rate=args.learning_rate, batch_size=args.batch_size, l2=args.l2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+import logging
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+logger = logging.getLogger(__name__)
+
+class SharedFrame:
+    """A numeric DataFrame copied once into shared memory for worker processes
+
+    Workers get a small `spec` (segment name, shape, columns, dtypes) and map the
+    same buffer with `AttachedFrame`, so the data is never pickled per worker.
+    """
+
+    def __init__(self, df, columns=None):
+        """`df` is a DataFrame, or a 2-D float array whose columns are named by `columns`"""
+        if columns is None:
+            values = df.to_numpy(dtype=float)
+            columns = list(df.columns)
+            dtypes = {column: str(dtype) for column, dtype in df.dtypes.items()}
+        else:
+            values = np.asarray(df, dtype=float)
+            dtypes = {column: "float64" for column in columns}
+        self._shm = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=float, buffer=self._shm.buf)[:] = values
+        self.spec = {
+            "name": self._shm.name,
+            "shape": values.shape,
+            "columns": list(columns),
+            "dtypes": dtypes,
+        }
+
+    def close(self):
+        self._shm.close()
+        self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def _attach(name):
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Before Python 3.13 attaching always registers with the resource tracker;
+        # pool workers share the parent's tracker, so that registration is a no-op
+        return shared_memory.SharedMemory(name=name)
+
+class AttachedFrame:
+    """Read-only view of a SharedFrame inside a worker process"""
+
+    def __init__(self, spec):
+        self._shm = _attach(spec["name"])
+        self.values = np.ndarray(spec["shape"], dtype=float, buffer=self._shm.buf)
+        self.values.flags.writeable = False
+        self.columns = spec["columns"]
+        self.dtypes = spec["dtypes"]
+        self._position = {column: i for i, column in enumerate(self.columns)}
+
+    def column(self, name):
+        """Zero-copy view of one column"""
+        return self.values[:, self._position[name]]
+
+    def frame(self, columns):
+        """DataFrame of `columns` with their original dtypes"""
+        df = pd.DataFrame(self.values[:, [self._position[c] for c in columns]], columns=columns)
+        return df.astype({c: self.dtypes[c] for c in columns})
+
+    def close(self):
+        self.values = None
+        self._shm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,8 +1,7 @@
 import os
 import sys
-import pandas as pd
-import pickle
 import logging
+import threading
 import numpy as np
 
 # Set up logging
@@ -10,59 +9,36 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 # Import from config
-from ml.config import (DIABETES_FEATURES, CARDIOVASCULAR_FEATURES, KIDNEY_STONE_FEATURES, 
-                     MODELS_DIR, FEATURE_MAPPINGS)
+from ml.config import (MODELS_DIR, USE_COMPILED_MODELS, PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL,
+                       RULE_PRESCREEN, RULE_PRESCREEN_SCORE)
+from .cache import PredictionCache
+from .compiled import CompiledModel
+from .encoding import FEATURES, ALL_FEATURES, encode_record
+from .rules import compile_rules
+from ml.data.schema import validate_records
+from ml.recommendations import engine as recommendations
+from .registry import load_models, get_model_state, add_reload_listener
+from ml.utils.metrics import STAGE_SECONDS, PREDICTION_ERRORS, MOCK_PREDICTIONS, RULE_PRESCREENED, sample_payload
 
 # Make sure models directory exists
 os.makedirs(MODELS_DIR, exist_ok=True)
 
-# Map feature lists to model names
-FEATURES = {
-    "diabetes": DIABETES_FEATURES,
-    "cardiovascular": CARDIOVASCULAR_FEATURES,
-    "kidney_stone": KIDNEY_STONE_FEATURES
-}
-
-models = {}
-
-def calculate_bmi(height, weight):
-    """Calculate BMI from height (cm) and weight (kg)"""
-    try:
-        height_m = float(height) / 100
-        weight_kg = float(weight)
-        if height_m <= 0:
-            return 0
-        return weight_kg / (height_m ** 2)
-    except (ZeroDivisionError, TypeError, ValueError):
-        logger.warning(f"BMI calculation failed for height={height}, weight={weight}")
-        return 0
-
-def load_models():
-    """Load all trained models from disk"""
-    global models
-    for disease in ['diabetes', 'cardiovascular', 'kidney_stone']:
-        model_path = os.path.join(MODELS_DIR, f"{disease}_model.pkl")
-        logger.info(f"Attempting to load model from: {model_path}")
-        
-        try:
-            if os.path.exists(model_path):
-                with open(model_path, "rb") as f:
-                    models[disease] = pickle.load(f)
-                logger.info(f"Successfully loaded model for {disease}")
-            else:
-                logger.warning(f"Model file not found: {model_path}. Using mock model.")
-                models[disease] = create_mock_model()
-        except Exception as e:
-            logger.error(f"Error loading model {disease}: {str(e)}")
-            models[disease] = create_mock_model()
+# Keyed on (disease, model version, encoded vector); emptied whenever models reload
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL)
+add_reload_listener(lambda models, version: prediction_cache.clear())
+
+# Positions of each disease's features within ALL_FEATURES
+_UNION_COLUMNS = {disease: [ALL_FEATURES.index(f) for f in features] for disease, features in FEATURES.items()}
+
+# Per-thread input vectors for the compiled scorer, reused across requests
+_buffers = threading.local()
 
-def create_mock_model():
-    """Create a simple mock model for testing"""
-    class MockModel:
-        def predict_proba(self, X):
-            # Return random but repeatable prediction
-            return np.array([[0.3, 0.7]])
-    return MockModel()
+def _input_buffer(disease):
+    buffers = getattr(_buffers, 'vectors', None)
+    if buffers is None:
+        buffers = _buffers.vectors = {d: np.zeros(len(f)) for d, f in FEATURES.items()}
+        buffers['all'] = np.zeros(len(ALL_FEATURES))
+    return buffers[disease]
 
 def get_risk_level(score):
     """Convert numeric score to risk level"""
@@ -75,103 +51,215 @@ def get_risk_level(score):
 
 def get_recommendations(disease, risk_level):
     """Get recommendations based on disease and risk level"""
-    recommendations = {
-        "diabetes": {
-            "low": ["Maintain a balanced diet", "Regular check-ups annually", "Stay physically active"],
-            "medium": ["Reduce sugar intake", "Exercise at least 3 times a week", "Monitor blood sugar periodically"],
-            "high": ["Consult a doctor soon", "Daily blood sugar monitoring", "Follow a strict diabetic diet plan"]
-        },
-        "cardiovascular": {
-            "low": ["Maintain healthy lifestyle", "Regular exercise", "Balanced diet"],
-            "medium": ["Reduce salt intake", "Exercise regularly", "Monitor blood pressure monthly"],
-            "high": ["Consult a cardiologist", "Consider medication options", "Follow a heart-healthy diet strictly"]
-        },
-        "kidney_stone": {
-            "low": ["Stay hydrated", "Moderate calcium intake", "Reduce sodium consumption"],
-            "medium": ["Drink at least 2L water daily", "Reduce oxalate-rich foods", "Consider dietary changes"],
-            "high": ["Consult a urologist", "Follow specific diet plans", "Increase fluid intake significantly"]
-        }
-    }
-    return recommendations.get(disease, {}).get(risk_level, ["Consult a healthcare professional"])
+    return recommendations.get_recommendations(disease, risk_level)
 
 def prepare_input_data(user_data, disease):
     """Prepare input data ensuring all features are present and correctly typed"""
+    # pandas is only needed for sklearn pipelines, so it isn't imported at startup
+    import pandas as pd
     features = FEATURES[disease]
-    
-    input_df = pd.DataFrame(index=[0])
-    
-    for feature in features:
-        if feature in FEATURE_MAPPINGS and feature in user_data:
-            value = user_data[feature]
-            if isinstance(value, str) and value in FEATURE_MAPPINGS[feature]:
-                input_df[feature] = FEATURE_MAPPINGS[feature][value]
-            else:
-                try:
-                    numeric_val = float(value)
-                    if numeric_val >= 0 and numeric_val.is_integer():
-                        input_df[feature] = numeric_val
-                    else:
-                        input_df[feature] = 0
-                except (ValueError, TypeError):
-                    input_df[feature] = 0
-        elif feature in user_data:
-            try:
-                input_df[feature] = float(user_data[feature])
-            except (ValueError, TypeError):
-                input_df[feature] = 0
-        else:
-            input_df[feature] = 0
-    if "BMI" in features and "BMI" not in user_data and "Height" in user_data and "Weight" in user_data:
-        input_df["BMI"] = calculate_bmi(user_data["Height"], user_data["Weight"])
-    for feature in features:
-        if feature not in input_df.columns:
-            input_df[feature] = 0
- 
-    return input_df[features] 
+    return pd.DataFrame([encode_record(user_data, features)], columns=features)
+
+def use_compiled_scoring(models):
+    """Score with the NumPy models when enabled, or when every model was loaded from an artifact"""
+    return USE_COMPILED_MODELS or all(isinstance(model, CompiledModel) for model in models.values())
 
+def _result(disease, prediction):
+    risk_level = get_risk_level(prediction/100)
+    return {
+        "risk_score": round(prediction, 1),
+        "risk_level": risk_level,
+        "recommendations": recommendations.get_recommendations(disease, risk_level),
+        "advice": recommendations.get_detailed_advice(disease, risk_level)
+    }
+
+def build_result(disease, prediction):
+    """Build the response entry for one disease from a 0-100 risk score"""
+    with STAGE_SECONDS.time(stage="recommendations", disease=disease):
+        return _result(disease, prediction)
+
+def build_results(disease, predictions):
+    """Response entries for a whole column of 0-100 risk scores, timed as one stage"""
+    with STAGE_SECONDS.time(stage="recommendations", disease=disease):
+        return [_result(disease, prediction) for prediction in predictions.tolist()]
+
+def prescreen(x):
+    """Diseases whose labelling rule already fires for an encoded union vector (none unless RULE_PRESCREEN)"""
+    if not RULE_PRESCREEN:
+        return ()
+    return compile_rules().matching(x, ALL_FEATURES)
+
+def prescreen_batch(X_all):
+    """{disease: rows whose labelling rule already fires}, empty unless RULE_PRESCREEN"""
+    if not RULE_PRESCREEN:
+        return {}
+    with STAGE_SECONDS.time(stage="prescreen", disease="all"):
+        return compile_rules().evaluate_matrix(X_all, ALL_FEATURES)
+
+def ruled_result(disease):
+    RULE_PRESCREENED.inc(disease=disease)
+    return build_result(disease, RULE_PRESCREEN_SCORE)
+
+def _apply_prescreen(predictions, ruled, disease):
+    """Scores with the rows a labelling rule decided set to RULE_PRESCREEN_SCORE"""
+    if ruled is None:
+        return predictions
+    count = int(ruled.sum())
+    if count:
+        RULE_PRESCREENED.inc(count, disease=disease)
+    return np.where(ruled, RULE_PRESCREEN_SCORE, predictions)
+
+def _count_mock(models, disease, records=1):
+    if getattr(models.get(disease), 'is_mock', False):
+        MOCK_PREDICTIONS.inc(records, disease=disease)
 
 def predict_risk_direct(user_data):
     """Get predictions for all disease models"""
-    if not models:
-        load_models()
+    models, compiled, fused, version = get_model_state()
+    log_payload = sample_payload()
+    compiled_enabled = use_compiled_scoring(models)
+
+    if compiled_enabled and fused is not None:
+        try:
+            with STAGE_SECONDS.time(stage="prepare_input", disease="all"):
+                x = encode_record(user_data, ALL_FEATURES, out=_input_buffer('all'))
+            ruled = prescreen(x)
+            if len(ruled) == len(fused.diseases):
+                return {disease: ruled_result(disease) for disease in fused.diseases}
+            key = ('fused', version, x.tobytes())
+            probabilities = prediction_cache.get(key)
+            if probabilities is None:
+                with STAGE_SECONDS.time(stage="predict_proba", disease="all"):
+                    probabilities = fused.score_vector(x)
+                prediction_cache.put(key, probabilities)
+            if log_payload:
+                logger.info(f"Fused input {dict(zip(ALL_FEATURES, x))} -> {probabilities}")
+            return {disease: ruled_result(disease) if disease in ruled else build_result(disease, float(p) * 100)
+                    for disease, p in zip(fused.diseases, probabilities)}
+        except Exception as e:
+            logger.error(f"Error in fused prediction, scoring diseases separately: {str(e)}")
     
     results = {}
+    ruled = prescreen(encode_record(user_data, ALL_FEATURES)) if RULE_PRESCREEN else ()
 
     for disease in ['diabetes', 'cardiovascular', 'kidney_stone']:
+        if disease in ruled:
+            results[disease] = ruled_result(disease)
+            continue
         try:
-            X = prepare_input_data(user_data, disease)
-            
-            # Debug logging - print input features
-            logger.info(f"Input data for {disease} prediction:")
-            logger.info(X)
-   
-            if disease in models and models[disease] is not None:
-                prediction_prob = models[disease].predict_proba(X)[0][1]
-                
-                # Debug logging - print raw probability
-                logger.info(f"Raw probability for {disease}: {prediction_prob}")
+            use_compiled = disease in compiled and (compiled_enabled or isinstance(models[disease], CompiledModel))
+            with STAGE_SECONDS.time(stage="prepare_input", disease=disease):
+                x = encode_record(user_data, FEATURES[disease], out=_input_buffer(disease) if use_compiled else None)
+            key = (disease, version, x.tobytes())
+            prediction = prediction_cache.get(key)
+
+            if prediction is not None:
+                logger.debug(f"Cached prediction for {disease}")
+            elif use_compiled:
+                with STAGE_SECONDS.time(stage="predict_proba", disease=disease):
+                    prediction = compiled[disease].score_vector(x) * 100
+                prediction_cache.put(key, prediction)
+            elif disease in models and models[disease] is not None:
+                import pandas as pd
+                X = pd.DataFrame([x], columns=FEATURES[disease])
+
+                with STAGE_SECONDS.time(stage="predict_proba", disease=disease):
+                    prediction_prob = models[disease].predict_proba(X)[0][1]
+                _count_mock(models, disease)
+
+                # Sampled debug logging of the model input and raw probability
+                if log_payload:
+                    logger.info(f"Input data for {disease} prediction:")
+                    logger.info(X)
+                    logger.info(f"Raw probability for {disease}: {prediction_prob}")
                 
                 prediction = prediction_prob * 100
+                prediction_cache.put(key, prediction)
             else:
                 prediction = 50.0 
             
-            risk_level = get_risk_level(prediction/100)
-            recommendations_list = get_recommendations(disease, risk_level)
-        
-            results[disease] = {
-                "risk_score": round(prediction, 1),
-                "risk_level": risk_level,
-                "recommendations": recommendations_list
-            }
+            results[disease] = build_result(disease, prediction)
             
-            logger.info(f"Prediction for {disease}: {prediction:.1f}% ({risk_level} risk)")
+            logger.debug(f"Prediction for {disease}: {prediction:.1f}% ({results[disease]['risk_level']} risk)")
 
         except Exception as e:
             logger.error(f"Error in prediction for {disease}: {str(e)}")
-            results[disease] = {
-                "risk_score": 50.0,
-                "risk_level": "medium",
-                "recommendations": get_recommendations(disease, "medium")
-            }
+            PREDICTION_ERRORS.inc(disease=disease)
+            results[disease] = build_result(disease, 50.0)
+
+    return results
+
+def score_batch(records):
+    """Get predictions for a list of records plus the validation errors found in them
+
+    The records are validated and encoded once over the union of all
+    features; each disease scores its own columns of that matrix.
+    """
+    models, compiled, fused, _ = get_model_state()
+    compiled_enabled = use_compiled_scoring(models)
+
+    results = [{} for _ in records]
+    if not records:
+        return results, []
+
+    with STAGE_SECONDS.time(stage="prepare_input", disease="all"):
+        X_all, errors = validate_records(records, ALL_FEATURES)
+    ruled = prescreen_batch(X_all)
+
+    if compiled_enabled and fused is not None:
+        try:
+            with STAGE_SECONDS.time(stage="predict_proba", disease="all"):
+                if ruled:
+                    # Rows every disease's rule already decides skip the model
+                    scored = ~np.logical_and.reduce([ruled[d] for d in fused.diseases])
+                    probabilities = np.full((len(records), len(fused.diseases)), RULE_PRESCREEN_SCORE)
+                    probabilities[scored] = fused.predict_proba(X_all[scored]) * 100
+                else:
+                    probabilities = fused.predict_proba(X_all) * 100
+            for k, disease in enumerate(fused.diseases):
+                column = _apply_prescreen(probabilities[:, k], ruled.get(disease), disease)
+                for result, entry in zip(results, build_results(disease, column)):
+                    result[disease] = entry
+            logger.info(f"Fused batch prediction: {len(records)} records")
+            return results, errors
+        except Exception as e:
+            logger.error(f"Error in fused batch prediction, scoring diseases separately: {str(e)}")
+
+    for disease in ['diabetes', 'cardiovascular', 'kidney_stone']:
+        try:
+            rows = ~ruled[disease] if ruled else slice(None)
+            X = X_all[rows][:, _UNION_COLUMNS[disease]]
+            if not len(X):
+                predictions = np.empty(0)
+            elif disease in compiled and (compiled_enabled or isinstance(models[disease], CompiledModel)):
+                with STAGE_SECONDS.time(stage="predict_proba", disease=disease):
+                    predictions = compiled[disease].predict_proba(X)[:, 1] * 100
+            elif disease in models and models[disease] is not None:
+                import pandas as pd
+                X = pd.DataFrame(X, columns=FEATURES[disease])
+                with STAGE_SECONDS.time(stage="predict_proba", disease=disease):
+                    predictions = models[disease].predict_proba(X)[:, 1] * 100
+                _count_mock(models, disease, len(X))
+            else:
+                predictions = np.full(len(X), 50.0)
+
+            if ruled:
+                column = np.full(len(records), RULE_PRESCREEN_SCORE)
+                column[rows] = predictions
+                predictions = _apply_prescreen(column, ruled[disease], disease)
+            for result, entry in zip(results, build_results(disease, np.asarray(predictions, dtype=float))):
+                result[disease] = entry
+
+            logger.info(f"Batch prediction for {disease}: {len(records)} records")
+
+        except Exception as e:
+            logger.error(f"Error in batch prediction for {disease}: {str(e)}")
+            PREDICTION_ERRORS.inc(len(records), disease=disease)
+            for result in results:
+                result[disease] = build_result(disease, 50.0)
+
+    return results, errors
 
-    return results
\ No newline at end of file
+def predict_risk_batch(records):
+    """Get predictions for a list of records with one model call per disease"""
+    return score_batch(records)[0]
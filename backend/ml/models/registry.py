@@ -0,0 +1,177 @@
+import os
+import pickle
+import logging
+import threading
+import numpy as np
+
+from ml.config import MODELS_DIR, MODEL_WATCH_INTERVAL
+from .compiled import compile_models, fuse_models
+from .artifact import load_artifact, file_sha256
+from .encoding import FEATURES, ALL_FEATURES
+
+logger = logging.getLogger(__name__)
+
+MODEL_NAMES = ['diabetes', 'cardiovascular', 'kidney_stone']
+
+# (models, compiled models, fused scorer, version). The tuple is only ever replaced, never
+# mutated, so a reader that grabs it once per request keeps a consistent view
+# while a reload swaps in a new one.
+_state = ({}, {}, None, 0)
+_signature = None
+_reload_lock = threading.Lock()
+_listeners = []
+_watcher = None
+_watcher_stop = threading.Event()
+
+def create_mock_model():
+    """Create a simple mock model for testing"""
+    class MockModel:
+        is_mock = True
+
+        def predict_proba(self, X):
+            # Return random but repeatable prediction
+            return np.tile([0.3, 0.7], (len(X), 1))
+    return MockModel()
+
+def model_path(disease):
+    """Path of the pickled pipeline for a disease"""
+    return os.path.join(MODELS_DIR, f"{disease}_model.pkl")
+
+def artifact_path(disease):
+    """Path of the compact exported artifact for a disease"""
+    return os.path.join(MODELS_DIR, f"{disease}_model.bin")
+
+def artifact_signature():
+    """Fingerprint of the saved model files (mtime and size of each)"""
+    signature = []
+    for disease in MODEL_NAMES:
+        for path in (model_path(disease), artifact_path(disease)):
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append((path, None, None))
+    return tuple(signature)
+
+def _load_artifact(disease):
+    """The exported artifact for a disease, or None if it's missing, stale or unreadable"""
+    path = artifact_path(disease)
+    if not os.path.exists(path):
+        return None
+    try:
+        model, header = load_artifact(path)
+    except Exception as e:
+        logger.error(f"Error loading model artifact {path}: {str(e)}")
+        return None
+
+    if model.features != FEATURES[disease]:
+        logger.warning(f"Artifact {path} has a different feature list than config.py, ignoring it")
+        return None
+    source = model_path(disease)
+    # A pickle retrained after the export wins over the artifact
+    if os.path.exists(source) and header.get("source_sha256") != file_sha256(source):
+        logger.warning(f"Artifact {path} was exported from a different {source}, ignoring it")
+        return None
+    logger.info(f"Successfully loaded model artifact for {disease}")
+    return model
+
+def _load_model(disease, previous=None):
+    """Load one model, keeping `previous` if the file can't be read"""
+    model = _load_artifact(disease)
+    if model is not None:
+        return model
+
+    path = model_path(disease)
+    logger.info(f"Attempting to load model from: {path}")
+
+    try:
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                model = pickle.load(f)
+            logger.info(f"Successfully loaded model for {disease}")
+            return model
+        logger.warning(f"Model file not found: {path}. Using mock model.")
+    except Exception as e:
+        logger.error(f"Error loading model {disease}: {str(e)}")
+
+    if previous is not None:
+        logger.warning(f"Keeping previously loaded model for {disease}")
+        return previous
+    return create_mock_model()
+
+def load_models():
+    """Load all trained models from disk and swap them in as one set"""
+    global _state, _signature
+    with _reload_lock:
+        signature = artifact_signature()
+        previous, _, _, version = _state
+        loaded = {}
+        for disease in MODEL_NAMES:
+            loaded[disease] = _load_model(disease, previous.get(disease))
+        compiled = compile_models(loaded, FEATURES)
+        fused = fuse_models(compiled, MODEL_NAMES, ALL_FEATURES)
+
+        # A half-written file keeps the old model; finishing the write changes
+        # the signature again and triggers another reload
+        version += 1
+        _state = (loaded, compiled, fused, version)
+        _signature = signature
+
+    for listener in list(_listeners):
+        try:
+            listener(loaded, version)
+        except Exception as e:
+            logger.error(f"Model reload listener failed: {str(e)}")
+    return loaded
+
+def get_model_state():
+    """Return (models, compiled models, fused scorer, version), loading the models on first use"""
+    if not _state[0]:
+        load_models()
+    return _state
+
+def get_models():
+    """Return the current model set, loading it on first use"""
+    return get_model_state()[0]
+
+def get_model_version():
+    """Monotonic counter that changes every time a new model set is swapped in"""
+    return _state[3]
+
+def add_reload_listener(listener):
+    """Register `listener(models, version)` to be called after every reload"""
+    _listeners.append(listener)
+
+def reload_if_changed():
+    """Reload the models if the files on disk differ from the loaded set"""
+    if artifact_signature() != _signature:
+        logger.info("Model artifacts changed on disk, reloading")
+        load_models()
+        return True
+    return False
+
+def _watch(interval):
+    while not _watcher_stop.wait(interval):
+        try:
+            reload_if_changed()
+        except Exception as e:
+            logger.error(f"Model watcher failed: {str(e)}")
+
+def start_watcher(interval=MODEL_WATCH_INTERVAL):
+    """Start a background thread that hot-reloads models when their files change"""
+    global _watcher
+    if _watcher is not None and _watcher.is_alive():
+        return _watcher
+    _watcher_stop.clear()
+    _watcher = threading.Thread(target=_watch, args=(interval,), name="model-watcher", daemon=True)
+    _watcher.start()
+    logger.info(f"Watching {MODELS_DIR} for model changes every {interval}s")
+    return _watcher
+
+def stop_watcher():
+    """Stop the background reload thread"""
+    global _watcher
+    _watcher_stop.set()
+    if _watcher is not None:
+        _watcher.join()
+    _watcher = None
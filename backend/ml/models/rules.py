@@ -0,0 +1,101 @@
+"""Declarative labelling rules compiled to vectorized NumPy checks.
+
+A rule set maps each target to a list of clauses; the target is positive
+when any clause holds, and a clause holds when all of its
+(feature, operator, value) conditions do. TARGET_RULES in config.py is the
+rule set behind create_target_variable.
+
+Compiling collects the distinct conditions, so a check shared by several
+clauses or targets (e.g. Age > 40) is computed once. Columns are processed
+in blocks of BLOCK_SIZE rows in one pass, so memory stays flat and the input
+can be anything indexable by feature name: a DataFrame, a dict of arrays or
+the memory-mapped .npy columns written by ml.data.synthetic. Comparisons
+with NaN are false, as they are in pandas.
+"""
+import operator
+import numpy as np
+
+from ml.config import TARGET_RULES
+
+BLOCK_SIZE = 1 << 20
+
+OPERATORS = {
+    ">": (np.greater, operator.gt),
+    ">=": (np.greater_equal, operator.ge),
+    "<": (np.less, operator.lt),
+    "<=": (np.less_equal, operator.le),
+    "==": (np.equal, operator.eq),
+    "!=": (np.not_equal, operator.ne),
+}
+
+class RuleSet:
+    """A compiled rule set"""
+
+    def __init__(self, rules):
+        self.targets = list(rules)
+        self.conditions = []
+        self.clauses = {}
+        index = {}
+        for target, clauses in rules.items():
+            compiled = []
+            for clause in clauses:
+                if not clause:
+                    raise ValueError(f"Empty clause in the rules for {target}")
+                positions = []
+                for feature, op, value in clause:
+                    if op not in OPERATORS:
+                        raise ValueError(f"Unknown operator {op!r} in the rules for {target}")
+                    key = (feature, op, float(value))
+                    if key not in index:
+                        index[key] = len(self.conditions)
+                        self.conditions.append(key)
+                    positions.append(index[key])
+                compiled.append(tuple(positions))
+            self.clauses[target] = compiled
+        self.features = sorted(set(feature for feature, _, _ in self.conditions))
+        self._positions = {}
+
+    def evaluate(self, columns, block_size=BLOCK_SIZE):
+        """{target: boolean array} over columnar data indexable by feature name"""
+        arrays = {feature: np.asarray(columns[feature]) for feature in self.features}
+        n = len(next(iter(arrays.values()))) if arrays else 0
+        results = {target: np.zeros(n, dtype=bool) for target in self.targets}
+
+        for start in range(0, n, block_size):
+            stop = min(start + block_size, n)
+            hits = [OPERATORS[op][0](arrays[feature][start:stop], value) for feature, op, value in self.conditions]
+            for target, clauses in self.clauses.items():
+                out = results[target][start:stop]
+                for clause in clauses:
+                    term = hits[clause[0]]
+                    for position in clause[1:]:
+                        term = term & hits[position]
+                    out |= term
+        return results
+
+    def evaluate_matrix(self, X, features):
+        """{target: boolean array} for the rows of a matrix whose columns are `features`"""
+        position = {feature: j for j, feature in enumerate(features)}
+        return self.evaluate({feature: X[:, position[feature]] for feature in self.features})
+
+    def matching(self, x, features):
+        """Targets whose rule fires for one encoded vector laid out as `features`"""
+        key = tuple(features)
+        conditions = self._positions.get(key)
+        if conditions is None:
+            position = {feature: j for j, feature in enumerate(features)}
+            conditions = self._positions[key] = [(position[feature], OPERATORS[op][1], value)
+                                                 for feature, op, value in self.conditions]
+        hits = [check(x[j], value) for j, check, value in conditions]
+        return [target for target, clauses in self.clauses.items()
+                if any(all(hits[i] for i in clause) for clause in clauses)]
+
+_compiled = {}
+
+def compile_rules(rules=None):
+    """RuleSet for `rules` (TARGET_RULES by default), compiled once per rule set object"""
+    rules = TARGET_RULES if rules is None else rules
+    ruleset = _compiled.get(id(rules))
+    if ruleset is None or ruleset[0] is not rules:
+        ruleset = _compiled[id(rules)] = (rules, RuleSet(rules))
+    return ruleset[1]
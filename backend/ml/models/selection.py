@@ -0,0 +1,142 @@
+"""Cross-validated choice of each disease model's LogisticRegression settings.
+
+Every (C, class_weight) pair in the config grid is scored by ROC AUC over
+stratified k folds of the training split. Folds run in parallel processes
+that share the training frame read-only (see parallel.py). Within a fold a
+FeatureStandardizer, the preprocessor the final models are deployed with, is
+fitted on the fold's training rows and applied once, and for each class weight one
+warm-started classifier walks up the C grid, starting every fit from the
+previous solution. The winning settings are written next to the reports as
+{disease}_selection.json and picked up by later training runs.
+"""
+import os
+import json
+import logging
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from sklearn.linear_model import LogisticRegression
+from sklearn.metrics import roc_auc_score
+from sklearn.model_selection import StratifiedKFold
+
+from ml.config import SELECTION_FOLDS, SELECTION_C_GRID, SELECTION_CLASS_WEIGHTS
+from ml.models.parallel import SharedFrame, AttachedFrame
+from ml.models.features import FeatureStandardizer, feature_matrix, columns_of
+from ml.models.dataset import DISEASE_FEATURES, DISEASE_LABELS, TARGET_COLUMN
+
+logger = logging.getLogger(__name__)
+
+def fold_scores(X_train, y_train, X_val, y_val, c_grid=SELECTION_C_GRID, class_weights=SELECTION_CLASS_WEIGHTS):
+    """Validation AUC of every grid point on one fold, as {(class_weight, C): auc}"""
+    standardizer = FeatureStandardizer().fit(X_train)
+    Xt_train = standardizer.transform(X_train)
+    Xt_val = standardizer.transform(X_val)
+
+    scores = {}
+    for class_weight in class_weights:
+        # Small C first: each fit starts from the more regularized solution before it
+        classifier = LogisticRegression(max_iter=1000, random_state=42, class_weight=class_weight, warm_start=True)
+        for C in sorted(c_grid):
+            classifier.set_params(C=C).fit(Xt_train, y_train)
+            scores[(class_weight, C)] = roc_auc_score(y_val, classifier.decision_function(Xt_val))
+    return scores
+
+def _fold_worker(disease, spec, train_rows, val_rows, c_grid, class_weights):
+    """Process-pool entry point: score the grid on one fold of the shared training frame"""
+    features = DISEASE_FEATURES[disease]
+    with AttachedFrame(spec) as frame:
+        X = columns_of(frame.values, frame.columns, features)
+        y = frame.column(TARGET_COLUMN.format(disease)).astype(int)
+        return fold_scores(X[train_rows], y[train_rows], X[val_rows], y[val_rows], c_grid, class_weights)
+
+def summarize(disease, folds, rows, c_grid, class_weights):
+    """Selection record for one disease from its per-fold score dicts"""
+    grid = []
+    for class_weight in class_weights:
+        for C in sorted(c_grid):
+            scores = [fold[(class_weight, C)] for fold in folds]
+            grid.append({
+                "C": C,
+                "class_weight": class_weight,
+                "mean_score": float(np.mean(scores)),
+                "std_score": float(np.std(scores)),
+                "fold_scores": [float(s) for s in scores],
+            })
+    # Ties go to the stronger regularization
+    best = max(grid, key=lambda entry: (entry["mean_score"], -entry["C"]))
+    return {
+        "disease": disease,
+        "metric": "roc_auc",
+        "folds": len(folds),
+        "rows": rows,
+        "best": {"C": best["C"], "class_weight": best["class_weight"]},
+        "best_score": best["mean_score"],
+        "grid": grid,
+    }
+
+def select_models(diseases, df, targets, folds=SELECTION_FOLDS, c_grid=SELECTION_C_GRID,
+                  class_weights=SELECTION_CLASS_WEIGHTS, workers=None):
+    """Cross-validate the grid for each disease; returns {disease: selection record}
+
+    `df` is the preprocessed training split and `targets` its per-disease
+    labels. Diseases whose labels can't be split into `folds` stratified
+    folds are left out.
+    """
+    splits = {}
+    for disease in diseases:
+        try:
+            splitter = StratifiedKFold(n_splits=folds, shuffle=True, random_state=42)
+            splits[disease] = list(splitter.split(np.zeros(len(df)), targets[disease]))
+        except ValueError as e:
+            logger.warning(f"Skipping model selection for {DISEASE_LABELS[disease].lower()}: {str(e)}")
+
+    tasks = [(disease, train_rows, val_rows) for disease, disease_splits in splits.items()
+             for train_rows, val_rows in disease_splits]
+    workers = min(workers or os.cpu_count() or 1, len(tasks) or 1)
+    logger.info(f"Cross-validating {len(c_grid) * len(class_weights)} settings over {folds} folds "
+                f"for {len(splits)} models on {workers} processes")
+
+    scores = {disease: [] for disease in splits}
+    if workers > 1:
+        shared_df = df.assign(**{TARGET_COLUMN.format(d): targets[d] for d in splits})
+        with SharedFrame(shared_df) as shared, ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [(disease, pool.submit(_fold_worker, disease, shared.spec, train_rows, val_rows,
+                                             c_grid, class_weights))
+                       for disease, train_rows, val_rows in tasks]
+            for disease, future in futures:
+                scores[disease].append(future.result())
+    else:
+        for disease, train_rows, val_rows in tasks:
+            X = feature_matrix(df, DISEASE_FEATURES[disease])
+            y = np.asarray(targets[disease]).astype(int)
+            scores[disease].append(fold_scores(X[train_rows], y[train_rows], X[val_rows], y[val_rows],
+                                               c_grid, class_weights))
+
+    selections = {}
+    for disease, fold_results in scores.items():
+        selections[disease] = summarize(disease, fold_results, len(df), c_grid, class_weights)
+        best = selections[disease]
+        logger.info(f"{DISEASE_LABELS[disease]} best settings: C={best['best']['C']}, "
+                    f"class_weight={best['best']['class_weight']} (CV AUC {best['best_score']:.3f})")
+    return selections
+
+def selection_path(disease, models_dir):
+    return os.path.join(models_dir, f"{disease}_selection.json")
+
+def save_selection(selection, models_dir):
+    """Write a selection record to {disease}_selection.json in models_dir"""
+    path = selection_path(selection["disease"], models_dir)
+    with open(path + ".tmp", "w") as f:
+        json.dump(selection, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def load_selected_params(disease, models_dir):
+    """LogisticRegression settings saved by an earlier selection, or None"""
+    try:
+        with open(selection_path(disease, models_dir)) as f:
+            best = json.load(f)["best"]
+        return {"C": float(best["C"]), "class_weight": best["class_weight"]}
+    except FileNotFoundError:
+        return None
+    except (ValueError, KeyError, TypeError) as e:
+        logger.warning(f"Ignoring unreadable selection for {disease}: {str(e)}")
+        return None
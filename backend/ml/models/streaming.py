@@ -0,0 +1,148 @@
+import logging
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import SGDClassifier
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from ml.config import DATASET_PATH, STREAM_CHUNK_SIZE, STREAM_EPOCHS, STREAM_TEST_SIZE
+from ml.models.dataset import (DISEASE_FEATURES, DISEASE_LABELS, preprocess_dataset,
+                               create_target_variable, check_class_counts)
+
+logger = logging.getLogger(__name__)
+
+AUC_BINS = 1000
+
+def iter_chunks(path=DATASET_PATH, chunksize=STREAM_CHUNK_SIZE, test_size=STREAM_TEST_SIZE, seed=42):
+    """Yield (features, targets, is_test) for each preprocessed CSV chunk
+
+    Each chunk goes through the same preprocess_dataset / create_target_variable
+    as the in-memory path; missing values are filled with the chunk's medians.
+    The held-out rows are drawn from a seed per chunk, so every pass over the
+    file sees the same split.
+    """
+    for i, chunk in enumerate(pd.read_csv(path, chunksize=chunksize)):
+        df = preprocess_dataset(chunk)
+        for features in DISEASE_FEATURES.values():
+            for f in features:
+                if f not in df.columns:
+                    df[f] = 0
+        targets = dict(zip(DISEASE_FEATURES, (np.asarray(t) for t in create_target_variable(df))))
+        is_test = np.random.default_rng([seed, i]).random(len(df)) < test_size
+        yield df, targets, is_test
+
+def format_report(confusion):
+    """classification_report-style text from a 2x2 confusion matrix of counts"""
+    confusion = np.asarray(confusion, dtype=float)
+    support = confusion.sum(axis=1)
+    predicted = confusion.sum(axis=0)
+    correct = np.diag(confusion)
+    precision = np.divide(correct, predicted, out=np.zeros(2), where=predicted > 0)
+    recall = np.divide(correct, support, out=np.zeros(2), where=support > 0)
+    f1 = np.divide(2 * precision * recall, precision + recall,
+                   out=np.zeros(2), where=(precision + recall) > 0)
+    total = int(support.sum())
+    weights = support / max(total, 1)
+
+    def row(name, values, count):
+        cells = "".join(f" {v:>9.2f}" if isinstance(v, float) else f" {v:>9s}" for v in values)
+        return f"{name:>12s} {cells} {count:>9d}"
+
+    lines = [f"{'':>12s} " + "".join(f" {h:>9s}" for h in ("precision", "recall", "f1-score", "support")), ""]
+    for label in range(2):
+        lines.append(row(str(label), [precision[label], recall[label], f1[label]], int(support[label])))
+    lines.append("")
+    lines.append(row("accuracy", ["", "", float(correct.sum() / max(total, 1))], total))
+    lines.append(row("macro avg", [precision.mean(), recall.mean(), f1.mean()], total))
+    lines.append(row("weighted avg", [precision @ weights, recall @ weights, f1 @ weights], total))
+    return "\n".join(lines) + "\n"
+
+def histogram_auc(positive_hist, negative_hist):
+    """ROC AUC from score histograms of the two classes (exact up to bin width)"""
+    positives, negatives = positive_hist.sum(), negative_hist.sum()
+    if positives == 0 or negatives == 0:
+        return np.nan
+    negatives_below = np.cumsum(negative_hist) - negative_hist
+    return float(np.sum(positive_hist * (negatives_below + 0.5 * negative_hist)) / (positives * negatives))
+
+def train_models_streaming(path=DATASET_PATH, chunksize=STREAM_CHUNK_SIZE, epochs=STREAM_EPOCHS,
+                           test_size=STREAM_TEST_SIZE, seed=42, save=True):
+    """Train all disease models out of core, one CSV chunk at a time
+
+    Pass 1 fits the scalers and counts classes, the next `epochs` passes update
+    a logistic-loss SGDClassifier with partial_fit, and a final pass scores the
+    held-out rows into a confusion matrix and score histograms. Only one chunk
+    is in memory at a time, whatever the size of the file.
+    """
+    logger.info(f"Starting streaming model training from {path} in chunks of {chunksize}")
+    chunks = lambda: iter_chunks(path, chunksize, test_size, seed)
+
+    scalers = {d: StandardScaler() for d in DISEASE_FEATURES}
+    class_counts = {d: np.zeros(2, dtype=np.int64) for d in DISEASE_FEATURES}
+    rows = 0
+    for df, targets, is_test in chunks():
+        train = ~is_test
+        rows += len(df)
+        for disease, features in DISEASE_FEATURES.items():
+            if train.any():
+                scalers[disease].partial_fit(df.loc[train, features])
+            class_counts[disease] += np.bincount(targets[disease][train], minlength=2)
+    logger.info(f"Scanned {rows} records")
+
+    classifiers = {}
+    for disease in DISEASE_FEATURES:
+        counts = class_counts[disease]
+        if check_class_counts(counts, DISEASE_LABELS[disease]):
+            # partial_fit can't use class_weight='balanced', so spell it out from the counts
+            class_weight = {c: counts.sum() / (2 * counts[c]) for c in (0, 1)}
+            classifiers[disease] = SGDClassifier(loss='log_loss', class_weight=class_weight, random_state=42)
+        else:
+            logger.warning(f"Skipping {DISEASE_LABELS[disease].lower()} model training due to class imbalance")
+
+    for epoch in range(epochs):
+        rng = np.random.default_rng([seed, epoch])
+        for df, targets, is_test in chunks():
+            order = rng.permutation(np.flatnonzero(~is_test))
+            if len(order) == 0:
+                continue
+            for disease, classifier in classifiers.items():
+                X = scalers[disease].transform(df[DISEASE_FEATURES[disease]].iloc[order])
+                classifier.partial_fit(X, targets[disease][order], classes=[0, 1])
+        logger.info(f"Completed epoch {epoch + 1}/{epochs}")
+
+    models = {d: None for d in DISEASE_FEATURES}
+    for disease, classifier in classifiers.items():
+        models[disease] = Pipeline([
+            ('preprocessor', scalers[disease]),
+            ('classifier', classifier)
+        ])
+
+    confusion = {d: np.zeros((2, 2), dtype=np.int64) for d in classifiers}
+    edges = np.linspace(0, 1, AUC_BINS + 1)
+    histograms = {d: np.zeros((2, AUC_BINS), dtype=np.int64) for d in classifiers}
+    for df, targets, is_test in chunks():
+        if not is_test.any():
+            continue
+        for disease in classifiers:
+            X_test = df.loc[is_test, DISEASE_FEATURES[disease]]
+            y_test = targets[disease][is_test]
+            y_prob = models[disease].predict_proba(X_test)[:, 1]
+            y_pred = (y_prob > 0.5).astype(int)
+            confusion[disease] += np.bincount(2 * y_test + y_pred, minlength=4).reshape(2, 2)
+            for label in (0, 1):
+                histograms[disease][label] += np.histogram(y_prob[y_test == label], bins=edges)[0]
+
+    reports = {d: "Training skipped - insufficient class balance" for d in DISEASE_FEATURES}
+    for disease in classifiers:
+        label = DISEASE_LABELS[disease]
+        matrix = confusion[disease]
+        accuracy = np.trace(matrix) / max(matrix.sum(), 1)
+        auc = histogram_auc(histograms[disease][1], histograms[disease][0])
+        logger.info(f"{label} Model AUC: {auc:.3f}")
+        logger.info(f"{label} Model Test Accuracy: {accuracy:.3f}")
+        reports[disease] = format_report(matrix)
+
+    if save:
+        from ml.models.train import save_models
+        save_models(models, reports)
+    return models, reports
@@ -1,16 +1,14 @@
 import os
 import sys
-import pandas as pd
 import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.linear_model import LogisticRegression
 from sklearn.pipeline import Pipeline
 from sklearn.metrics import accuracy_score, classification_report, roc_auc_score
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
-from sklearn.compose import ColumnTransformer
-from sklearn.impute import SimpleImputer
 import pickle
 import logging
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 backend_dir = os.path.dirname(os.path.dirname(current_dir))
@@ -20,8 +18,7 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 try:
-    from ml.config import (DIABETES_FEATURES, CARDIOVASCULAR_FEATURES, KIDNEY_STONE_FEATURES, 
-                         DATASET_PATH, MODELS_DIR, FEATURE_MAPPINGS)
+    from ml.config import DATASET_PATH, MODELS_DIR
     
     os.makedirs(MODELS_DIR, exist_ok=True)
     os.makedirs(os.path.dirname(DATASET_PATH), exist_ok=True)
@@ -33,141 +30,153 @@ except ImportError as e:
     logger.error(f"Could not import from config.py: {str(e)}")
     raise
 
-def calculate_bmi(height, weight):
-    """Calculate BMI from height (cm) and weight (kg)"""
-    try:
-        height_m = float(height) / 100
-        weight_kg = float(weight)
-        if height_m <= 0:
-            return np.nan
-        return weight_kg / (height_m ** 2)
-    except (ZeroDivisionError, TypeError):
-        return np.nan
-
-def preprocess_dataset(df):
-    """Preprocess the dataset with improved error handling and missing value treatment"""
-    df = df.copy()
-    
-    df.columns = df.columns.str.strip()
-    
-    for feature, mapping in FEATURE_MAPPINGS.items():
-        if feature in df.columns:
-            mapped_series = pd.Series(index=df.index, dtype=float)
-            
-            for i, value in enumerate(df[feature]):
-                if isinstance(value, str) and value in mapping:
-                    mapped_series.iloc[i] = mapping[value]
-                elif pd.notna(value):
-
-                    try:
-                        numeric_val = float(value)
-                        if numeric_val in mapping.values():
-                            mapped_series.iloc[i] = numeric_val
-                        else:
-                            mapped_series.iloc[i] = 0  
-                    except (ValueError, TypeError):
-                        mapped_series.iloc[i] = 0  
-                else:
-                    mapped_series.iloc[i] = np.nan
-                    
-            df[feature] = mapped_series
-    
-    if 'BMI' not in df.columns and 'Height' in df.columns and 'Weight' in df.columns:
-        df['BMI'] = df.apply(lambda row: calculate_bmi(row['Height'], row['Weight']), axis=1)
-    
-    for col in df.columns:
-        if col not in df.select_dtypes(include=['number']).columns:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-    
-    for col in df.select_dtypes(include=['number']).columns:
-        median_val = df[col].median()
-        if pd.isna(median_val):  
-            median_val = 0
-        df[col] = df[col].fillna(median_val)
-
-    df = df.fillna(0)
-    
-    return df
-
-def create_preprocessor(numerical_features, categorical_features):
-    """Create preprocessing pipeline with improved handling for missing values"""
-    numerical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='median')),
-        ('scaler', StandardScaler())
-    ])
-    
-    categorical_transformer = Pipeline(steps=[
-        ('imputer', SimpleImputer(strategy='constant', fill_value=0)),
-        ('onehot', OneHotEncoder(handle_unknown='ignore'))
+from ml.data.cache import load_preprocessed_dataset
+from ml.models.parallel import SharedFrame, AttachedFrame
+from ml.models.compiled import compile_pipeline
+from ml.models.artifact import save_artifact
+# calculate_bmi is only re-exported here, for the benchmarks
+from ml.models.dataset import (DISEASE_FEATURES, DISEASE_LABELS, calculate_bmi, preprocess_dataset,
+                               create_target_variable, check_class_balance)
+from ml.models.features import SharedFeatures, columns_of
+
+# LogisticRegression settings used when no model selection has been saved
+DEFAULT_PARAMS = {'C': 1.0, 'class_weight': 'balanced'}
+
+def train_disease_model(disease, standardizer, Z_train, y_train, Z_test, y_test, params=None):
+    """Fit and evaluate one disease model, returning (pipeline, report)
+
+    Z_train and Z_test are the disease's columns of the shared standardized
+    matrices, and `standardizer` (its slice of the shared FeatureStandardizer)
+    becomes the pipeline's preprocessor, so nothing is refitted here.
+    """
+    label = DISEASE_LABELS[disease]
+    logger.info(f"Training {label.lower()} model...")
+
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    classifier = LogisticRegression(max_iter=1000, random_state=42, **params)
+    classifier.fit(Z_train, y_train)
+
+    pipeline = Pipeline([
+        ('preprocessor', standardizer),
+        ('classifier', classifier)
     ])
 
-    preprocessor = ColumnTransformer(
-        transformers=[
-            ('num', numerical_transformer, numerical_features),
-            ('cat', categorical_transformer, categorical_features)
-        ],
-        remainder='passthrough')
-    
-    return preprocessor
-
-def create_target_variable(df):
-    """Create target variables with improved balancing"""
-    diabetes_risk = (
-        ((df['BMI'] > 28) & (df['Age'] > 40)) |
-        ((df['Family history of diabetes'] > 0) & (df['Age'] > 35)) |
-        (df['Frequent urination'] >= 2) |
-        (df['Unexplained thirst'] >= 1) |
-        (df['Unexplained weight loss'] >= 2)
-    )
-    
+    y_pred = classifier.predict(Z_test)
+    accuracy = accuracy_score(y_test, y_pred)
 
-    cardiovascular_risk = (
-        ((df['Age'] > 50) & (df['Smoking status'] >= 3)) |
-        ((df['Family history of cardiovascular disease'] > 0) & (df['Age'] > 45)) |
-        ((df['Physical activity level'] <= 1) & (df['Age'] > 50) & (df['BMI'] > 28)) |
-        ((df['Chest pain or discomfort'] > 0) & (df['Shortness of breath during normal activities'] > 0))
-    )
-    
-    kidney_stone_risk = (
-        (df['Daily water intake'] <= 1) |
-        (df['Previous kidney stones'] > 0) |
-        ((df['Family history of kidney stones'] > 0) & (df['Age'] > 40)) |
-        ((df['Back or flank pain'] > 0) & (df['Painful urination'] > 0))
-    )
-    
-    return (diabetes_risk.astype(int), 
-            cardiovascular_risk.astype(int), 
-            kidney_stone_risk.astype(int))
-
-def check_class_balance(y, label):
-    """Check if target variable has both classes represented"""
-    unique_values = np.unique(y)
-    if len(unique_values) < 2:
-        logger.warning(f"{label} target only has class {unique_values[0]}! Model training will fail.")
-        return False
-    
-    class_count = np.bincount(y)
-    class_ratio = class_count[1] / len(y)
-    logger.info(f"{label} class distribution - Class 0: {class_count[0]}, Class 1: {class_count[1]} (ratio: {class_ratio:.2f})")
-    
-    if class_ratio < 0.1 or class_ratio > 0.9:
-        logger.warning(f"{label} classes are highly imbalanced!")
-        return False
-        
-    return True
+    try:
+        y_prob = classifier.predict_proba(Z_test)[:, 1]
+        auc = roc_auc_score(y_test, y_prob)
+        logger.info(f"{label} Model AUC: {auc:.3f}")
+    except Exception as e:
+        logger.warning(f"Could not calculate AUC for {label.lower()} model: {str(e)}")
+
+    report = classification_report(y_test, y_pred)
+    logger.info(f"{label} Model Test Accuracy: {accuracy:.3f}")
+
+    return pipeline, report
+
+def _train_disease_worker(disease, standardizer, train_spec, test_spec, y_train, y_test, params=None):
+    """Process-pool entry point: train one disease from the shared standardized matrices"""
+    features = DISEASE_FEATURES[disease]
+    with AttachedFrame(train_spec) as train, AttachedFrame(test_spec) as test:
+        return train_disease_model(
+            disease, standardizer,
+            columns_of(train.values, train.columns, features), y_train,
+            columns_of(test.values, test.columns, features), y_test, params)
+
+def _train_parallel(diseases, shared, targets_train, targets_test, workers=None, params=None):
+    """Train several diseases at once, sharing the standardized matrices read-only"""
+    workers = min(workers or os.cpu_count() or 1, len(diseases))
+    logger.info(f"Training {len(diseases)} models in parallel on {workers} processes")
+
+    with SharedFrame(shared.Z_train, shared.features) as shared_train, \
+            SharedFrame(shared.Z_test, shared.features) as shared_test:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = {d: pool.submit(_train_disease_worker, d, shared.standardizer(DISEASE_FEATURES[d]),
+                                      shared_train.spec, shared_test.spec,
+                                      np.asarray(targets_train[d]), np.asarray(targets_test[d]),
+                                      (params or {}).get(d))
+                       for d in diseases}
+            return {d: future.result() for d, future in futures.items()}
+
+def export_model_artifact(name, model, model_path):
+    """Write the compact .bin artifact next to a saved pipeline, or drop a stale one"""
+    artifact_path = os.path.join(MODELS_DIR, f"{name}_model.bin")
+    try:
+        compiled = compile_pipeline(model, DISEASE_FEATURES[name])
+    except ValueError as e:
+        logger.warning(f"Model {name} can't be exported as an artifact: {str(e)}")
+        if os.path.exists(artifact_path):
+            os.remove(artifact_path)
+        return
+    save_artifact(compiled, artifact_path, name, model_path)
+
+def save_models(models, reports):
+    """Write each trained model and its report to MODELS_DIR"""
+    try:
+        os.makedirs(MODELS_DIR, exist_ok=True)
+        for name, model in models.items():
+            if model is not None:
+                # Write then rename so a running service never reads a half-written pickle
+                model_path = os.path.join(MODELS_DIR, f"{name}_model.pkl")
+                with open(model_path + ".tmp", "wb") as f:
+                    pickle.dump(model, f)
+                os.replace(model_path + ".tmp", model_path)
+                export_model_artifact(name, model, model_path)
+                with open(os.path.join(MODELS_DIR, f"{name}_report.txt"), "w") as f:
+                    f.write(reports[name])
+                logger.info(f"Model {name} saved to {MODELS_DIR}")
+            else:
+                logger.warning(f"Model {name} was not trained and will not be saved")
+        logger.info(f"All successful models saved to {MODELS_DIR}")
+    except Exception as e:
+        logger.error(f"Error saving models: {str(e)}")
+
+def choose_params(diseases, train_df, targets_train, select=False, folds=None, workers=None):
+    """LogisticRegression settings per disease: freshly cross-validated, saved earlier, or the defaults"""
+    from ml.models.selection import select_models, save_selection, load_selected_params
+    if select:
+        from ml.config import SELECTION_FOLDS
+        selections = select_models(diseases, train_df, targets_train, folds=folds or SELECTION_FOLDS, workers=workers)
+        for selection in selections.values():
+            save_selection(selection, MODELS_DIR)
+        return {d: selection["best"] for d, selection in selections.items()}
+
+    params = {}
+    for disease in diseases:
+        params[disease] = load_selected_params(disease, MODELS_DIR)
+        if params[disease] is not None:
+            logger.info(f"Using saved {DISEASE_LABELS[disease].lower()} model selection: {params[disease]}")
+    return params
+
+def save_evaluations(models, test_df, targets_test):
+    """Bootstrap evaluation of each saved model on the test split, written next to its report"""
+    from ml.models.evaluation import evaluate_scores, save_evaluation, format_summary
+    from ml.models.artifact import file_sha256
+    for name, model in models.items():
+        if model is None:
+            continue
+        try:
+            scores = model.predict_proba(test_df[DISEASE_FEATURES[name]])[:, 1]
+            evaluation = evaluate_scores(targets_test[name], scores)
+            version = {"source_sha256": file_sha256(os.path.join(MODELS_DIR, f"{name}_model.pkl")),
+                       "online_version": 0}
+            save_evaluation(name, evaluation, version, MODELS_DIR)
+            logger.info(f"{DISEASE_LABELS[name]} evaluation:\n{format_summary(evaluation)}")
+        except Exception as e:
+            logger.error(f"Error evaluating {name} model: {str(e)}")
 
-def train_models():
+def train_models(parallel=False, workers=None, use_cache=True, select=False, folds=None):
     """Train all disease prediction models with improved robustness"""
     logger.info("Starting model training process")
 
     try:
-        df = pd.read_csv(DATASET_PATH)
-        logger.info(f"Successfully loaded dataset with {len(df)} records and {len(df.columns)} columns")
+        df = load_preprocessed_dataset(DATASET_PATH, preprocess_dataset, use_cache=use_cache)
     except Exception as e:
         logger.error(f"Error loading dataset: {str(e)}")
         raise
 
-    df = preprocess_dataset(df)
     logger.info("Data preprocessing completed")
 
     models = {}
@@ -176,164 +185,70 @@ def train_models():
     train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
     logger.info(f"Data split: {len(train_df)} training records, {len(test_df)} testing records")
 
-    diabetes_target_train, cardio_target_train, kidney_target_train = create_target_variable(train_df)
-    diabetes_target_test, cardio_target_test, kidney_target_test = create_target_variable(test_df)
-    
-    diabetes_balanced = check_class_balance(diabetes_target_train, "Diabetes")
-    cardio_balanced = check_class_balance(cardio_target_train, "Cardiovascular")
-    kidney_balanced = check_class_balance(kidney_target_train, "Kidney Stone")
-    if diabetes_balanced:
-        logger.info("Training diabetes model...")
-        
-        missing_features = [f for f in DIABETES_FEATURES if f not in train_df.columns]
-        if missing_features:
-            logger.warning(f"Missing diabetes features: {missing_features}")
-            for f in missing_features:
-                train_df[f] = 0
-                test_df[f] = 0
-        
-        X_diabetes_train = train_df[DIABETES_FEATURES].copy()
-        X_diabetes_test = test_df[DIABETES_FEATURES].copy()
-        
-        diabetes_num = X_diabetes_train.select_dtypes(include=['number']).columns.tolist()
-        diabetes_cat = [f for f in DIABETES_FEATURES if f not in diabetes_num]
-        
-        diabetes_preprocessor = create_preprocessor(diabetes_num, diabetes_cat)
-        diabetes_model = LogisticRegression(max_iter=1000, class_weight='balanced', random_state=42, C=1.0)
-        
-
-        diabetes_pipeline = Pipeline([
-            ('preprocessor', diabetes_preprocessor),
-            ('classifier', diabetes_model)
-        ])
-        
-        diabetes_pipeline.fit(X_diabetes_train, diabetes_target_train)
-        
-        y_pred = diabetes_pipeline.predict(X_diabetes_test)
-        accuracy = accuracy_score(diabetes_target_test, y_pred)
-        
-        try:
-            y_prob = diabetes_pipeline.predict_proba(X_diabetes_test)[:, 1]
-            auc = roc_auc_score(diabetes_target_test, y_prob)
-            logger.info(f"Diabetes Model AUC: {auc:.3f}")
-        except Exception as e:
-            logger.warning(f"Could not calculate AUC for diabetes model: {str(e)}")
-            
-        reports['diabetes'] = classification_report(diabetes_target_test, y_pred)
-        logger.info(f"Diabetes Model Test Accuracy: {accuracy:.3f}")
-        
-        models['diabetes'] = diabetes_pipeline
-    else:
-        logger.warning("Skipping diabetes model training due to class imbalance")
-        models['diabetes'] = None
-        reports['diabetes'] = "Training skipped - insufficient class balance"
+    targets_train = dict(zip(DISEASE_FEATURES, create_target_variable(train_df)))
+    targets_test = dict(zip(DISEASE_FEATURES, create_target_variable(test_df)))
 
-    if cardio_balanced:
-        logger.info("Training cardiovascular model...")
-        missing_features = [f for f in CARDIOVASCULAR_FEATURES if f not in train_df.columns]
+    balanced = [d for d in DISEASE_FEATURES if check_class_balance(targets_train[d], DISEASE_LABELS[d])]
+    for disease in balanced:
+        missing_features = [f for f in DISEASE_FEATURES[disease] if f not in train_df.columns]
         if missing_features:
-            logger.warning(f"Missing cardiovascular features: {missing_features}")
-            for f in missing_features:
-                train_df[f] = 0
-                test_df[f] = 0
-        
-        X_cardio_train = train_df[CARDIOVASCULAR_FEATURES].copy()
-        X_cardio_test = test_df[CARDIOVASCULAR_FEATURES].copy()
-        
-        cardio_num = X_cardio_train.select_dtypes(include=['number']).columns.tolist()
-        cardio_cat = [f for f in CARDIOVASCULAR_FEATURES if f not in cardio_num]
-        
-        cardio_preprocessor = create_preprocessor(cardio_num, cardio_cat)
-        cardio_model = LogisticRegression(max_iter=1000, class_weight='balanced', random_state=42, C=1.0)
-        
-        cardio_pipeline = Pipeline([
-            ('preprocessor', cardio_preprocessor),
-            ('classifier', cardio_model)
-        ])
-        
-        cardio_pipeline.fit(X_cardio_train, cardio_target_train)
-        
-        y_pred = cardio_pipeline.predict(X_cardio_test)
-        accuracy = accuracy_score(cardio_target_test, y_pred)
-        
-        try:
-            y_prob = cardio_pipeline.predict_proba(X_cardio_test)[:, 1]
-            auc = roc_auc_score(cardio_target_test, y_prob)
-            logger.info(f"Cardiovascular Model AUC: {auc:.3f}")
-        except Exception as e:
-            logger.warning(f"Could not calculate AUC for cardiovascular model: {str(e)}")
-            
-        reports['cardiovascular'] = classification_report(cardio_target_test, y_pred)
-        logger.info(f"Cardiovascular Model Test Accuracy: {accuracy:.3f}")
-        
-        models['cardiovascular'] = cardio_pipeline
-    else:
-        logger.warning("Skipping cardiovascular model training due to class imbalance")
-        models['cardiovascular'] = None
-        reports['cardiovascular'] = "Training skipped - insufficient class balance"
-
-    if kidney_balanced:
-        logger.info("Training kidney stone model...")
-        
-        missing_features = [f for f in KIDNEY_STONE_FEATURES if f not in train_df.columns]
-        if missing_features:
-            logger.warning(f"Missing kidney stone features: {missing_features}")
+            logger.warning(f"Missing {DISEASE_LABELS[disease].lower()} features: {missing_features}")
             for f in missing_features:
                 train_df[f] = 0
                 test_df[f] = 0
 
-        X_kidney_train = train_df[KIDNEY_STONE_FEATURES].copy()
-        X_kidney_test = test_df[KIDNEY_STONE_FEATURES].copy()
-        
-        kidney_num = X_kidney_train.select_dtypes(include=['number']).columns.tolist()
-        kidney_cat = [f for f in KIDNEY_STONE_FEATURES if f not in kidney_num]
-        
-        kidney_preprocessor = create_preprocessor(kidney_num, kidney_cat)
-        kidney_model = LogisticRegression(max_iter=1000, class_weight='balanced', random_state=42, C=1.0)
-        
-
-        kidney_pipeline = Pipeline([
-            ('preprocessor', kidney_preprocessor),
-            ('classifier', kidney_model)
-        ])
-        
-        kidney_pipeline.fit(X_kidney_train, kidney_target_train)
-        
-        y_pred = kidney_pipeline.predict(X_kidney_test)
-        accuracy = accuracy_score(kidney_target_test, y_pred)
-        
-        try:
-            y_prob = kidney_pipeline.predict_proba(X_kidney_test)[:, 1]
-            auc = roc_auc_score(kidney_target_test, y_prob)
-            logger.info(f"Kidney Stone Model AUC: {auc:.3f}")
-        except Exception as e:
-            logger.warning(f"Could not calculate AUC for kidney stone model: {str(e)}")
-            
-        reports['kidney_stone'] = classification_report(kidney_target_test, y_pred)
-        logger.info(f"Kidney Stone Model Test Accuracy: {accuracy:.3f}")
-        
-        models['kidney_stone'] = kidney_pipeline
-    else:
-        logger.warning("Skipping kidney stone model training due to class imbalance")
-        models['kidney_stone'] = None
-        reports['kidney_stone'] = "Training skipped - insufficient class balance"
+    params = choose_params(balanced, train_df, targets_train, select=select, folds=folds, workers=workers)
 
-    try:
-        os.makedirs(MODELS_DIR, exist_ok=True)
-        for name, model in models.items():
-            if model is not None:
-                with open(os.path.join(MODELS_DIR, f"{name}_model.pkl"), "wb") as f:
-                    pickle.dump(model, f)
-                with open(os.path.join(MODELS_DIR, f"{name}_report.txt"), "w") as f:
-                    f.write(reports[name])
-                logger.info(f"Model {name} saved to {MODELS_DIR}")
-            else:
-                logger.warning(f"Model {name} was not trained and will not be saved")
-        logger.info(f"All successful models saved to {MODELS_DIR}")
-    except Exception as e:
-        logger.error(f"Error saving models: {str(e)}")
+    # One matrix over the union of the disease features, encoded and standardized once
+    shared = SharedFeatures(train_df, test_df, [DISEASE_FEATURES[d] for d in balanced])
+    logger.info(f"Shared feature matrix: {len(shared.features)} features, "
+                f"{shared.Z_train.nbytes / 2**20:.1f} MiB for training")
+
+    if parallel and len(balanced) > 1:
+        trained = _train_parallel(balanced, shared, targets_train, targets_test, workers, params)
+    else:
+        trained = {}
+        for disease in balanced:
+            features = DISEASE_FEATURES[disease]
+            trained[disease] = train_disease_model(
+                disease, shared.standardizer(features),
+                shared.train_columns(features), targets_train[disease],
+                shared.test_columns(features), targets_test[disease], params.get(disease))
+    del shared
+
+    for disease in DISEASE_FEATURES:
+        if disease in trained:
+            models[disease], reports[disease] = trained[disease]
+        else:
+            logger.warning(f"Skipping {DISEASE_LABELS[disease].lower()} model training due to class imbalance")
+            models[disease] = None
+            reports[disease] = "Training skipped - insufficient class balance"
+
+    save_models(models, reports)
+    save_evaluations(models, test_df, targets_test)
 
     return models, reports
 
 if __name__ == "__main__":
-    train_models()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Train the disease risk models")
+    parser.add_argument("--parallel", action="store_true", help="fit the disease models in separate processes")
+    parser.add_argument("--workers", type=int, default=None, help="number of processes for --parallel")
+    parser.add_argument("--no-cache", action="store_true",
+                        help="re-parse and re-preprocess the CSV instead of using the dataset cache")
+    parser.add_argument("--select", action="store_true",
+                        help="cross-validate C and class_weight for each model before training")
+    parser.add_argument("--folds", type=int, default=None, help="cross-validation folds for --select")
+    parser.add_argument("--streaming", action="store_true",
+                        help="train out of core from CSV chunks (for datasets larger than memory)")
+    parser.add_argument("--chunksize", type=int, default=None, help="rows per chunk for --streaming")
+    parser.add_argument("--epochs", type=int, default=None, help="passes over the data for --streaming")
+    args = parser.parse_args()
+    if args.streaming:
+        from ml.config import STREAM_CHUNK_SIZE, STREAM_EPOCHS
+        from ml.models.streaming import train_models_streaming
+        models, reports = train_models_streaming(chunksize=args.chunksize or STREAM_CHUNK_SIZE,
+                                                 epochs=args.epochs or STREAM_EPOCHS, save=False)
+        save_models(models, reports)
+    else:
+        train_models(parallel=args.parallel, workers=args.workers, use_cache=not args.no_cache,
+                     select=args.select, folds=args.folds)
@@ -0,0 +1,90 @@
+"""Recommendation lookup and pre-serialized response fragments.
+
+Both advice tables are loaded once: the short per-risk-level lists returned
+under "recommendations" and the detailed lists from advice.py returned
+under "advice". Each (disease, risk level) pair gets one shared list of
+each, plus the JSON bytes of everything in a result except its score, so a
+response is assembled by joining cached fragments.
+
+The bytes match json.dumps(..., sort_keys=True, separators=(",", ":")) of
+the same result dicts.
+"""
+import json
+import math
+
+from ml.recommendations.advice import recommendations as DETAILED_ADVICE
+
+RECOMMENDATIONS = {
+    "diabetes": {
+        "low": ["Maintain a balanced diet", "Regular check-ups annually", "Stay physically active"],
+        "medium": ["Reduce sugar intake", "Exercise at least 3 times a week", "Monitor blood sugar periodically"],
+        "high": ["Consult a doctor soon", "Daily blood sugar monitoring", "Follow a strict diabetic diet plan"]
+    },
+    "cardiovascular": {
+        "low": ["Maintain healthy lifestyle", "Regular exercise", "Balanced diet"],
+        "medium": ["Reduce salt intake", "Exercise regularly", "Monitor blood pressure monthly"],
+        "high": ["Consult a cardiologist", "Consider medication options", "Follow a heart-healthy diet strictly"]
+    },
+    "kidney_stone": {
+        "low": ["Stay hydrated", "Moderate calcium intake", "Reduce sodium consumption"],
+        "medium": ["Drink at least 2L water daily", "Reduce oxalate-rich foods", "Consider dietary changes"],
+        "high": ["Consult a urologist", "Follow specific diet plans", "Increase fluid intake significantly"]
+    }
+}
+
+DEFAULT_RECOMMENDATIONS = ["Consult a healthcare professional"]
+
+RISK_LEVELS = ["low", "medium", "high"]
+
+# advice.py names the middle level "moderate"
+ADVICE_LEVELS = {"low": "low", "medium": "moderate", "high": "high"}
+
+def _dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+def _build_tables():
+    entries = {}
+    for disease in set(RECOMMENDATIONS) | set(DETAILED_ADVICE):
+        for level in RISK_LEVELS:
+            basic = RECOMMENDATIONS.get(disease, {}).get(level, DEFAULT_RECOMMENDATIONS)
+            detailed = DETAILED_ADVICE.get(disease, {}).get(ADVICE_LEVELS[level], [])
+            # Everything before the score, in sorted key order: advice, recommendations, risk_level
+            prefix = (b'{"advice":' + _dumps(detailed) + b',"recommendations":' + _dumps(basic)
+                      + b',"risk_level":' + _dumps(level) + b',"risk_score":')
+            entries[(disease, level)] = (list(basic), list(detailed), prefix)
+    return entries
+
+_ENTRIES = _build_tables()
+
+def _entry(disease, risk_level):
+    entry = _ENTRIES.get((disease, risk_level))
+    if entry is None:
+        detailed = DETAILED_ADVICE.get(disease, {}).get(ADVICE_LEVELS.get(risk_level, risk_level), [])
+        return DEFAULT_RECOMMENDATIONS, detailed, None
+    return entry
+
+def get_recommendations(disease, risk_level):
+    """Short recommendation list for a disease and risk level (shared, don't mutate)"""
+    return _entry(disease, risk_level)[0]
+
+def get_detailed_advice(disease, risk_level):
+    """Detailed advice from advice.py for a disease and risk level (shared, don't mutate)"""
+    return _entry(disease, risk_level)[1]
+
+def _score_bytes(score):
+    if isinstance(score, float) and math.isfinite(score):
+        return float.__repr__(score).encode("ascii")
+    return _dumps(score)
+
+def result_json(disease, result):
+    """JSON bytes of one disease's result dict, from the cached fragment where possible"""
+    entry = _ENTRIES.get((disease, result.get("risk_level")))
+    if (entry is None or len(result) != 4 or result.get("recommendations") is not entry[0]
+            or result.get("advice") is not entry[1]):
+        return _dumps(result)
+    return entry[2] + _score_bytes(result["risk_score"]) + b"}"
+
+def results_json(results):
+    """JSON bytes of a {disease: result} mapping"""
+    parts = [_dumps(disease) + b":" + result_json(disease, results[disease]) for disease in sorted(results)]
+    return b"{" + b",".join(parts) + b"}"
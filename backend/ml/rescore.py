@@ -0,0 +1,319 @@
+"""Offline re-scoring of stored health records after the models are retrained.
+
+Run from backend/ml:
+
+    python rescore.py records.jsonl --output rescored.jsonl --workers 8
+    python rescore.py records.jsonl --output rescored.jsonl --resume
+
+The input is newline-delimited JSON (e.g. a mongoexport of the health
+records collection) or CSV with a header row. Fields are read by feature
+name, falling back to the camelCase names of the Node HealthRecord model.
+Records are scored in chunks by score_batch across a process pool and
+written in input order, one JSON object per line:
+
+    {"errors": [...], "id": ..., "results": {...}}
+
+After every chunk a checkpoint next to the output records how far the input
+and output got; --resume continues from there. A checkpoint is only resumed
+against the same input file and the same saved models, and every worker
+checks that the models it loaded are the ones the run started with, so a
+retrain during a long run stops it instead of mixing model versions.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import logging
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+sys.path.append(current_dir)
+
+from ml.config import MAX_BATCH_SIZE, SERVE_BLAS_THREADS
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# camelCase fields of backend/models/healthModel.js that hold a model feature
+FIELD_ALIASES = {
+    "Age": "age",
+    "Sex": "sex",
+    "Height": "height",
+    "Weight": "weight",
+    "BMI": "bmi",
+    "Physical activity level": "physicalActivityLevel",
+    "Activity intensity": "activityIntensity",
+    "Smoking status": "smokingStatus",
+    "Alcohol consumption": "alcoholConsumption",
+    "Sleep duration": "sleepDuration",
+    "Stress levels": "stressLevels",
+    "Daily water intake": "waterIntake",
+    "Fruit and vegetable consumption": "fruitVegetableConsumption",
+    "Processed food consumption": "processedFoodConsumption",
+    "Added sugar intake": "sugarIntake",
+    "Salt intake": "saltIntake",
+    "Red meat consumption": "redMeatConsumption",
+    "Family history of cardiovascular disease": "familyHistoryCardiovascular",
+    "Family history of diabetes": "familyHistoryDiabetes",
+    "Family history of kidney stones": "familyHistoryKidneyStones",
+    "Previous kidney stones": "previousKidneyStones",
+    "Frequent urination": "frequentUrination",
+    "Unexplained thirst": "unexplainedThirst",
+    "Unexplained weight loss": "unexplainedWeightLoss",
+    "Chest pain or discomfort": "chestPain",
+    "Shortness of breath during normal activities": "shortnessOfBreath",
+    "Fatigue": "fatigue",
+    "Back or flank pain": "backFlankPain",
+    "Painful urination": "painfulUrination",
+    "Blood in urine": "bloodInUrine",
+}
+
+FORMATS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl", ".csv": "csv"}
+
+class OffsetReader:
+    """Decoded lines of a binary file, tracking the byte offset just past the last line read"""
+
+    def __init__(self, f):
+        self.f = f
+        self.offset = f.tell()
+
+    def __iter__(self):
+        for line in self.f:
+            self.offset += len(line)
+            yield line.decode("utf-8")
+
+def record_id(doc, id_field, number):
+    """The record's id (unwrapping Extended JSON like {"$oid": ...}), or its position in the input"""
+    value = doc.get(id_field)
+    if isinstance(value, dict) and len(value) == 1:
+        value = next(iter(value.values()))
+    return number if value in (None, "") else value
+
+def to_features(doc, features):
+    """A scoring record from a stored document, by feature name or HealthRecord field name"""
+    record = {}
+    for feature in features:
+        if feature in doc:
+            record[feature] = doc[feature]
+        elif FIELD_ALIASES.get(feature) in doc:
+            record[feature] = doc[FIELD_ALIASES[feature]]
+    return record
+
+def iter_documents(f, fmt, header=None):
+    """Yield (document, byte offset after it) from an input opened in binary mode
+
+    For CSV, `header` is the column row when reading starts past it (resume).
+    """
+    reader = OffsetReader(f)
+    if fmt == "csv":
+        rows = csv.reader(reader)
+        if header is None:
+            header = next(rows, None)
+        for row in rows:
+            if row:
+                yield dict(zip(header, row)), reader.offset
+        return
+
+    for line in reader:
+        if not line.strip():
+            continue
+        try:
+            doc = json.loads(line)
+        except ValueError as e:
+            logger.warning(f"Skipping unreadable line ending at byte {reader.offset}: {str(e)}")
+            continue
+        if isinstance(doc, dict):
+            yield doc, reader.offset
+        else:
+            logger.warning(f"Skipping non-object line ending at byte {reader.offset}")
+
+def read_header(path):
+    with open(path, "rb") as f:
+        return next(csv.reader(OffsetReader(f)), None)
+
+def iter_chunks(f, fmt, chunk_size, id_field, first_number=0, header=None):
+    """Yield (records, ids, byte offset after the chunk) in chunks of `chunk_size`"""
+    from models.encoding import ALL_FEATURES
+    records, ids, offset = [], [], None
+    number = first_number
+    for doc, offset in iter_documents(f, fmt, header):
+        records.append(to_features(doc, ALL_FEATURES))
+        ids.append(record_id(doc, id_field, number))
+        number += 1
+        if len(records) == chunk_size:
+            yield records, ids, offset
+            records, ids = [], []
+    if records:
+        yield records, ids, offset
+
+def score_chunk(records, ids):
+    """Output lines for one chunk of records"""
+    from models.predict import score_batch
+    from ml.recommendations.engine import results_json
+
+    results, errors = score_batch(records)
+    by_record = [[] for _ in records]
+    for error in errors:
+        by_record[error.pop("record")].append(error)
+
+    dumps = lambda value: json.dumps(value, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return b"".join(b'{"errors":' + dumps(found) + b',"id":' + dumps(id_) + b',"results":'
+                    + results_json(result) + b"}\n"
+                    for id_, result, found in zip(ids, results, by_record))
+
+class ModelsChanged(ValueError):
+    """The saved models differ from the ones the run (or its checkpoint) was started with"""
+
+def _init_worker(fingerprint=None):
+    """Load the models, failing if they aren't the ones described by `fingerprint`"""
+    logging.getLogger().setLevel(logging.WARNING)
+    from models.registry import load_models
+    before = models_fingerprint()
+    load_models()
+    # Unchanged before and after loading, so what was loaded is what was fingerprinted
+    if fingerprint is not None and not before == models_fingerprint() == fingerprint:
+        message = "The saved models changed since the run started; rerun without --resume"
+        logger.error(message)
+        raise ModelsChanged(message)
+
+def models_fingerprint():
+    """sha256 of each saved model file, so a resume can tell the models were retrained"""
+    from ml.config import MODELS_DIR
+    from models.artifact import file_sha256
+    from models.registry import MODEL_NAMES, model_path, artifact_path
+    fingerprint = {}
+    for disease in MODEL_NAMES:
+        for path in (model_path(disease), artifact_path(disease)):
+            if os.path.exists(path):
+                fingerprint[os.path.relpath(path, MODELS_DIR)] = file_sha256(path)
+    return fingerprint
+
+def input_identity(path, fmt):
+    stat = os.stat(path)
+    return {"input": os.path.abspath(path), "format": fmt, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def load_checkpoint(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_checkpoint(path, checkpoint):
+    """Write then rename so an interruption never leaves a half-written checkpoint"""
+    with open(path + ".tmp", "w") as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def scored_chunks(chunks, workers, fingerprint=None):
+    """(output bytes, records, offset) per chunk, in input order
+
+    At most two chunks per worker are in flight, so memory stays bounded
+    however large the input is.
+    """
+    if workers <= 1:
+        _init_worker(fingerprint)
+        for records, ids, offset in chunks:
+            yield score_chunk(records, ids), len(records), offset
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(fingerprint,)) as pool:
+        pending = deque()
+        for records, ids, offset in chunks:
+            pending.append((pool.submit(score_chunk, records, ids), len(records), offset))
+            if len(pending) >= 2 * workers:
+                future, count, end = pending.popleft()
+                yield future.result(), count, end
+        while pending:
+            future, count, end = pending.popleft()
+            yield future.result(), count, end
+
+def rescore(input_path, output_path, fmt, chunk_size=MAX_BATCH_SIZE, workers=1, id_field="_id", resume=False):
+    """Score every record in input_path into output_path; returns the number of records written"""
+    checkpoint_path = output_path + ".checkpoint"
+    identity = input_identity(input_path, fmt)
+    fingerprint = models_fingerprint()
+    checkpoint = load_checkpoint(checkpoint_path) if resume else None
+
+    if checkpoint is not None:
+        if checkpoint["source"] != identity:
+            raise ValueError(f"{checkpoint_path} was written for a different input file; rerun without --resume")
+        if checkpoint["models"] != fingerprint:
+            raise ModelsChanged("The saved models changed since the checkpoint; rerun without --resume")
+        if checkpoint.get("complete"):
+            logger.info(f"{output_path} is already complete ({checkpoint['records']:,} records)")
+            return checkpoint["records"]
+        logger.info(f"Resuming after {checkpoint['records']:,} records (input byte {checkpoint['offset']:,})")
+    else:
+        if resume:
+            logger.info(f"No checkpoint at {checkpoint_path}, starting from the beginning")
+        checkpoint = {"source": identity, "models": fingerprint, "offset": 0, "records": 0,
+                      "output_bytes": 0, "complete": False}
+
+    header = read_header(input_path) if fmt == "csv" and checkpoint["offset"] else None
+    started = time.perf_counter()
+    done = 0
+
+    with open(input_path, "rb") as f, open(output_path, "ab" if checkpoint["offset"] else "wb") as out:
+        # Drop whatever was written after the last checkpoint
+        out.truncate(checkpoint["output_bytes"])
+        f.seek(checkpoint["offset"])
+
+        chunks = iter_chunks(f, fmt, chunk_size, id_field, checkpoint["records"], header)
+        for data, count, offset in scored_chunks(chunks, workers, fingerprint):
+            out.write(data)
+            out.flush()
+            os.fsync(out.fileno())
+            done += count
+            checkpoint.update(offset=offset, records=checkpoint["records"] + count, output_bytes=out.tell())
+            save_checkpoint(checkpoint_path, checkpoint)
+
+            elapsed = time.perf_counter() - started
+            logger.info(f"Scored {checkpoint['records']:,} records ({done / elapsed:,.0f} records/s)")
+
+    checkpoint["complete"] = True
+    save_checkpoint(checkpoint_path, checkpoint)
+    logger.info(f"Wrote {checkpoint['records']:,} records to {output_path}")
+    return checkpoint["records"]
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-score stored health records with the saved models")
+    parser.add_argument("input", help="NDJSON or CSV export of health records")
+    parser.add_argument("--output", required=True, help="NDJSON file for the results")
+    parser.add_argument("--format", choices=sorted(set(FORMATS.values())),
+                        help="input format (default: from the file extension)")
+    parser.add_argument("--chunk-size", type=int, default=MAX_BATCH_SIZE, help="records scored per task")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--blas-threads", type=int, default=SERVE_BLAS_THREADS,
+                        help="BLAS/OpenMP threads per worker")
+    parser.add_argument("--id-field", default="_id", help="field copied to each output line as its id")
+    parser.add_argument("--resume", action="store_true", help="continue from the output's checkpoint")
+    args = parser.parse_args()
+
+    fmt = args.format or FORMATS.get(os.path.splitext(args.input)[1].lower())
+    if fmt is None:
+        parser.error("can't tell the input format from its extension; pass --format")
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+
+    from serve import pin_native_threads
+    pin_native_threads(args.blas_threads)
+
+    try:
+        rescore(args.input, args.output, fmt, chunk_size=args.chunk_size, workers=args.workers,
+                id_field=args.id_field, resume=args.resume)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    except BrokenProcessPool:
+        logger.error("A scoring worker failed to start or died (see its error above); "
+                     "the output is checkpointed up to the last complete chunk")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
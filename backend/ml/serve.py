@@ -0,0 +1,110 @@
+"""Production entry point for the ML service.
+
+Runs the Flask app under gunicorn with several worker processes:
+
+    python serve.py --workers 4 --threads 4 --bind 0.0.0.0:5000
+
+Models are loaded once in the master before forking, so every worker shares
+them copy-on-write. BLAS/OpenMP pools are pinned (one thread by default) so
+concurrent requests don't oversubscribe the cores. With several workers,
+/metrics sums the metrics of all of them through METRICS_DIR (a temporary
+directory unless ML_METRICS_DIR is set).
+"""
+import os
+import gc
+import sys
+import glob
+import argparse
+import logging
+import tempfile
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.dirname(current_dir))
+sys.path.append(current_dir)
+
+from ml.config import SERVE_BIND, SERVE_WORKERS, SERVE_THREADS, SERVE_BLAS_THREADS, METRICS_DIR
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NATIVE_THREAD_VARS = [
+    "OMP_NUM_THREADS",
+    "OPENBLAS_NUM_THREADS",
+    "MKL_NUM_THREADS",
+    "BLIS_NUM_THREADS",
+    "VECLIB_MAXIMUM_THREADS",
+    "NUMEXPR_NUM_THREADS",
+]
+
+def pin_native_threads(count):
+    """Cap BLAS/OpenMP thread pools; must run before numpy is first imported"""
+    if "numpy" in sys.modules:
+        logger.warning("numpy already imported, native thread limits may not apply")
+    for var in NATIVE_THREAD_VARS:
+        os.environ[var] = str(count)
+
+def setup_metrics_dir(directory):
+    """Aggregate /metrics over the workers through `directory`, emptied of earlier runs"""
+    from ml.utils.metrics import metrics
+    directory = directory or tempfile.mkdtemp(prefix="ml-metrics-")
+    for path in glob.glob(os.path.join(directory, "*.json")):
+        os.remove(path)
+    metrics.enable_multiprocess(directory)
+    logger.info(f"Workers publish metrics to {directory}")
+
+def build_application(flask_app, options):
+    from gunicorn.app.base import BaseApplication
+    from models.registry import start_watcher
+    from ml.utils.metrics import metrics
+
+    def post_fork(server, worker):
+        # Threads don't survive fork, so each worker watches for retrained models itself
+        start_watcher()
+        metrics.start_flusher()
+
+    def child_exit(server, worker):
+        metrics.mark_process_dead(worker.pid)
+
+    class Application(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+            self.cfg.set("post_fork", post_fork)
+            self.cfg.set("child_exit", child_exit)
+
+        def load(self):
+            return flask_app
+
+    return Application()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the ML API with multiple workers")
+    parser.add_argument("--bind", default=SERVE_BIND)
+    parser.add_argument("--workers", type=int, default=SERVE_WORKERS)
+    parser.add_argument("--threads", type=int, default=SERVE_THREADS, help="threads per worker")
+    parser.add_argument("--blas-threads", type=int, default=SERVE_BLAS_THREADS,
+                        help="BLAS/OpenMP threads per worker")
+    args = parser.parse_args()
+
+    pin_native_threads(args.blas_threads)
+
+    import app as service
+    from models.registry import load_models
+    if args.workers > 1:
+        setup_metrics_dir(METRICS_DIR)
+    load_models()
+    # Keep the loaded objects out of later GC passes so forked workers don't
+    # touch (and copy) their pages
+    gc.freeze()
+
+    logger.info(f"Serving on {args.bind} with {args.workers} workers x {args.threads} threads")
+    build_application(service.app, {
+        "bind": args.bind,
+        "workers": args.workers,
+        "threads": args.threads,
+        "worker_class": "gthread" if args.threads > 1 else "sync",
+        "preload_app": True,
+    }).run()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+import os
+import sys
+import pytest
+
+ml_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# The service imports `models.*` from backend/ml, training imports `ml.models.*` from backend
+sys.path.insert(0, os.path.dirname(ml_dir))
+sys.path.insert(0, ml_dir)
+
+@pytest.fixture(scope="session", autouse=True)
+def ml_cwd():
+    """Run from backend/ml, where the relative MODELS_DIR points at the saved models"""
+    previous = os.getcwd()
+    os.chdir(ml_dir)
+    yield
+    os.chdir(previous)
+
+@pytest.fixture(scope="module")
+def pipelines():
+    """The saved sklearn pipelines, by disease"""
+    import pickle
+    models = {}
+    for disease in ("diabetes", "cardiovascular", "kidney_stone"):
+        with open(f"models/saved/{disease}_model.pkl", "rb") as f:
+            models[disease] = pickle.load(f)
+    return models
+
+@pytest.fixture(scope="module")
+def encoded():
+    """Encoded records over every feature, with some answers missing"""
+    from ml.data.synthetic import make_population
+    from ml.models.encoding import ALL_FEATURES
+    return make_population(500, seed=9, missing_rate=0.1, encoded=True)[ALL_FEATURES]
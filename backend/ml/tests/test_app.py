@@ -0,0 +1,46 @@
+import pytest
+
+import app as service
+from ml.data.synthetic import iter_payloads
+from models.predict import predict_risk_direct
+
+@pytest.fixture
+def client():
+    return service.app.test_client()
+
+@pytest.fixture(scope="module")
+def records():
+    return list(iter_payloads(25, seed=21, missing_rate=0.1))
+
+def test_batch_scores_each_record_like_assess_risk(client, records):
+    response = client.post("/assess_risk_batch", json={"records": records})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["success"] is True
+    assert body["results"] == [predict_risk_direct(record) for record in records]
+
+def test_batch_accepts_a_bare_list(client, records):
+    wrapped = client.post("/assess_risk_batch", json={"records": records[:3]}).get_json()
+    bare = client.post("/assess_risk_batch", json=records[:3]).get_json()
+    assert bare == wrapped
+
+def test_batch_reports_invalid_fields_per_record(client, records):
+    batch = [records[0], {**records[1], "Age": 500, "Sex": "Robot"}]
+    body = client.post("/assess_risk_batch", json=batch).get_json()
+    assert [(e["record"], e["field"], e["error"]) for e in body["errors"]] == \
+        [(1, "Age", "out_of_range"), (1, "Sex", "unknown_value")]
+    assert len(body["results"]) == 2
+
+def test_empty_batch_scores_nothing(client):
+    body = client.post("/assess_risk_batch", json=[]).get_json()
+    assert (body["results"], body["errors"]) == ([], [])
+
+@pytest.mark.parametrize("payload", [{"records": "x"}, [1, 2], {"Age": 30}, "records"])
+def test_malformed_batches_are_rejected(client, payload):
+    response = client.post("/assess_risk_batch", json=payload)
+    assert response.status_code == 400
+    assert response.get_json()["success"] is False
+
+def test_oversized_batches_are_rejected(client, records, monkeypatch):
+    monkeypatch.setattr(service, "MAX_BATCH_SIZE", 10)
+    assert client.post("/assess_risk_batch", json=records).status_code == 413
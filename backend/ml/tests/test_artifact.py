@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from ml.models.artifact import encode_artifact, decode_artifact, load_artifact, file_sha256
+from ml.models.compiled import compile_pipeline
+from ml.models.encoding import FEATURES
+
+def test_shipped_artifacts_match_the_pickles(pipelines, encoded):
+    for disease, pipeline in pipelines.items():
+        model, header = load_artifact(f"models/saved/{disease}_model.bin")
+        assert header["disease"] == disease
+        assert header["source_sha256"] == file_sha256(f"models/saved/{disease}_model.pkl")
+        assert model.features == FEATURES[disease]
+        expected = pipeline.predict_proba(encoded[FEATURES[disease]])[:, 1]
+        np.testing.assert_allclose(model.predict_proba(encoded)[:, 1], expected, rtol=1e-9, atol=1e-12)
+
+def test_artifact_round_trip_is_exact(pipelines):
+    compiled = compile_pipeline(pipelines["diabetes"], FEATURES["diabetes"])
+    model, header = decode_artifact(encode_artifact(compiled, "diabetes", "abc", {"online_version": 3}))
+    assert (header["source_sha256"], header["online_version"]) == ("abc", 3)
+    assert model.features == compiled.features
+    assert model.intercept == compiled.intercept
+    for name in ("weights", "fill", "mean", "scale"):
+        np.testing.assert_array_equal(getattr(model, name), getattr(compiled, name))
+
+@pytest.mark.parametrize("corrupt", [lambda data: data[:10], lambda data: b"NOTMODEL" + data[8:],
+                                     lambda data: data[:-8]])
+def test_damaged_artifacts_are_rejected(pipelines, corrupt):
+    data = encode_artifact(compile_pipeline(pipelines["diabetes"], FEATURES["diabetes"]), "diabetes")
+    with pytest.raises(ValueError):
+        decode_artifact(corrupt(data))
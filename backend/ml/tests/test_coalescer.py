@@ -0,0 +1,66 @@
+import threading
+import pytest
+
+from models.coalescer import RequestCoalescer
+
+def score_one(record):
+    if record == "bad":
+        raise ValueError("bad record")
+    return record.upper()
+
+def fail_on_bad(records):
+    if "bad" in records:
+        raise ValueError("bad record in batch")
+    return [record.upper() for record in records]
+
+def test_concurrent_requests_share_a_batch():
+    batches = []
+    coalescer = RequestCoalescer(lambda records: batches.append(records) or [r.upper() for r in records],
+                                 score_one, max_wait=0.2, max_batch=4)
+    futures = [coalescer.submit(record) for record in "abcd"]
+    assert [future.result(timeout=5) for future in futures] == list("ABCD")
+    assert batches == [list("abcd")]
+    assert coalescer.stats()["mean_batch_size"] == 4
+
+def test_bad_record_only_fails_its_own_request():
+    coalescer = RequestCoalescer(fail_on_bad, score_one, max_wait=0.2, max_batch=3)
+    futures = [coalescer.submit(record) for record in ("a", "bad", "c")]
+    assert futures[0].result(timeout=5) == "A"
+    with pytest.raises(ValueError, match="bad record"):
+        futures[1].result(timeout=5)
+    assert futures[2].result(timeout=5) == "C"
+    # The coalescer keeps serving after a failed batch
+    assert coalescer.predict("d") == "D"
+
+def test_slow_batch_falls_back_to_direct_scoring():
+    release = threading.Event()
+
+    def blocked(records):
+        release.wait(5)
+        return [record.upper() for record in records]
+
+    coalescer = RequestCoalescer(blocked, lambda record: "direct", max_wait=0, max_batch=1, timeout=0.05)
+    coalescer.submit("first")
+    # The thread is stuck on the first batch, so the second request is still queued when it times out
+    assert coalescer.predict("second") == "direct"
+    assert coalescer.stats()["timeouts"] == 1
+    release.set()
+
+def test_concurrent_timeouts_are_all_counted():
+    release = threading.Event()
+
+    def blocked(records):
+        release.wait(5)
+        return [record.upper() for record in records]
+
+    coalescer = RequestCoalescer(blocked, lambda record: "direct", max_wait=0, max_batch=1, timeout=0.05)
+    coalescer.submit("first")
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(coalescer.predict("x"))) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    release.set()
+    assert results == ["direct"] * 16
+    assert coalescer.stats()["timeouts"] == 16
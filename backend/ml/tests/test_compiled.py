@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from ml.models.compiled import compile_pipeline, compile_models
+from ml.models.encoding import FEATURES
+
+def pipeline_scores(pipeline, df, features):
+    return pipeline.predict_proba(df[features])[:, 1]
+
+def test_compiled_models_match_the_pickles(pipelines, encoded):
+    for disease, pipeline in pipelines.items():
+        features = FEATURES[disease]
+        compiled = compile_pipeline(pipeline, features)
+        expected = pipeline_scores(pipeline, encoded, features)
+        np.testing.assert_allclose(compiled.predict_proba(encoded)[:, 1], expected, rtol=1e-9, atol=1e-12)
+        X = encoded[features].to_numpy()
+        np.testing.assert_allclose([compiled.score_vector(x) for x in X], expected, rtol=1e-9, atol=1e-12)
+
+def test_imputer_and_scaler_pipelines_compile(encoded):
+    features = FEATURES["cardiovascular"]
+    y = (encoded["Age"].fillna(35) > 45).astype(int)
+    pipeline = Pipeline([
+        ("preprocessor", Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])),
+        ("classifier", LogisticRegression(max_iter=1000)),
+    ])
+    pipeline.fit(encoded[features], y)
+    compiled = compile_pipeline(pipeline, features)
+    np.testing.assert_allclose(compiled.predict_proba(encoded)[:, 1], pipeline_scores(pipeline, encoded, features),
+                               rtol=1e-9, atol=1e-12)
+
+def test_unsupported_pipelines_are_left_to_sklearn():
+    pipeline = Pipeline([("classifier", LogisticRegression())])
+    pipeline.fit(pd.DataFrame({"Age": [20.0, 60.0]}), [0, 1])
+    with pytest.raises(ValueError):
+        compile_pipeline(pipeline, ["Age"])
+    assert compile_models({"diabetes": pipeline}, {"diabetes": ["Age"]}) == {}
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.config import FEATURE_MAPPINGS
+from ml.data.synthetic import make_population
+from ml.models.dataset import calculate_bmi, preprocess_dataset
+
+def rowwise_preprocess(df):
+    """The row-by-row preprocessing the vectorized version replaced"""
+    df = df.copy()
+    df.columns = df.columns.str.strip()
+    for feature, mapping in FEATURE_MAPPINGS.items():
+        if feature in df.columns:
+            mapped_series = pd.Series(index=df.index, dtype=float)
+            for i, value in enumerate(df[feature]):
+                if isinstance(value, str) and value in mapping:
+                    mapped_series.iloc[i] = mapping[value]
+                elif pd.notna(value):
+                    try:
+                        numeric_val = float(value)
+                        if numeric_val in mapping.values():
+                            mapped_series.iloc[i] = numeric_val
+                        else:
+                            mapped_series.iloc[i] = 0
+                    except (ValueError, TypeError):
+                        mapped_series.iloc[i] = 0
+                else:
+                    mapped_series.iloc[i] = np.nan
+            df[feature] = mapped_series
+
+    if 'BMI' not in df.columns and 'Height' in df.columns and 'Weight' in df.columns:
+        df['BMI'] = df.apply(lambda row: calculate_bmi(row['Height'], row['Weight']), axis=1)
+
+    for col in df.columns:
+        if col not in df.select_dtypes(include=['number']).columns:
+            df[col] = pd.to_numeric(df[col], errors='coerce')
+    for col in df.select_dtypes(include=['number']).columns:
+        median_val = df[col].median()
+        if pd.isna(median_val):
+            median_val = 0
+        df[col] = df[col].fillna(median_val)
+    return df.fillna(0)
+
+@pytest.fixture(scope="module")
+def raw():
+    df = make_population(400, seed=17, missing_rate=0.15).astype(object)
+    # Codes given as numbers or strings, unknown answers and junk
+    df.loc[0:9, "Sex"] = [1, "2", 2.0, 7, "Robot", None, " Male", "Female", np.nan, "1.0"]
+    df.loc[0:4, "Age"] = ["41", "old", None, 30, "55.5"]
+    df.loc[0:2, "Height"] = [0, -5, "170"]
+    df["Notes"] = ["a", None, "3"] + [None] * (len(df) - 3)
+    return df.rename(columns={"Fatigue": " Fatigue "})
+
+def test_matches_the_rowwise_preprocessing(raw):
+    pd.testing.assert_frame_equal(preprocess_dataset(raw), rowwise_preprocess(raw), check_dtype=False)
+
+def test_given_bmi_is_kept(raw):
+    df = raw.assign(BMI=np.linspace(18, 35, len(raw)))
+    result = preprocess_dataset(df)
+    pd.testing.assert_frame_equal(result, rowwise_preprocess(df), check_dtype=False)
+    np.testing.assert_allclose(result["BMI"], df["BMI"].astype(float))
+
+def test_empty_columns_are_filled_with_zero(raw):
+    result = preprocess_dataset(raw.assign(Empty=None))
+    assert (result["Empty"] == 0).all()
+    assert not result.isna().any().any()
@@ -0,0 +1,77 @@
+import os
+import mmap
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.data import cache
+from ml.data.cache import load_preprocessed_dataset, read_columns, write_columns, cache_key
+from ml.data.synthetic import write_csv
+from ml.models.dataset import preprocess_dataset
+
+class CountingPreprocess:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, df):
+        self.calls += 1
+        return preprocess_dataset(df)
+
+def caches(cache_dir):
+    return {name for name in os.listdir(cache_dir) if os.path.isdir(os.path.join(cache_dir, name))}
+
+@pytest.fixture
+def dataset(tmp_path):
+    path = str(tmp_path / "data.csv")
+    write_csv(path, 200, seed=1, missing_rate=0.1)
+    return path, str(tmp_path / "cache")
+
+def test_second_load_is_served_from_the_cache(dataset):
+    path, cache_dir = dataset
+    preprocess = CountingPreprocess()
+    first = load_preprocessed_dataset(path, preprocess, cache_dir=cache_dir)
+    second = load_preprocessed_dataset(path, preprocess, cache_dir=cache_dir)
+    assert preprocess.calls == 1
+    pd.testing.assert_frame_equal(second, first)
+    pd.testing.assert_frame_equal(load_preprocessed_dataset(path, preprocess, use_cache=False), first)
+
+def mapped(array):
+    """Whether an array's memory is a file mapping"""
+    while array is not None:
+        if isinstance(array, (np.memmap, mmap.mmap)):
+            return True
+        array = getattr(array, "base", None)
+    return False
+
+def test_cached_columns_stay_memory_mapped(tmp_path):
+    df = pd.DataFrame({"a": np.arange(1000.0), "b": np.ones(1000), "c": np.arange(1000)})
+    write_columns(df, str(tmp_path / "columns"))
+    loaded = read_columns(str(tmp_path / "columns"))
+    pd.testing.assert_frame_equal(loaded, df)
+    assert all(mapped(loaded[name].to_numpy()) for name in df.columns)
+
+def test_changed_csv_replaces_only_its_own_cache(dataset, tmp_path):
+    path, cache_dir = dataset
+    other = str(tmp_path / "other.csv")
+    write_csv(other, 100, seed=2)
+    load_preprocessed_dataset(other, preprocess_dataset, cache_dir=cache_dir)
+    load_preprocessed_dataset(path, preprocess_dataset, cache_dir=cache_dir)
+    kept = caches(cache_dir)
+
+    write_csv(path, 300, seed=3)
+    preprocess = CountingPreprocess()
+    df = load_preprocessed_dataset(path, preprocess, cache_dir=cache_dir)
+    assert (preprocess.calls, len(df)) == (1, 300)
+    # One cache each for other.csv and for the new data.csv
+    assert len(caches(cache_dir)) == 2
+    assert len(caches(cache_dir) & kept) == 1
+
+def test_key_follows_the_code_and_the_config(dataset, monkeypatch):
+    path, cache_dir = dataset
+    key = cache_key(path, preprocess_dataset, cache_dir)
+    assert cache_key(path, preprocess_dataset, cache_dir) == key
+    assert cache_key(path, CountingPreprocess(), cache_dir) != key
+
+    rules = {**cache.TARGET_RULES, "diabetes": [[("Age", ">", 41)]]}
+    monkeypatch.setattr(cache, "TARGET_RULES", rules)
+    assert cache_key(path, preprocess_dataset, cache_dir) != key
@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+
+from ml.data.synthetic import iter_payloads
+from models.delta import ScoreState, InvalidStateToken, initial_state, apply_changes, state_results
+from models.predict import predict_risk_direct
+
+CHANGES = [
+    {"Smoking status": "Current smoker (daily)"},
+    {"Weight": 95, "Fatigue": "Moderate"},
+    {"Height": 150},
+    {"Age": 200, "Sex": "Robot"},
+    {"BMI": 31.5},
+    {"BMI": None, "Height": 190},
+    {"Not a feature": 1},
+]
+
+@pytest.fixture(scope="module")
+def payloads():
+    return list(iter_payloads(40, seed=13, missing_rate=0.2))
+
+def test_state_token_round_trips(payloads):
+    state = initial_state(payloads[0])
+    parsed = ScoreState.from_token(state.to_token())
+    np.testing.assert_array_equal(parsed.x, state.x)
+    np.testing.assert_array_equal(parsed.z, state.z)
+    assert (parsed.fingerprint, parsed.flags) == (state.fingerprint, state.flags)
+
+def test_tampered_tokens_are_rejected(payloads):
+    token = initial_state(payloads[0]).to_token()
+    flipped = token[:20] + ("A" if token[20] != "A" else "B") + token[21:]
+    for bad in (flipped, token[:-4], "", "not base64!"):
+        with pytest.raises(InvalidStateToken):
+            ScoreState.from_token(bad)
+
+def test_fallback_token_key_stays_out_of_the_environment():
+    env = {k: v for k, v in os.environ.items() if k != "ML_DELTA_TOKEN_SECRET"}
+    env["PYTHONPATH"] = os.pathsep.join(sys.path)
+    script = "import os, ml.config as c; print(len(c.DELTA_TOKEN_SECRET), 'ML_DELTA_TOKEN_SECRET' in os.environ)"
+    out = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True, check=True)
+    assert out.stdout.split() == ["32", "False"]
+
+def _verify_token(token, queue):
+    try:
+        ScoreState.from_token(token)
+        queue.put(True)
+    except InvalidStateToken:
+        queue.put(False)
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_forked_workers_accept_each_others_tokens(payloads):
+    ctx = multiprocessing.get_context("fork")
+    queue = ctx.Queue()
+    process = ctx.Process(target=_verify_token, args=(initial_state(payloads[0]).to_token(), queue))
+    process.start()
+    process.join()
+    assert queue.get(timeout=5)
+
+@pytest.mark.parametrize("changes", CHANGES)
+def test_changes_score_like_the_full_record(payloads, changes):
+    for payload in payloads:
+        state, errors = apply_changes(initial_state(payload), changes)
+        merged = {**payload, **changes}
+        full = initial_state(merged)
+        np.testing.assert_array_equal(state.x, full.x)
+        np.testing.assert_allclose(state.z, full.z, rtol=1e-9, atol=1e-9)
+        assert state.flags == full.flags
+        assert {e["field"] for e in errors} == ({"Age", "Sex"} if "Sex" in changes else set())
+        assert state_results(state) == predict_risk_direct(merged)
+
+def test_changes_can_be_chained(payloads):
+    state = initial_state(payloads[1])
+    merged = dict(payloads[1])
+    for changes in CHANGES:
+        state, _ = apply_changes(ScoreState.from_token(state.to_token()), changes)
+        merged.update(changes)
+    np.testing.assert_allclose(state.z, initial_state(merged).z, rtol=1e-9, atol=1e-9)
+
+def test_state_from_other_models_is_rescored(payloads):
+    state = initial_state(payloads[2])
+    stale = ScoreState(state.x, state.z + 1.0, b"\1" * 8, state.flags)
+    updated, _ = apply_changes(stale, {"Fatigue": "Moderate"})
+    expected = initial_state({**payloads[2], "Fatigue": "Moderate"})
+    np.testing.assert_allclose(updated.z, expected.z, rtol=1e-9, atol=1e-9)
+    assert updated.fingerprint == expected.fingerprint
@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+from sklearn.metrics import roc_auc_score, precision_score, recall_score, accuracy_score
+
+from ml.models import evaluation as evaluation_module
+from ml.models.evaluation import SortedScores, evaluate_scores, bootstrap_counts
+
+def sklearn_metrics(y, score, weights, threshold=0.5, bins=10):
+    """Each metric computed directly, with `weights` as sample weights"""
+    predicted = (score >= threshold).astype(int)
+    bin_ids = np.minimum((score * bins).astype(int), bins - 1)
+    gap = sum(abs(np.sum(weights[bin_ids == b] * (y[bin_ids == b] - score[bin_ids == b]))) for b in range(bins))
+    return {
+        "auc": roc_auc_score(y, score, sample_weight=weights),
+        "ece": gap / weights.sum(),
+        "precision": precision_score(y, predicted, sample_weight=weights),
+        "recall": recall_score(y, predicted, sample_weight=weights),
+        "accuracy": accuracy_score(y, predicted, sample_weight=weights),
+    }
+
+@pytest.fixture
+def labelled():
+    rng = np.random.default_rng(5)
+    y = rng.integers(0, 2, 400)
+    # Rounded so many scores tie, some of them exactly on the threshold
+    score = np.round(np.clip(0.3 * y + rng.normal(0.35, 0.2, 400), 0, 1), 2)
+    return y, score
+
+def test_point_estimates_match_sklearn(labelled):
+    y, score = labelled
+    evaluation = evaluate_scores(y, score, resamples=10)
+    expected = sklearn_metrics(y, score, np.ones(len(y)))
+    for metric, value in expected.items():
+        assert evaluation["metrics"][metric]["value"] == pytest.approx(value, rel=1e-12)
+    assert (evaluation["rows"], evaluation["positives"]) == (400, int(y.sum()))
+
+def test_every_resample_matches_sklearn(labelled):
+    y, score = labelled
+    scores = SortedScores(y, score)
+    counts = bootstrap_counts(len(y), 20, np.random.default_rng(1))
+    computed = scores.metrics(counts)
+    for i, weights in enumerate(counts):
+        # The count rows are in sorted order, so map them back to the input rows
+        expected = sklearn_metrics(y, score, weights[np.argsort(scores.order)])
+        for metric, value in expected.items():
+            assert computed[metric][i] == pytest.approx(value, rel=1e-9)
+
+def test_intervals_contain_the_point_estimate(labelled):
+    y, score = labelled
+    evaluation = evaluate_scores(y, score, resamples=200)
+    for entry in evaluation["metrics"].values():
+        assert entry["lower"] <= entry["value"] <= entry["upper"]
+    assert evaluate_scores(y, score, resamples=200) == evaluation
+
+def test_block_size_does_not_change_the_intervals(labelled, monkeypatch):
+    y, score = labelled
+    evaluation = evaluate_scores(y, score, resamples=50)
+    # Down to 2 and then 1 resample per block, the last block a short one
+    for elements in (2 * len(y) + 1, 1):
+        monkeypatch.setattr(evaluation_module, "_BLOCK_ELEMENTS", elements)
+        assert evaluate_scores(y, score, resamples=50) == evaluation
+
+def test_undefined_metrics_are_none():
+    evaluation = evaluate_scores([0, 0, 0], [0.1, 0.2, 0.3], resamples=10)
+    assert evaluation["metrics"]["auc"]["value"] is None
+    assert evaluation["metrics"]["recall"]["value"] is None
+    assert evaluation["metrics"]["accuracy"]["value"] == 1.0
+    with pytest.raises(ValueError):
+        evaluate_scores([], [])
@@ -0,0 +1,40 @@
+import numpy as np
+from sklearn.impute import SimpleImputer
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from ml.models.compiled import compile_pipeline
+from ml.models.encoding import FEATURES, ALL_FEATURES
+from ml.models.features import FeatureStandardizer, SharedFeatures
+
+def imputer_and_scaler():
+    return Pipeline([("imputer", SimpleImputer(strategy="median")), ("scaler", StandardScaler())])
+
+def test_standardizer_matches_imputer_and_scaler(encoded):
+    expected = imputer_and_scaler().fit_transform(encoded)
+    standardizer = FeatureStandardizer().fit(encoded)
+    np.testing.assert_allclose(standardizer.transform(encoded), expected, rtol=1e-12, atol=1e-12)
+
+    subset = ["BMI", "Age", "Fatigue"]
+    np.testing.assert_allclose(standardizer.subset(subset).transform(encoded[subset]),
+                               expected[:, [ALL_FEATURES.index(f) for f in subset]], rtol=1e-12, atol=1e-12)
+
+def test_shared_matrix_matches_a_fit_per_disease(encoded):
+    train, test = encoded.iloc[:400], encoded.iloc[400:]
+    shared = SharedFeatures(train, test, list(FEATURES.values()))
+    for features in FEATURES.values():
+        preprocessor = imputer_and_scaler().fit(train[features])
+        np.testing.assert_allclose(shared.train_columns(features), preprocessor.transform(train[features]),
+                                   rtol=1e-12, atol=1e-12)
+        np.testing.assert_allclose(shared.test_columns(features), preprocessor.transform(test[features]),
+                                   rtol=1e-12, atol=1e-12)
+        assert shared.train_columns(features).flags.c_contiguous
+
+def test_standardizer_pipelines_compile(encoded):
+    features = FEATURES["cardiovascular"]
+    y = (encoded["Age"].fillna(35) > 45).astype(int)
+    pipeline = Pipeline([("preprocessor", FeatureStandardizer()), ("classifier", LogisticRegression(max_iter=1000))])
+    pipeline.fit(encoded[features], y)
+    np.testing.assert_allclose(compile_pipeline(pipeline, features).predict_proba(encoded)[:, 1],
+                               pipeline.predict_proba(encoded[features])[:, 1], rtol=1e-9, atol=1e-12)
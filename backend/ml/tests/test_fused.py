@@ -0,0 +1,17 @@
+import numpy as np
+
+from ml.models.compiled import compile_models, fuse_models
+from ml.models.encoding import FEATURES, ALL_FEATURES
+
+def test_fused_scorer_matches_the_pickles(pipelines, encoded):
+    fused = fuse_models(compile_models(pipelines, FEATURES), list(FEATURES), ALL_FEATURES)
+    scores = fused.predict_proba(encoded.to_numpy())
+    for k, disease in enumerate(fused.diseases):
+        expected = pipelines[disease].predict_proba(encoded[FEATURES[disease]])[:, 1]
+        np.testing.assert_allclose(scores[:, k], expected, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(fused.score_vector(encoded.to_numpy()[0]), scores[0])
+
+def test_no_fused_scorer_unless_every_disease_compiled(pipelines):
+    compiled = compile_models(pipelines, FEATURES)
+    del compiled["kidney_stone"]
+    assert fuse_models(compiled, list(FEATURES), ALL_FEATURES) is None
@@ -0,0 +1,65 @@
+import os
+import multiprocessing
+
+from ml.utils.metrics import MetricsRegistry
+
+def worker(directory, requests, in_flight):
+    """A registry like one serve.py worker's, publishing to `directory`"""
+    registry = MetricsRegistry()
+    counter = registry.counter("requests_total", "Requests", ["endpoint"])
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    registry.add_collector(lambda: [("in_flight", "gauge", "Requests in flight", {(): in_flight})])
+    registry.enable_multiprocess(directory)
+    counter.inc(requests, endpoint="/assess_risk")
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+    return registry
+
+def _publish(directory, requests, in_flight):
+    worker(directory, requests, in_flight).flush()
+
+def other_worker(directory, requests, in_flight):
+    """Publish a snapshot from another process and return its pid"""
+    process = multiprocessing.get_context("fork").Process(target=_publish, args=(directory, requests, in_flight))
+    process.start()
+    process.join()
+    assert process.exitcode == 0
+    return process.pid
+
+def samples(text):
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+def test_every_worker_renders_the_whole_server(tmp_path):
+    other_worker(str(tmp_path), 4, 2)
+    merged = samples(worker(str(tmp_path), 3, 1).render())
+    assert merged['requests_total{endpoint="/assess_risk"}'] == "7"
+    assert merged['latency_seconds_bucket{le="0.1"}'] == "2"
+    assert merged['latency_seconds_bucket{le="+Inf"}'] == "4"
+    assert merged["latency_seconds_count"] == "4"
+    assert merged["in_flight"] == "3"
+
+def test_dead_workers_keep_counters_but_not_gauges(tmp_path):
+    registry = worker(str(tmp_path), 3, 1)
+    registry.mark_process_dead(other_worker(str(tmp_path), 4, 2))
+    # A replacement worker's numbers add to the dead one's
+    registry.mark_process_dead(other_worker(str(tmp_path), 5, 6))
+    merged = samples(registry.render())
+    assert merged['requests_total{endpoint="/assess_risk"}'] == "12"
+    assert merged["latency_seconds_count"] == "6"
+    assert merged["in_flight"] == "1"
+
+def test_dead_workers_are_folded_into_one_file(tmp_path):
+    registry = worker(str(tmp_path), 1, 1)
+    for requests in range(1, 6):
+        registry.mark_process_dead(other_worker(str(tmp_path), requests, 5))
+    registry.flush()
+    assert sorted(os.listdir(tmp_path)) == sorted(["dead.json", f"{os.getpid()}.json"])
+    merged = samples(registry.render())
+    assert merged['requests_total{endpoint="/assess_risk"}'] == "16"
+    assert merged['latency_seconds_bucket{le="1.0"}'] == "12"
+    assert merged["in_flight"] == "1"
+
+def test_single_process_renders_its_own_values():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests", ["endpoint"]).inc(2, endpoint='say "hi"')
+    assert 'requests_total{endpoint="say \\"hi\\""} 2' in registry.render()
@@ -0,0 +1,21 @@
+import numpy as np
+import pandas as pd
+
+from ml.data.synthetic import iter_payloads
+from ml.models.encoding import ALL_FEATURES, encode_record
+from ml.models.online import encode_labelled
+
+def test_updates_are_encoded_like_requests():
+    records = list(iter_payloads(100, seed=4, missing_rate=0.2))
+    df = pd.DataFrame(records)
+    df["diabetes"] = np.arange(len(df)) % 2
+    df["kidney_stone"] = [1, "unknown"] * (len(df) // 2)
+
+    X, labels = encode_labelled(df)
+    expected = np.array([encode_record(record, ALL_FEATURES) for record in records])
+    np.testing.assert_array_equal(X.to_numpy(), expected)
+    assert list(X.columns) == ALL_FEATURES
+
+    assert set(labels) == {"diabetes", "kidney_stone"}
+    known, y = labels["kidney_stone"]
+    assert known.sum() == len(df) // 2 and set(y) == {1}
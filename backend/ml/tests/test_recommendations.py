@@ -0,0 +1,42 @@
+import json
+import pytest
+
+import app as service
+from ml.data.synthetic import iter_payloads
+from ml.recommendations import engine
+from ml.recommendations.engine import result_json, results_json, get_recommendations, get_detailed_advice
+from models.predict import build_result, predict_risk_direct
+
+def dumps(value):
+    return json.dumps(value, sort_keys=True, separators=(",", ":")).encode()
+
+@pytest.mark.parametrize("score", [0.0, 12.3, 39.9, 40.0, 50.0, 74.9, 75.0, 99.99, 100.0, 1e-05, 1 / 3])
+def test_result_bytes_match_json_dumps(score):
+    for disease in engine.RECOMMENDATIONS:
+        result = build_result(disease, score)
+        assert result_json(disease, result) == dumps(result)
+
+def test_response_bytes_match_json_dumps():
+    payloads = list(iter_payloads(30, seed=31, missing_rate=0.2))
+    results = [predict_risk_direct(payload) for payload in payloads]
+    for result in results:
+        assert results_json(result) == dumps(result)
+
+    client = service.app.test_client()
+    response = client.post("/assess_risk", json=payloads[0])
+    assert response.data == dumps({"results": results[0], "success": True})
+    response = client.post("/assess_risk_batch", json=payloads)
+    assert response.data == dumps({"errors": [], "results": results, "success": True})
+
+def test_changed_results_fall_back_to_json_dumps():
+    result = build_result("diabetes", 80.0)
+    edited = {**result, "recommendations": result["recommendations"] + ["See a doctor"]}
+    assert result_json("diabetes", edited) == dumps(edited)
+    extra = {**result, "note": "x"}
+    assert result_json("diabetes", extra) == dumps(extra)
+    assert result_json("unknown", result) == dumps(result)
+
+def test_lists_are_shared_between_results():
+    assert get_recommendations("diabetes", "high") is get_recommendations("diabetes", "high")
+    assert get_detailed_advice("kidney_stone", "medium") is build_result("kidney_stone", 50.0)["advice"]
+    assert get_recommendations("unknown", "high") == engine.DEFAULT_RECOMMENDATIONS
@@ -0,0 +1,63 @@
+import os
+import shutil
+import pytest
+
+from models import registry
+from models.artifact import load_artifact, save_artifact
+from models.compiled import CompiledModel
+from models.predict import prediction_cache
+
+@pytest.fixture
+def models_dir(tmp_path, monkeypatch):
+    """A copy of the saved models that the registry loads from, restored to the real ones afterwards"""
+    directory = str(tmp_path / "saved")
+    shutil.copytree(registry.MODELS_DIR, directory, ignore=shutil.ignore_patterns("online", "evaluations"))
+    with monkeypatch.context() as patch:
+        patch.setattr(registry, "MODELS_DIR", directory)
+        registry.load_models()
+        yield directory
+    registry.load_models()
+
+def retrain(directory, disease, shift):
+    """Replace a model's artifact with one whose intercept is moved by `shift`"""
+    path = os.path.join(directory, f"{disease}_model.bin")
+    model, _ = load_artifact(path)
+    shifted = CompiledModel(model.features, model.weights, model.intercept + shift, model.fill, model.mean, model.scale)
+    save_artifact(shifted, path, disease, os.path.join(directory, f"{disease}_model.pkl"))
+
+def test_unchanged_files_are_not_reloaded(models_dir):
+    version = registry.get_model_version()
+    assert registry.reload_if_changed() is False
+    assert registry.get_model_version() == version
+
+def test_changed_files_swap_in_a_new_model_set(models_dir):
+    models, _, _, version = registry.get_model_state()
+    reloads = []
+    registry.add_reload_listener(lambda loaded, new_version: reloads.append(new_version))
+    prediction_cache.put("key", "value")
+    try:
+        retrain(models_dir, "diabetes", 1.0)
+        assert registry.reload_if_changed() is True
+    finally:
+        registry._listeners.pop()
+
+    reloaded, _, fused, new_version = registry.get_model_state()
+    assert new_version == version + 1 and reloads == [new_version]
+    assert reloaded["diabetes"].intercept == models["diabetes"].intercept + 1.0
+    assert reloaded["cardiovascular"].intercept == models["cardiovascular"].intercept
+    assert fused.intercepts[fused.diseases.index("diabetes")] == reloaded["diabetes"].intercept
+    assert prediction_cache.get("key") is None
+
+def test_unreadable_files_keep_the_previous_model(models_dir):
+    previous = registry.get_models()["kidney_stone"]
+    for suffix in ("bin", "pkl"):
+        with open(os.path.join(models_dir, f"kidney_stone_model.{suffix}"), "wb") as f:
+            f.write(b"half written")
+    assert registry.reload_if_changed() is True
+    assert registry.get_models()["kidney_stone"] is previous
+
+def test_stale_artifact_falls_back_to_the_pickle(models_dir):
+    with open(os.path.join(models_dir, "cardiovascular_model.pkl"), "ab") as f:
+        f.write(b"\0")
+    registry.reload_if_changed()
+    assert not isinstance(registry.get_models()["cardiovascular"], CompiledModel)
@@ -0,0 +1,79 @@
+import pytest
+
+import rescore
+from ml.data.synthetic import write_csv, write_payloads
+
+class Interrupted(Exception):
+    pass
+
+def interrupt_after(monkeypatch, checkpoints):
+    """Make the run stop while saving its `checkpoints`th checkpoint, after that chunk's output is written"""
+    save = rescore.save_checkpoint
+    calls = []
+
+    def save_or_stop(path, checkpoint):
+        calls.append(path)
+        if len(calls) == checkpoints:
+            raise Interrupted()
+        save(path, checkpoint)
+
+    monkeypatch.setattr(rescore, "save_checkpoint", save_or_stop)
+
+@pytest.fixture(params=["jsonl", "csv"])
+def records(request, tmp_path):
+    path = str(tmp_path / f"records.{request.param}")
+    writer = write_payloads if request.param == "jsonl" else write_csv
+    writer(path, 53, seed=7, missing_rate=0.1)
+    return path, request.param
+
+def test_resumed_run_matches_uninterrupted_run(records, tmp_path, monkeypatch):
+    path, fmt = records
+    expected = str(tmp_path / "expected.jsonl")
+    assert rescore.rescore(path, expected, fmt, chunk_size=10) == 53
+
+    output = str(tmp_path / "output.jsonl")
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, 3)
+        with pytest.raises(Interrupted):
+            rescore.rescore(path, output, fmt, chunk_size=10)
+    # The third chunk was written but not checkpointed, so resuming has to drop it
+    assert rescore.load_checkpoint(output + ".checkpoint")["records"] == 20
+    assert rescore.rescore(path, output, fmt, chunk_size=10, resume=True) == 53
+
+    with open(expected, "rb") as f, open(output, "rb") as g:
+        assert g.read() == f.read()
+
+def test_resume_of_complete_output_writes_nothing(records, tmp_path):
+    path, fmt = records
+    output = str(tmp_path / "output.jsonl")
+    rescore.rescore(path, output, fmt, chunk_size=10)
+    with open(output, "rb") as f:
+        written = f.read()
+    assert rescore.rescore(path, output, fmt, chunk_size=10, resume=True) == 53
+    with open(output, "rb") as f:
+        assert f.read() == written
+
+def test_resume_refuses_changed_models(records, tmp_path, monkeypatch):
+    path, fmt = records
+    output = str(tmp_path / "output.jsonl")
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, 2)
+        with pytest.raises(Interrupted):
+            rescore.rescore(path, output, fmt, chunk_size=10)
+
+    fingerprint = rescore.models_fingerprint()
+    retrained = {name: "0" * 64 for name in fingerprint}
+    monkeypatch.setattr(rescore, "models_fingerprint", lambda: retrained)
+    with pytest.raises(rescore.ModelsChanged):
+        rescore.rescore(path, output, fmt, chunk_size=10, resume=True)
+
+def test_worker_refuses_models_other_than_the_runs():
+    fingerprint = rescore.models_fingerprint()
+    rescore._init_worker(fingerprint)
+    with pytest.raises(rescore.ModelsChanged):
+        rescore._init_worker({name: "0" * 64 for name in fingerprint})
+
+def test_worker_pool_stops_on_changed_models():
+    chunks = [([{}], [0], 1)]
+    with pytest.raises(rescore.BrokenProcessPool):
+        list(rescore.scored_chunks(iter(chunks), 2, {"diabetes_model.pkl": "0" * 64}))
@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from ml.config import TARGET_RULES
+from ml.data.synthetic import make_population
+from ml.models.dataset import create_target_variable
+from ml.models.encoding import ALL_FEATURES
+from ml.models.rules import RuleSet, compile_rules
+
+def reference_targets(df):
+    """The pandas expressions the rules replaced"""
+    diabetes_risk = (
+        ((df['BMI'] > 28) & (df['Age'] > 40)) |
+        ((df['Family history of diabetes'] > 0) & (df['Age'] > 35)) |
+        (df['Frequent urination'] >= 2) |
+        (df['Unexplained thirst'] >= 1) |
+        (df['Unexplained weight loss'] >= 2)
+    )
+    cardiovascular_risk = (
+        ((df['Age'] > 50) & (df['Smoking status'] >= 3)) |
+        ((df['Family history of cardiovascular disease'] > 0) & (df['Age'] > 45)) |
+        ((df['Physical activity level'] <= 1) & (df['Age'] > 50) & (df['BMI'] > 28)) |
+        ((df['Chest pain or discomfort'] > 0) & (df['Shortness of breath during normal activities'] > 0))
+    )
+    kidney_stone_risk = (
+        (df['Daily water intake'] <= 1) |
+        (df['Previous kidney stones'] > 0) |
+        ((df['Family history of kidney stones'] > 0) & (df['Age'] > 40)) |
+        ((df['Back or flank pain'] > 0) & (df['Painful urination'] > 0))
+    )
+    return diabetes_risk.astype(int), cardiovascular_risk.astype(int), kidney_stone_risk.astype(int)
+
+@pytest.fixture(scope="module")
+def population():
+    # Missing answers stay NaN, so the NaN comparisons are covered too
+    return make_population(5000, seed=11, missing_rate=0.15, encoded=True)
+
+def test_labels_match_the_pandas_expressions(population):
+    for labels, expected in zip(create_target_variable(population), reference_targets(population)):
+        assert labels.index.equals(expected.index)
+        np.testing.assert_array_equal(labels.to_numpy(), expected.to_numpy())
+
+def test_blocks_and_inputs_give_the_same_labels(population):
+    ruleset = compile_rules()
+    whole = ruleset.evaluate(population)
+    blocked = ruleset.evaluate({f: population[f].to_numpy() for f in population.columns}, block_size=333)
+    matrix = ruleset.evaluate_matrix(population[ALL_FEATURES].to_numpy(), ALL_FEATURES)
+    for target in TARGET_RULES:
+        np.testing.assert_array_equal(blocked[target], whole[target])
+        np.testing.assert_array_equal(matrix[target], whole[target])
+
+def test_single_vector_matches_the_batch(population):
+    ruleset = compile_rules()
+    X = population[ALL_FEATURES].to_numpy()[:500]
+    batch = ruleset.evaluate_matrix(X, ALL_FEATURES)
+    for i, x in enumerate(X):
+        assert ruleset.matching(x, ALL_FEATURES) == [t for t in ruleset.targets if batch[t][i]]
+
+def test_shared_conditions_are_compiled_once():
+    ruleset = RuleSet({"a": [[("Age", ">", 40), ("BMI", ">", 28)]], "b": [[("Age", ">", 40.0)]]})
+    assert ruleset.conditions == [("Age", ">", 40.0), ("BMI", ">", 28.0)]
+    assert ruleset.clauses == {"a": [(0, 1)], "b": [(0,)]}
+    assert compile_rules() is compile_rules(TARGET_RULES)
+
+@pytest.mark.parametrize("rules", [{"a": [[]]}, {"a": [[("Age", "=>", 1)]]}])
+def test_malformed_rules_are_rejected(rules):
+    with pytest.raises(ValueError):
+        RuleSet(rules)
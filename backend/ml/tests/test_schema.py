@@ -0,0 +1,82 @@
+import math
+import numpy as np
+import pytest
+
+from ml.config import FEATURE_MAPPINGS, NUMERIC_DEFAULTS, VALUE_RANGES
+from ml.data.schema import (FieldRule, validate_records, bmi_from, MISSING, INVALID_TYPE,
+                            UNKNOWN_VALUE, OUT_OF_RANGE)
+from ml.data.synthetic import iter_payloads
+from ml.models.encoding import ALL_FEATURES, encode_record
+
+@pytest.mark.parametrize("feature", sorted(ALL_FEATURES))
+def test_missing_answers_get_the_documented_default(feature):
+    expected = FEATURE_MAPPINGS[feature].get("default", 0) if feature in FEATURE_MAPPINGS \
+        else NUMERIC_DEFAULTS.get(feature, 0)
+    rule = FieldRule(feature)
+    for value in (None, float("nan"), "", "   "):
+        assert rule.coerce(value) == (float(expected), MISSING)
+
+def test_mapped_features_accept_labels_and_codes():
+    rule = FieldRule("Sex")
+    assert rule.coerce("Female") == (1.0, None)
+    assert rule.coerce(2) == (2.0, None)
+    assert rule.coerce("2") == (2.0, None)
+    assert rule.coerce("Unknown") == (0.0, UNKNOWN_VALUE)
+    assert rule.coerce(7) == (0.0, UNKNOWN_VALUE)
+    assert rule.coerce(True) == (0.0, INVALID_TYPE)
+
+def test_boolean_features_accept_words():
+    rule = FieldRule("Blood in urine")
+    assert rule.coerce("yes") == (1.0, None)
+    assert rule.coerce(" False ") == (0.0, None)
+    assert rule.coerce(True) == (1.0, None)
+
+def test_numeric_features_are_range_checked():
+    rule = FieldRule("Age")
+    low, high = VALUE_RANGES["Age"]
+    assert rule.coerce(low) == (float(low), None)
+    assert rule.coerce(f"{high}") == (float(high), None)
+    assert rule.coerce(high + 1) == (35.0, OUT_OF_RANGE)
+    assert rule.coerce(10 ** 400) == (35.0, OUT_OF_RANGE)
+    assert rule.coerce("old") == (35.0, INVALID_TYPE)
+    assert rule.coerce([40]) == (35.0, INVALID_TYPE)
+
+def test_batch_matches_coercing_each_value():
+    values = [None, 1, 1.0, True, "1", "Male", "yes", "x", float("nan"), [1], {"a": 1}, 10 ** 400, -3, 200.5]
+    records = [{feature: value for feature in ALL_FEATURES if feature != "BMI"} for value in values]
+    X, errors = validate_records(records, ALL_FEATURES)
+
+    reported = {(e["record"], e["field"]): e["error"] for e in errors}
+    for row, value in enumerate(values):
+        for j, feature in enumerate(ALL_FEATURES):
+            if feature == "BMI":
+                continue
+            expected, status = FieldRule(feature).coerce(value)
+            assert X[row, j] == expected
+            assert reported.get((row, feature)) == (status if status not in (None, MISSING) else None)
+
+def test_batch_matches_encode_record():
+    records = list(iter_payloads(300, seed=3, missing_rate=0.2))
+    records += [{"Height": 180, "Weight": 80}, {"Height": 60, "Weight": 290}, {"BMI": None, "Height": "tall"}]
+    X, _ = validate_records(records, ALL_FEATURES)
+    for row, record in zip(X, records):
+        np.testing.assert_array_equal(row, encode_record(record, ALL_FEATURES))
+
+def test_bmi_is_derived_from_height_and_weight():
+    j = ALL_FEATURES.index("BMI")
+    X, errors = validate_records([{"Height": 180, "Weight": 81}, {"Height": 60, "Weight": 290},
+                                  {"Height": 180}, {"BMI": 30, "Height": 180, "Weight": 81}], ALL_FEATURES)
+    assert math.isclose(X[0, j], bmi_from(180, 81))
+    assert X[1, j] == NUMERIC_DEFAULTS["BMI"]
+    assert [(e["record"], e["field"], e["error"]) for e in errors] == [(1, "BMI", OUT_OF_RANGE)]
+    assert X[2, j] == NUMERIC_DEFAULTS["BMI"]
+    assert X[3, j] == 30
+
+def test_errors_describe_the_value():
+    _, errors = validate_records([{"Age": 130, "Sex": "Robot"}], ["Age", "Sex"])
+    assert errors == [
+        {"record": 0, "field": "Age", "error": OUT_OF_RANGE, "value": 130,
+         "message": "Outside the valid range 0-120, using the default 35"},
+        {"record": 0, "field": "Sex", "error": UNKNOWN_VALUE, "value": "Robot",
+         "message": "Not one of the allowed answers, using the default 0"},
+    ]
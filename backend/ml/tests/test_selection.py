@@ -0,0 +1,35 @@
+import pytest
+
+from ml.data.synthetic import make_population
+from ml.models.dataset import DISEASE_FEATURES, preprocess_dataset, create_target_variable
+from ml.models.selection import select_models, save_selection, load_selected_params
+
+C_GRID = [0.1, 1.0]
+CLASS_WEIGHTS = ["balanced", None]
+
+@pytest.fixture(scope="module")
+def data():
+    df = preprocess_dataset(make_population(1500, seed=31, missing_rate=0.05))
+    return df, dict(zip(DISEASE_FEATURES, create_target_variable(df)))
+
+def test_parallel_selection_matches_sequential(data):
+    df, targets = data
+    diseases = list(DISEASE_FEATURES)
+    sequential = select_models(diseases, df, targets, folds=3, c_grid=C_GRID, class_weights=CLASS_WEIGHTS, workers=1)
+    parallel = select_models(diseases, df, targets, folds=3, c_grid=C_GRID, class_weights=CLASS_WEIGHTS, workers=2)
+    assert parallel == sequential
+    for selection in sequential.values():
+        assert len(selection["grid"]) == len(C_GRID) * len(CLASS_WEIGHTS)
+        assert selection["best_score"] == max(entry["mean_score"] for entry in selection["grid"])
+
+def test_saved_selection_is_picked_up(data, tmp_path):
+    df, targets = data
+    selection = select_models(["diabetes"], df, targets, folds=3, c_grid=C_GRID,
+                              class_weights=CLASS_WEIGHTS, workers=1)["diabetes"]
+    assert load_selected_params("diabetes", str(tmp_path)) is None
+    save_selection(selection, str(tmp_path))
+    assert load_selected_params("diabetes", str(tmp_path)) == selection["best"]
+
+def test_unreadable_selection_is_ignored(tmp_path):
+    (tmp_path / "diabetes_selection.json").write_text("{not json")
+    assert load_selected_params("diabetes", str(tmp_path)) is None
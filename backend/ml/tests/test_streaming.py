@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.metrics import classification_report, roc_auc_score, confusion_matrix
+
+from ml.data.synthetic import write_csv
+from ml.models.compiled import compile_pipeline
+from ml.models.dataset import DISEASE_FEATURES
+from ml.models.streaming import iter_chunks, train_models_streaming, format_report, histogram_auc
+
+@pytest.fixture(scope="module")
+def dataset(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("streaming") / "data.csv")
+    write_csv(path, 2000, seed=29)
+    return path
+
+def test_streaming_trains_every_disease(dataset):
+    models, reports = train_models_streaming(dataset, chunksize=300, epochs=3, save=False)
+    chunks = list(iter_chunks(dataset, chunksize=300))
+    df = pd.concat([chunk for chunk, _, _ in chunks])
+    train = ~np.concatenate([is_test for _, _, is_test in chunks])
+
+    for disease, features in DISEASE_FEATURES.items():
+        model = models[disease]
+        assert "precision" in reports[disease]
+        # The scaler saw every training row once, chunk by chunk
+        np.testing.assert_allclose(model.named_steps["preprocessor"].mean_, df.loc[train, features].mean(),
+                                   rtol=1e-9)
+        # And the SGD model can be served like a trained pipeline
+        compiled = compile_pipeline(model, features)
+        np.testing.assert_allclose(compiled.predict_proba(df[features])[:, 1],
+                                   model.predict_proba(df[features])[:, 1], rtol=1e-9, atol=1e-12)
+
+def test_streaming_is_reproducible(dataset):
+    first, _ = train_models_streaming(dataset, chunksize=300, epochs=2, save=False)
+    second, _ = train_models_streaming(dataset, chunksize=300, epochs=2, save=False)
+    for disease in DISEASE_FEATURES:
+        np.testing.assert_array_equal(first[disease].named_steps["classifier"].coef_,
+                                      second[disease].named_steps["classifier"].coef_)
+
+def test_report_matches_sklearn():
+    rng = np.random.default_rng(2)
+    y_true, y_pred = rng.integers(0, 2, 500), rng.integers(0, 2, 500)
+    report = format_report(confusion_matrix(y_true, y_pred))
+    assert report.split() == classification_report(y_true, y_pred).split()
+
+def test_histogram_auc_is_close_to_exact():
+    rng = np.random.default_rng(3)
+    y = rng.integers(0, 2, 5000)
+    score = np.clip(0.2 * y + rng.random(5000) * 0.8, 0, 1)
+    edges = np.linspace(0, 1, 1001)
+    auc = histogram_auc(np.histogram(score[y == 1], edges)[0], np.histogram(score[y == 0], edges)[0])
+    assert auc == pytest.approx(roc_auc_score(y, score), abs=1e-3)
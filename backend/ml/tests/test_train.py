@@ -0,0 +1,38 @@
+import numpy as np
+import pytest
+from sklearn.model_selection import train_test_split
+
+from ml.data.synthetic import make_population
+from ml.models.dataset import DISEASE_FEATURES, preprocess_dataset, create_target_variable
+from ml.models.features import SharedFeatures
+from ml.models.train import train_disease_model, _train_parallel
+
+@pytest.fixture(scope="module")
+def split():
+    df = preprocess_dataset(make_population(3000, seed=23, missing_rate=0.05))
+    train_df, test_df = train_test_split(df, test_size=0.2, random_state=42)
+    targets_train = dict(zip(DISEASE_FEATURES, create_target_variable(train_df)))
+    targets_test = dict(zip(DISEASE_FEATURES, create_target_variable(test_df)))
+    shared = SharedFeatures(train_df, test_df, list(DISEASE_FEATURES.values()))
+    return shared, targets_train, targets_test
+
+def test_parallel_training_matches_sequential(split):
+    shared, targets_train, targets_test = split
+    diseases = list(DISEASE_FEATURES)
+    params = {"cardiovascular": {"C": 0.3}}
+    parallel = _train_parallel(diseases, shared, targets_train, targets_test, workers=2, params=params)
+
+    for disease in diseases:
+        features = DISEASE_FEATURES[disease]
+        pipeline, report = train_disease_model(
+            disease, shared.standardizer(features),
+            shared.train_columns(features), targets_train[disease],
+            shared.test_columns(features), targets_test[disease], params.get(disease))
+        parallel_pipeline, parallel_report = parallel[disease]
+        assert parallel_report == report
+        classifier, parallel_classifier = pipeline.named_steps["classifier"], parallel_pipeline.named_steps["classifier"]
+        assert parallel_classifier.C == classifier.C
+        np.testing.assert_array_equal(parallel_classifier.coef_, classifier.coef_)
+        np.testing.assert_array_equal(parallel_classifier.intercept_, classifier.intercept_)
+        np.testing.assert_array_equal(parallel_pipeline.named_steps["preprocessor"].mean_,
+                                      pipeline.named_steps["preprocessor"].mean_)
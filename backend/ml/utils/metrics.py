@@ -0,0 +1,336 @@
+"""Prometheus metrics of the ML service, rendered by GET /metrics.
+
+Every process keeps its own counters and histograms. Under serve.py the
+workers also publish them, with the scrape-time collector samples, as a
+snapshot file in a shared directory (see MetricsRegistry.enable_multiprocess),
+and /metrics renders the sum over all the snapshots, so whichever worker
+answers a scrape reports the whole server.
+"""
+import os
+import glob
+import json
+import time
+import random
+import logging
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from ml.config import LOG_PAYLOAD_SAMPLE_RATE, METRICS_FLUSH_INTERVAL
+
+logger = logging.getLogger(__name__)
+
+# Accumulated snapshot of every exited worker, next to the live workers' {pid}.json
+DEAD_SNAPSHOT = "dead.json"
+
+# Latency buckets in seconds, from compiled-scorer microseconds up to slow requests
+DEFAULT_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+                   0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+class Counter:
+    """Monotonic counter, optionally split by labels"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, "") for name in self.labelnames), 0)
+
+    def snapshot(self, values=None):
+        """JSON-ready form of this process's values, or of merged `values`"""
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        return [[list(key), value] for key, value in values.items()]
+
+    def merge(self, snapshots):
+        """{labels key: value} summed over several snapshots"""
+        values = {}
+        for snapshot in snapshots:
+            for key, value in snapshot:
+                values[tuple(key)] = values.get(tuple(key), 0) + value
+        return values
+
+    def render(self, values=None):
+        """Text-format lines for this process's values, or for merged `values`"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        if values is None:
+            with self._lock:
+                values = dict(self._values)
+        items = sorted(values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus style, optionally split by labels"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall time of the enclosed block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, series=None):
+        """JSON-ready form of this process's series, or of merged `series`"""
+        if series is None:
+            with self._lock:
+                series = {key: (list(s[0]), s[1], s[2]) for key, s in self._series.items()}
+        return [[list(key), list(s[0]), s[1], s[2]] for key, s in series.items()]
+
+    def merge(self, snapshots):
+        """{labels key: (bucket counts, sum, count)} summed over several snapshots"""
+        series = {}
+        for snapshot in snapshots:
+            for key, counts, total, count in snapshot:
+                if len(counts) != len(self.buckets) + 1:
+                    continue
+                merged = series.setdefault(tuple(key), [[0] * len(counts), 0.0, 0])
+                merged[0] = [a + b for a, b in zip(merged[0], counts)]
+                merged[1] += total
+                merged[2] += count
+        return series
+
+    def render(self, series=None):
+        """Text-format lines for this process's series, or for merged `series`"""
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        if series is None:
+            with self._lock:
+                series = {key: (list(s[0]), s[1], s[2]) for key, s in self._series.items()}
+        items = sorted((key, tuple(s)) for key, s in series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class MetricsRegistry:
+    """All metrics of the service, rendered together in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._directory = None
+        self._flush_interval = METRICS_FLUSH_INTERVAL
+        self._flusher_pid = None
+        self._lock = threading.Lock()
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Register `collect()` returning [(name, type, help, {labels_tuple: value})] at scrape time"""
+        self._collectors.append(collect)
+
+    def enable_multiprocess(self, directory, flush_interval=METRICS_FLUSH_INTERVAL):
+        """Aggregate over all processes that publish snapshots to `directory`
+
+        Call it in the parent before forking workers. Each process writes
+        {pid}.json there when it renders and every `flush_interval` seconds
+        after start_flusher(), so another worker's numbers are at most that
+        old. Counters and histograms are summed over every snapshot, including
+        those of exited workers, so totals never go down when a worker is
+        replaced; gauges only over the live ones (see mark_process_dead).
+        """
+        os.makedirs(directory, exist_ok=True)
+        self._directory = directory
+        self._flush_interval = flush_interval
+
+    def start_flusher(self):
+        """Publish this process's snapshot periodically (once per process, after fork)"""
+        if self._directory is None or self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid != os.getpid():
+                threading.Thread(target=self._flush_loop, name="metrics-flusher", daemon=True).start()
+                self._flusher_pid = os.getpid()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self._flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.warning(f"Could not publish metrics snapshot: {str(e)}")
+
+    def _collect(self):
+        return [[name, kind, documentation, [[[list(pair) for pair in labels], value]
+                                             for labels, value in samples.items()]]
+                for collect in self._collectors for name, kind, documentation, samples in collect()]
+
+    def flush(self):
+        """Write this process's snapshot to the shared directory"""
+        snapshot = {
+            "pid": os.getpid(),
+            "metrics": {metric.name: metric.snapshot() for metric in self._metrics},
+            "collected": self._collect(),
+        }
+        path = os.path.join(self._directory, f"{os.getpid()}.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump(snapshot, f)
+        os.replace(path + ".tmp", path)
+
+    def mark_process_dead(self, pid):
+        """Fold an exited worker's counters into DEAD_SNAPSHOT and drop its gauges
+
+        Every exited worker ends up in that one file, so the directory holds
+        one snapshot per live worker plus one, however often workers are
+        replaced. Only the gunicorn master calls this, so there is a single
+        writer.
+        """
+        if self._directory is None:
+            return
+        path = os.path.join(self._directory, f"{pid}.json")
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return
+        dead_path = os.path.join(self._directory, DEAD_SNAPSHOT)
+        try:
+            with open(dead_path) as f:
+                dead = json.load(f)
+        except (OSError, ValueError):
+            dead = {"pid": None, "metrics": {}, "collected": []}
+
+        merged = self._merge_snapshots([dead, snapshot])
+        merged["collected"] = [entry for entry in merged["collected"] if entry[1] != "gauge"]
+        with open(dead_path + ".tmp", "w") as f:
+            json.dump(merged, f)
+        os.replace(dead_path + ".tmp", dead_path)
+        os.remove(path)
+
+    def _merge_snapshots(self, snapshots):
+        """One snapshot holding the sums of `snapshots`"""
+        metrics = {}
+        for snapshot in snapshots:
+            for name, entries in snapshot["metrics"].items():
+                metrics.setdefault(name, []).extend(entries)
+        for metric in self._metrics:
+            # Metrics this process doesn't know stay as concatenated entries, which render sums all the same
+            if metric.name in metrics:
+                metrics[metric.name] = metric.snapshot(metric.merge([metrics[metric.name]]))
+        collected = [[name, kind, documentation, [[[list(pair) for pair in labels], value]
+                                                  for labels, value in samples.items()]]
+                     for name, (kind, documentation, samples) in _merge_collected(snapshots).items()]
+        return {"pid": None, "metrics": metrics, "collected": collected}
+
+    def _snapshots(self):
+        snapshots = []
+        for path in glob.glob(os.path.join(self._directory, "*.json")):
+            try:
+                with open(path) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                # Removed or replaced under us; the next scrape picks it up again
+                continue
+        return snapshots
+
+    def render(self):
+        if self._directory is not None:
+            return self._render_merged()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for collect in self._collectors:
+            for name, kind, documentation, samples in collect():
+                lines.extend(_collected_lines(name, kind, documentation, samples))
+        return "\n".join(lines) + "\n"
+
+    def _render_merged(self):
+        self.flush()
+        snapshots = self._snapshots()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render(metric.merge(s["metrics"].get(metric.name, []) for s in snapshots)))
+
+        for name, (kind, documentation, samples) in _merge_collected(snapshots).items():
+            lines.extend(_collected_lines(name, kind, documentation, samples))
+        return "\n".join(lines) + "\n"
+
+def _merge_collected(snapshots):
+    """{name: (type, help, {labels: value})} of the collector samples, summed over `snapshots`"""
+    collected = {}
+    for snapshot in snapshots:
+        for name, kind, documentation, samples in snapshot["collected"]:
+            entry = collected.setdefault(name, (kind, documentation, {}))
+            for labels, value in samples:
+                key = tuple(tuple(pair) for pair in labels)
+                entry[2][key] = entry[2].get(key, 0) + value
+    return collected
+
+def _collected_lines(name, kind, documentation, samples):
+    lines = [f"# HELP {name} {documentation}", f"# TYPE {name} {kind}"]
+    for labels, value in samples.items():
+        lines.append(f"{name}{_format_labels([k for k, _ in labels], [v for _, v in labels])} {value}")
+    return lines
+
+metrics = MetricsRegistry()
+
+STAGE_SECONDS = metrics.histogram(
+    "ml_stage_duration_seconds", "Time spent in each stage of a prediction request", ["stage", "disease"])
+REQUEST_SECONDS = metrics.histogram(
+    "ml_request_duration_seconds", "End-to-end request handling time", ["endpoint"])
+REQUESTS = metrics.counter("ml_requests_total", "Requests received", ["endpoint"])
+ERRORS = metrics.counter("ml_request_errors_total", "Requests that failed", ["endpoint"])
+PREDICTION_ERRORS = metrics.counter(
+    "ml_prediction_errors_total", "Per-disease predictions that fell back to the default score", ["disease"])
+MOCK_PREDICTIONS = metrics.counter(
+    "ml_mock_model_predictions_total", "Predictions served by the mock model because no model file loaded",
+    ["disease"])
+RULE_PRESCREENED = metrics.counter(
+    "ml_rule_prescreened_total", "Per-disease predictions decided by a labelling rule without the model",
+    ["disease"])
+
+def sample_payload():
+    """True for the share of requests (LOG_PAYLOAD_SAMPLE_RATE) whose payloads get logged"""
+    return LOG_PAYLOAD_SAMPLE_RATE > 0 and random.random() < LOG_PAYLOAD_SAMPLE_RATE